@@ -0,0 +1,210 @@
+import numpy as np
+"""GraphPeeling
+
+This module provides an in-process replacement for the core decomposition
+performed by graph_peeling.bin, operating on CSR arrays built from plain
+source/target edge columns, along with the iterative edge peeling built on
+top of it.
+"""
+
+
+def csr_adjacency(src, tar, num_vertices):
+    """Build the (undirected) CSR adjacency of an edge list.
+
+    Args:
+        src (numpy.ndarray): Source vertex of each edge.
+        tar (numpy.ndarray): Target vertex of each edge.
+        num_vertices (int): Number of vertices; ids must be below this.
+
+    Returns:
+        indptr, neighbors, positions: neighbors[indptr[v]:indptr[v + 1]] are
+        the neighbors of v, and positions holds, for each of those entries,
+        the position of the corresponding edge in src/tar.
+    """
+
+    num_edges = len(src)
+    heads = np.concatenate((src, tar))
+    tails = np.concatenate((tar, src))
+    positions = np.tile(np.arange(num_edges), 2)
+    order = np.argsort(heads, kind='mergesort')
+    indptr = np.zeros(num_vertices + 1, dtype=np.int64)
+    np.cumsum(np.bincount(heads, minlength=num_vertices), out=indptr[1:])
+    return indptr, tails[order], positions[order]
+
+
+def gather(indptr, vertices):
+    """Entry positions of every CSR neighbor entry of the given vertices."""
+    starts = indptr[vertices]
+    counts = indptr[vertices + 1] - starts
+    offsets = starts - (np.cumsum(counts) - counts)
+    return np.repeat(offsets, counts) + np.arange(counts.sum())
+
+
+def core_numbers(indptr, neighbors):
+    """Compute the core number (peel value) of every vertex.
+
+    Degree buckets are processed in increasing order, as in the bucket-queue
+    algorithm of Batagelj and Zaversnik, except that each bucket's frontier
+    is removed as one batch and its neighbors' degrees are decremented with
+    array operations.
+
+    Args:
+        indptr (numpy.ndarray): CSR offsets, as returned by csr_adjacency.
+        neighbors (numpy.ndarray): CSR neighbors, as returned by
+                                   csr_adjacency.
+
+    Returns:
+        numpy.ndarray of core numbers, indexed by vertex.
+    """
+
+    num_vertices = len(indptr) - 1
+    degree = np.diff(indptr)
+    core = np.zeros(num_vertices, dtype=np.int64)
+    alive = np.ones(num_vertices, dtype=bool)
+    num_alive = num_vertices
+    k = 0
+    while num_alive > 0:
+        # skip empty buckets
+        k = max(k, degree[alive].min())
+        frontier = np.flatnonzero(alive & (degree <= k))
+        while len(frontier) > 0:
+            core[frontier] = k
+            alive[frontier] = False
+            num_alive -= len(frontier)
+            nbrs = neighbors[gather(indptr, frontier)]
+            nbrs = nbrs[alive[nbrs]]
+            nbrs, counts = np.unique(nbrs, return_counts=True)
+            degree[nbrs] -= counts
+            frontier = nbrs[degree[nbrs] <= k]
+    return core
+
+
+def component_labels(indptr, neighbors):
+    """Connected component label of every vertex, computed on CSR arrays by
+    repeatedly hooking each label onto the smallest label of its neighbors
+    and compressing the resulting label chains.
+    """
+
+    labels = np.arange(len(indptr) - 1)
+    owners = np.repeat(labels, np.diff(indptr))
+    while True:
+        hooked = labels.copy()
+        np.minimum.at(hooked, labels[owners], labels[neighbors])
+        while True:
+            jumped = hooked[hooked]
+            if np.array_equal(jumped, hooked):
+                break
+            hooked = jumped
+        if np.array_equal(hooked, labels):
+            return labels
+        labels = hooked
+
+
+class CoreMaintainer(object):
+    """Core numbers of an edge list that only ever loses edges.
+
+    Removing edges can only lower core numbers, so the current ones remain
+    an upper bound afterwards. Core numbers are the greatest fixed point of
+    c(v) = h-index of {c(u) : u neighbor of v}, so repeatedly re-evaluating
+    that h-index, starting from the removed edges' endpoints and spreading
+    only to neighbors of vertices whose value dropped, settles on the new
+    core numbers without touching the rest of the graph.
+    """
+
+    def __init__(self, src, tar, num_vertices):
+        self.src = src
+        self.tar = tar
+        self.indptr, self.neighbors, self.positions = \
+            csr_adjacency(src, tar, num_vertices)
+        self.edge_alive = np.ones(len(src), dtype=bool)
+        self.degree = np.diff(self.indptr)
+        self.core = core_numbers(self.indptr, self.neighbors)
+
+    def live_entries(self, vertices):
+        """Positions in the CSR arrays of the live neighbor entries of the
+        given vertices, along with the index (into vertices) of their owner.
+        """
+        counts = self.indptr[vertices + 1] - self.indptr[vertices]
+        entries = gather(self.indptr, vertices)
+        owners = np.repeat(np.arange(len(vertices)), counts)
+        live = self.edge_alive[self.positions[entries]]
+        return entries[live], owners[live]
+
+    def remove_edges(self, positions):
+        """Remove edges (by position in src/tar) and update core numbers."""
+        self.edge_alive[positions] = False
+        endpoints = np.concatenate((self.src[positions], self.tar[positions]))
+        touched, counts = np.unique(endpoints, return_counts=True)
+        self.degree[touched] -= counts
+        self._settle(touched)
+
+    def _settle(self, frontier):
+        core = self.core
+        while len(frontier) > 0:
+            # h-index of each frontier vertex over its live neighbors, with
+            # neighbor values capped at the vertex's own (upper bound) value
+            entries, owners = self.live_entries(frontier)
+            values = np.minimum(core[self.neighbors[entries]],
+                                core[frontier][owners])
+            order = np.lexsort((-values, owners))
+            values = values[order]
+            owners = owners[order]
+            counts = np.bincount(owners, minlength=len(frontier))
+            starts = np.cumsum(counts) - counts
+            ranks = np.arange(len(owners)) - starts[owners] + 1
+            h = np.zeros(len(frontier), dtype=core.dtype)
+            nonempty = counts > 0
+            if nonempty.any():
+                h[nonempty] = np.maximum.reduceat(np.minimum(values, ranks),
+                                                  starts[nonempty])
+
+            lowered = frontier[h < core[frontier]]
+            core[frontier] = h
+            if len(lowered) == 0:
+                break
+            # only neighbors holding a larger value can be affected
+            entries, owners = self.live_entries(lowered)
+            nbrs = self.neighbors[entries]
+            frontier = np.unique(nbrs[core[nbrs] > core[lowered][owners]])
+
+
+def peel_layers(src, tar, progress=None):
+    """Iteratively peel the top core off an edge list.
+
+    Each round assigns every remaining edge between two vertices of maximum
+    core number to that round's layer and removes those edges, until no
+    edge is left. This is the layer assignment produced by repeated
+    graph_peeling.bin runs; core numbers are maintained incrementally
+    between rounds by a CoreMaintainer instead of being recomputed.
+
+    Args:
+        src (numpy.ndarray): Source vertex of each edge.
+        tar (numpy.ndarray): Target vertex of each edge.
+        progress (callable): Called after every layer with the number of
+            edges peeled so far, the total and a description of the layer.
+
+    Returns:
+        A list of (peel, vertices, edge positions) tuples, one per layer, in
+        peeling order. Edge positions index into src/tar.
+    """
+
+    vertices, local = np.unique(np.concatenate((src, tar)),
+                                return_inverse=True)
+    cores = CoreMaintainer(local[:len(src)], local[len(src):], len(vertices))
+
+    layers = []
+    num_remaining = len(src)
+    while num_remaining > 0:
+        peel = cores.core.max()
+        layer_vertices = np.flatnonzero(cores.core == peel)
+        entries, _ = cores.live_entries(layer_vertices)
+        entries = entries[cores.core[cores.neighbors[entries]] == peel]
+        e_pos = np.unique(cores.positions[entries])
+        layers.append((peel, vertices[layer_vertices], e_pos))
+        cores.remove_edges(e_pos)
+        num_remaining -= len(e_pos)
+        if progress is not None:
+            progress(len(src) - num_remaining, len(src),
+                     'peel: {}, |V|: {}, |E|: {}'.format(
+                         peel, len(layer_vertices), len(e_pos)))
+    return layers
@@ -0,0 +1,145 @@
+import graph_tool.all as gt
+import json
+import numpy as np
+import os
+from GraphPeeling import component_labels, csr_adjacency
+"""GraphStore
+
+This module provides a read-only copy of a graph's structure kept as NumPy
+files on disk: the edge list (source, target and edge index columns, ordered
+by edge index) and its CSR adjacency. Opening a store memory-maps the files,
+so any number of processes can attach to one store and share a single copy
+of the graph through the page cache instead of each loading its own.
+"""
+
+
+class GraphStore(object):
+    """Memory-mapped, read-only edge list and CSR adjacency of a graph.
+
+    Partitioning operations, statistics and exporters accept a GraphStore
+    wherever they accept a graph_tool.Graph. Vertex properties (such as 'id')
+    are not part of a store.
+    """
+
+    ARRAYS = ('src', 'tar', 'eidx', 'indptr', 'neighbors', 'positions')
+    META_FILE = 'meta.json'
+
+    def __init__(self, path):
+        with open(os.path.join(path, GraphStore.META_FILE)) as f:
+            meta = json.load(f)
+        self.path = path
+        self.num_vertices = meta['num_vertices']
+        self.num_edges = meta['num_edges']
+        self.directed = meta['directed']
+        for name in GraphStore.ARRAYS:
+            setattr(self, name, np.load(os.path.join(path, name + '.npy'),
+                                        mmap_mode='r'))
+        # edge index i sits at position i unless edges were ever removed
+        self.contiguous = \
+            self.num_edges == 0 or self.eidx[-1] == self.num_edges - 1
+
+    @staticmethod
+    def create(path, src, tar, eidx, num_vertices, directed=False):
+        """Write a store to path (a directory) and attach to it.
+
+        Args:
+            path (str): Directory to write the store to.
+            src (numpy.ndarray): Source vertex of each edge.
+            tar (numpy.ndarray): Target vertex of each edge.
+            eidx (numpy.ndarray): Edge index of each edge, in sorted order.
+            num_vertices (int): Number of vertices (ids are 0..n-1).
+            directed (bool): Whether the graph is directed.
+
+        Returns:
+            The attached GraphStore.
+        """
+
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        indptr, neighbors, positions = csr_adjacency(src, tar, num_vertices)
+        arrays = {
+            'src': src,
+            'tar': tar,
+            'eidx': eidx,
+            'indptr': indptr,
+            'neighbors': neighbors,
+            'positions': positions,
+        }
+        for name in GraphStore.ARRAYS:
+            np.save(os.path.join(path, name + '.npy'),
+                    np.ascontiguousarray(arrays[name], dtype=np.int64))
+        # the metadata file is written last; a store without one is partial
+        with open(os.path.join(path, GraphStore.META_FILE), 'w') as f:
+            json.dump({
+                'num_vertices': int(num_vertices),
+                'num_edges': len(src),
+                'directed': bool(directed),
+            }, f)
+        return GraphStore(path)
+
+    @staticmethod
+    def exists(path):
+        return os.path.isfile(os.path.join(path, GraphStore.META_FILE))
+
+    def degree(self):
+        return np.diff(self.indptr)
+
+    def vertex_set(self, vertex_indices=None):
+        """Sorted ids of the given vertices, or of every vertex if None."""
+        if vertex_indices is None:
+            return np.arange(self.num_vertices)
+        vertices = np.unique(vertex_indices).astype(np.int64)
+        if len(vertices) and (vertices[0] < 0 or
+                              vertices[-1] >= self.num_vertices):
+            err_msg = 'vertex or edge indices not in G'
+            raise IndexError(err_msg)
+        return vertices
+
+    def edge_columns(self, vertex_indices=None, edge_indices=None):
+        """Source, target and edge index columns of the subgraph induced by
+        the given vertex and edge indices (None selects all), ordered by edge
+        index. Same as Helpers.edge_array on Helpers.induced_view.
+        """
+
+        if edge_indices is None:
+            positions = np.arange(self.num_edges)
+        else:
+            edge_indices = np.unique(edge_indices).astype(np.int64)
+            if self.contiguous:
+                positions = edge_indices
+            else:
+                positions = np.searchsorted(self.eidx, edge_indices)
+            if len(positions) and (
+                    edge_indices[0] < 0 or
+                    positions[-1] >= self.num_edges or
+                    not np.array_equal(self.eidx[positions], edge_indices)):
+                err_msg = 'vertex or edge indices not in G'
+                raise IndexError(err_msg)
+        src = self.src[positions]
+        tar = self.tar[positions]
+        eidx = self.eidx[positions]
+
+        if vertex_indices is not None:
+            inside = np.zeros(self.num_vertices, dtype=bool)
+            inside[self.vertex_set(vertex_indices)] = True
+            keep = inside[src] & inside[tar]
+            src, tar, eidx = src[keep], tar[keep], eidx[keep]
+        return src, tar, eidx
+
+    def local_graph(self, vertices, src, tar):
+        """Build a graph_tool.Graph on the given (sorted) vertices only, for
+        the algorithms graph-tool provides: vertex i stands for vertices[i]
+        and edge j for the j-th edge of src/tar.
+        """
+
+        H = gt.Graph(directed=self.directed)
+        H.add_vertex(len(vertices))
+        H.add_edge_list(np.column_stack((np.searchsorted(vertices, src),
+                                         np.searchsorted(vertices, tar))))
+        return H
+
+    def component_labels(self):
+        """Connected component label of every vertex (see
+        GraphPeeling.component_labels).
+        """
+        return component_labels(self.indptr, self.neighbors)
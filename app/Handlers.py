@@ -5,6 +5,7 @@ from subprocess import Popen, PIPE
 from Queue import Queue
 from Helpers import *
 from HierarchicalPartitioningTree import PartitionTree, PartitionNode
+from LevelOfDetail import coarsen
 from PartitionMethods import *
 """Handlers
 
@@ -19,6 +20,7 @@ OPERATIONS = {
     'connected_components': connected_components,
     'biconnected_components': biconnected_components,
     'edge_peel': edge_peel,
+    'native_edge_peel': native_edge_peel,
     'peel_one': peel_one,
     'k_connected_components': k_connected_components
 }
@@ -69,11 +71,31 @@ def remove_node_children(T, fully_qualified_label):
     """
 
     node = traverse_tree(T, fully_qualified_label)
-    node.remove_children()
+    T.remove_children(node)
     return {'node': node}
 
 
-def decompose_node(T, G, fully_qualified_label, operation):
+def node_statistics(T, G, fully_qualified_label):
+    """Get a PartitionNode's statistics.
+
+    Args:
+        T (PartitionTree): The hierarchy tree instance.
+        G (graph_tool.Graph): The graph instance, or a GraphStore.
+        fully_qualified_label (str): Full name of the PartitionNode.
+
+    Returns:
+        Degree, component size and peel value histograms and other
+        statistics of the PartitionNode's subgraph, computed (and kept) if
+        the node was created without them.
+    """
+
+    node = traverse_tree(T, fully_qualified_label)
+    annotate_statistics(G, [node])
+    return unpack_statistics(node.stats)
+
+
+def decompose_node(T, G, fully_qualified_label, operation, prefetcher=None,
+                   progress=None):
     """Decompose a PartitionNode using a specified partitioning operation.
 
     Args:
@@ -81,6 +103,10 @@ def decompose_node(T, G, fully_qualified_label, operation):
         G (graph_tool.Graph): The graph instance.
         fully_qualified_label (str): Full name of the PartitionNode.
         operation (str): The decomposing operation.
+        prefetcher (DecompositionPrefetcher): Source of decompositions
+            computed ahead of time, if any.
+        progress (callable): Progress callback of the operation (see
+            PartitionMethods).
 
     Returns:
         A list of information dicts about the newly-created
@@ -91,6 +117,32 @@ def decompose_node(T, G, fully_qualified_label, operation):
         Error message.
     """
 
+    response = partition_node(T, G, fully_qualified_label, operation,
+                              prefetcher=prefetcher, progress=progress)
+    if 'msg' in response:
+        return response
+    return attach_partition(T, fully_qualified_label, response)
+
+
+def partition_node(T, G, fully_qualified_label, operation, prefetcher=None,
+                   progress=None):
+    """Compute the children of a PartitionNode decomposed by a specified
+    partitioning operation, without adding them to the tree (see
+    attach_partition). The tree is only read, so it need not be locked
+    while the operation runs.
+
+    Args:
+        Same as decompose_node.
+
+    Returns:
+        The node, its new children (with their statistics) and the cross
+        edges of their metagraph.
+
+        or
+
+        Error message.
+    """
+
     if operation not in OPERATIONS:
         return {'msg': 'Invalid operation'}
 
@@ -100,8 +152,17 @@ def decompose_node(T, G, fully_qualified_label, operation):
 
     vlist = node.vertex_indices
     elist = node.edge_indices
-    op = OPERATIONS[operation]
-    children = op(G, vertex_indices=vlist, edge_indices=elist)
+    children = None
+    if prefetcher is not None:
+        children = prefetcher.take(node, operation, G)
+    if children is None:
+        op = OPERATIONS[operation]
+        children = op(G, vertex_indices=vlist, edge_indices=elist,
+                      progress=progress)
+    # covering operations also return the cross edges of their metagraph
+    cross_edges = []
+    if isinstance(children, tuple):
+        children, cross_edges = children
 
     if not children:
         msg = 'Could not decompose any further using method: {}'
@@ -115,24 +176,57 @@ def decompose_node(T, G, fully_qualified_label, operation):
             msg = 'Could not decompose any further using method: {}'
             return {'msg': msg.format(operation)}
 
-    node.children = children
+    annotate_statistics(G, children, (vlist, elist))
+    return {'node': node, 'children': children, 'cross_edges': cross_edges}
+
+
+def attach_partition(T, fully_qualified_label, partition):
+    """Add children computed by partition_node to their PartitionNode.
+
+    Args:
+        T (PartitionTree): The hierarchy tree instance (possibly a copy of
+            the one partition_node read).
+        fully_qualified_label (str): Full name of the PartitionNode.
+        partition (dict): What partition_node returned for the node.
+
+    Returns:
+        A list of information dicts about the newly-created
+        children nodes for the given PartitionNode.
+
+        or
+
+        Error message, if the node was changed since it was partitioned.
+    """
+
+    msg = 'Node was changed while it was being decomposed'
+    try:
+        node = traverse_tree(T, fully_qualified_label)
+    except KeyError:
+        return {'msg': msg}
+    if not node.is_leaf():
+        return {'msg': msg}
+    partitioned = partition['node']
+    # a copy of the tree must still hold the node as it was partitioned
+    if node is not partitioned and not (
+            np.array_equal(node.vertex_indices, partitioned.vertex_indices)
+            and np.array_equal(node.edge_indices, partitioned.edge_indices)):
+        return {'msg': msg}
+
+    node.cross_edges = partition['cross_edges']
+    T.add_children(node, partition['children'])
     node_info = []
-    for idx, child in enumerate(node.children):
-        child.parent = node
-        child.label = child.parent.label + '|' + child.label
+    for child in node.children:
         V = child.num_vertices()
         E = child.num_edges()
         short_label = child.label.split('|')[-1]
         node_info.append({
-            'fully_qualified_label': child.label + '_' + str(idx),
+            'fully_qualified_label': child.label,
             'short_label': short_label,
             'num_vertices': V,
             'num_edges': E,
             'vlogv': float_formatter(V * np.log2(V)),
             'is_leaf': child.is_leaf(),
         })
-    node.vertex_indices = []
-    node.edge_indices = []
 
     return {'node_info': node_info}
 
@@ -146,28 +240,59 @@ def induce_subgraph(G, vlist, elist):
         elist (list): List of edge indices to induce upon.
 
     Returns:
-        Vis.js formatted network data.
+        Vis.js formatted network data (as VisColumns; see stream_json).
     """
 
     if not G:
         return 'No graph loaded'
 
-    # get proper indices
-    vp = G.new_vp('bool', vals=False)
-    ep = G.new_ep('bool', vals=False)
-    if vlist is []:
-        vlist = np.ones_like(vp.a)
-    if elist is []:
-        elist = np.ones_like(ep.a)
-    vp.a[vlist] = True
-    ep.a[elist] = True
-    G.set_vertex_filter(vp)
-    G.set_edge_filter(ep)
+    H = induced_view(G, vlist, elist)
+
+    return {'vis_data': to_vis_columns(H)}
+
 
-    return {'vis_data': to_vis_json(G)}
+def level_of_detail(G, level, budget, mode=None, is_node=True):
+    """Draw a level of a node (see LevelOfDetail): its subgraph if it has
+    at most budget vertices, else its metagraph.
+
+    Args:
+        G (graph_tool.Graph): The graph instance.
+        level (Level): The level.
+        budget (int): Most nodes the client draws.
+        mode (str): Coarsening mode to try first (the first mode of
+                    Level.coarsening_modes that splits the level is used).
+        is_node (bool): Whether the level is the node's whole subgraph.
 
+    Returns:
+        Vis.js formatted network data (as VisColumns; see stream_json),
+        the mode it was coarsened by (None for the subgraph) and the size
+        of the level.
+    """
 
-def landmark_clustering(G, vlist, elist, cmd):
+    response = {
+        'num_vertices': level.num_vertices(),
+        'num_edges': level.num_edges(),
+    }
+    if level.num_vertices() <= budget:
+        H = induced_view(G, level.vertices, level.eidx)
+        response.update({'vis_data': to_vis_columns(H), 'mode': None})
+        return response
+
+    modes = level.coarsening_modes(is_node)
+    if mode is not None:
+        modes = [mode] + [m for m in modes if m != mode]
+    for mode in modes:
+        groups = level.groups(mode, budget)
+        if len(np.unique(groups)) > 1:
+            response.update({'vis_data': coarsen(level, groups, mode),
+                             'mode': mode})
+            return response
+
+    return {'msg': 'Graph is too large to visualize and does not coarsen '
+                   'any further'}
+
+
+def landmark_clustering(G, vlist, elist, cmd, progress=None):
     """Clusters the subgraph induced by the input vlist and elist using
     landmark clustering, which is implemented in as a callable binary.
 
@@ -175,6 +300,9 @@ def landmark_clustering(G, vlist, elist, cmd):
         G (graph_tool.Graph): The graph instance.
         vlist (list): List of vertex indices to induce upon.
         elist (list): List of edge indices to induce upon.
+        progress (callable): Called as the adjacency list is passed to the
+            binary, with the number of vertices passed, the total and a
+            message. The binary is killed if it raises.
 
     Returns:
         A list of information dicts about the newly-created
@@ -183,29 +311,33 @@ def landmark_clustering(G, vlist, elist, cmd):
         or
 
         A dict containing information regarding the clustering, including
-        Vis.js formatted network data.
+        Vis.js formatted network data (as VisColumns).
     """
 
-    vfilt = G.new_vp('bool', vals=False)
-    vfilt.a[vlist] = True
-    G.set_vertex_filter(vfilt)
-    efilt = G.new_ep('bool', vals=False)
-    efilt.a[elist] = True
-    G.set_edge_filter(efilt)
+    G = induced_view(G, vlist, elist)
+    num_vertices = G.num_vertices()
 
     p = Popen([cmd], shell=True, stdout=PIPE, stdin=PIPE)
 
-    for v in G.vertices():
-        neighbors = [u for u in v.out_neighbours()]
-        # First column for v; following columns are neighbors.
-        # NOTE: Adjacency list is redundant for undirected graphs
-        out_str = ('{} ' +
-                   ('{} ' * len(neighbors))[:-1] +
-                   '\n').format(v, *neighbors)
-        # yield out_str
-        p.stdin.write(out_str)
-        p.stdin.flush()
+    try:
+        for idx, v in enumerate(G.vertices()):
+            if progress is not None and idx % 4096 == 0:
+                progress(idx, num_vertices, 'Passing adjacency list')
+            neighbors = [u for u in v.out_neighbours()]
+            # First column for v; following columns are neighbors.
+            # NOTE: Adjacency list is redundant for undirected graphs
+            out_str = ('{} ' +
+                       ('{} ' * len(neighbors))[:-1] +
+                       '\n').format(v, *neighbors)
+            # yield out_str
+            p.stdin.write(out_str)
+            p.stdin.flush()
+    except:
+        p.kill()
+        raise
     p.stdin.close()
+    if progress is not None:
+        progress(num_vertices, num_vertices, 'Clustering')
 
     # get landmarks and clusters
     landmark_map = {}
@@ -247,11 +379,11 @@ def landmark_clustering(G, vlist, elist, cmd):
     for branch in tree[1:]:
         branches.update(branch)
 
-    vis_data = to_vis_json_cluster_map(G,
-                                       cluster_assignment,
-                                       landmark_map,
-                                       spine,
-                                       branches)
+    vis_data = to_vis_columns_cluster_map(G,
+                                          cluster_assignment,
+                                          landmark_map,
+                                          spine,
+                                          branches)
     return {
         'vis_data': vis_data,
         'cluster_assignment': cluster_assignment
@@ -298,25 +430,22 @@ def make_landmark_cluster_children(G, T, fully_qualified_label,
             msg = 'Could not decompose any further using method: {}'
             return {'msg': msg.format(operation)}
 
+    annotate_statistics(G, children, (vlist, elist))
     node.cross_edges = cross_edges
-    node.children = children
+    T.add_children(node, children)
     node_info = []
-    for idx, child in enumerate(node.children):
-        child.parent = node
-        child.label = child.parent.label + '|' + child.label
+    for child in node.children:
         V = child.num_vertices()
         E = child.num_edges()
         short_label = child.label.split('|')[-1]
         node_info.append({
-            'fully_qualified_label': child.label + '_' + str(idx),
+            'fully_qualified_label': child.label,
             'short_label': short_label,
             'num_vertices': V,
             'num_edges': E,
             'vlogv': float_formatter(V * np.log2(V)),
             'is_leaf': child.is_leaf(),
         })
-    node.vertex_indices = []
-    node.edge_indices = []
 
     return {'node_info': node_info}
 
@@ -348,12 +477,9 @@ def metagraph(T, fully_qualified_label):
 
     cross_edges = node.cross_edges
     metanodes = {}
-    for child in node.children:
-        # grab numerical value of child node
-        # NOTE: should really be the same as [-1], but [-2] makes more
-        #       logical sense in this case.
+    # cross edges are keyed by pairs of positions of children
+    for mn_id, child in enumerate(node.children):
         short_label = child.label.split('|')[-1]
-        mn_id = short_label.split('_')[-2]
         metanodes[mn_id] = {
             'id': mn_id,
             'fully_qualified_label': child.label,
@@ -367,7 +493,7 @@ def metagraph(T, fully_qualified_label):
     return {'vis_data': vis_data}
 
 
-def bcc_tree(G, vlist, elist):
+def bcc_tree(G, vlist, elist, progress=None):
     """Get biconnected component tree view of a subgraph defined by the input
     vertex and edge lists.
 
@@ -375,26 +501,20 @@ def bcc_tree(G, vlist, elist):
         G (graph_tool.Graph): The graph instance.
         vlist (list): List of vertex indices to induce upon.
         elist (list): List of edge indices to induce upon.
+        progress (callable): Called after each step with the number of
+            steps done, the total and a message.
 
     Returns:
         An object containing information regarding the BCC tree created,
-        including Vis.js formatted network data.
+        including Vis.js formatted network data (as VisColumns).
     """
 
-    # get proper indices
-    vp = G.new_vp('bool', vals=False)
-    ep = G.new_ep('bool', vals=False)
-    if vlist is [] or vlist is None:
-        vlist = np.ones_like(vp.a)
-    if elist is [] or elist is None:
-        elist = np.ones_like(ep.a)
-    vp.a[vlist] = True
-    ep.a[elist] = True
-    G.set_vertex_filter(vp)
-    G.set_edge_filter(ep)
+    G = induced_view(G, vlist, elist)
 
     # label biconnected components
     bcc, art, _ = gt.label_biconnected_components(G)
+    if progress is not None:
+        progress(1, 3, 'Labeled biconnected components')
 
     # create metagraph
     Gp = gt.Graph(directed=False)
@@ -435,6 +555,9 @@ def bcc_tree(G, vlist, elist):
     num_components = len(np.unique(comp.a))
     assert Gp.num_edges() == Gp.num_vertices() - num_components
 
+    if progress is not None:
+        progress(2, 3, 'Built BCC tree')
+
     # TODO: Handle no articulation points (single BCC)
     # articulation point degree distribution
     ap_degrees = [v.out_degree() for v in ap_list]
@@ -445,7 +568,7 @@ def bcc_tree(G, vlist, elist):
     bcc_size_bins, bcc_size_counts = \
         zip(*sorted(Counter(zip(*B)[-1]).items()))
 
-    vis_data = to_vis_json_bcc_tree(Gp)
+    vis_data = to_vis_columns_bcc_tree(Gp)
 
     return {
         'vis_data': vis_data,
@@ -469,13 +592,7 @@ def bfs_tree(G, vlist, elist, root_idx):
         An object containing edges used in BFS spanning tree.
     """
 
-    # set filters
-    vfilt = G.new_vp('bool', vals=False)
-    vfilt.a[vlist] = True
-    G.set_vertex_filter(vfilt)
-    efilt = G.new_ep('bool', vals=False)
-    efilt.a[elist] = True
-    G.set_edge_filter(efilt)
+    G = induced_view(G, vlist, elist)
 
     N = G.num_vertices()
     v = G.vertex(root_idx)
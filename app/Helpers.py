@@ -1,20 +1,278 @@
 import graph_tool.all as gt
 import json
 import numpy as np
+import struct
 from collections import Counter
 from subprocess import Popen, PIPE
-from HierarchicalPartitioningTree import PartitionTree, PartitionNode
+from GraphPeeling import component_labels, core_numbers, csr_adjacency
+from GraphStore import GraphStore
+from HierarchicalPartitioningTree import IndexPool, PartitionTree
+from HierarchicalPartitioningTree import PartitionNode
 """Helpers
 
 This module provides helper functions.
 """
 
 
+def induced_view(G, vertex_indices=None, edge_indices=None):
+    """Induce a subgraph of G without touching G's own filters.
+
+    Args:
+        G (graph_tool.Graph): The graph instance.
+        vertex_indices (list): List of vertex indices to induce upon.
+        edge_indices (list): List of edge indices to induce upon.
+
+    Returns:
+        An independent graph_tool.GraphView of G restricted to the given
+        vertex and edge indices.
+    """
+
+    vp = G.new_vp('bool', vals=False)
+    ep = G.new_ep('bool', vals=False)
+    try:
+        vp.a[vertex_indices] = True
+        ep.a[edge_indices] = True
+    except:
+        err_msg = 'vertex or edge indices not in G'
+        raise IndexError(err_msg)
+    return gt.GraphView(G, vfilt=vp, efilt=ep)
+
+
+def edge_array(G):
+    """Source, target and edge index columns of every edge visible through
+    G's filters (if G is a view), ordered by edge index.
+    """
+
+    try:
+        edges = G.get_edges([G.edge_index])
+    except TypeError:
+        # older graph-tool releases always append the edge index column
+        edges = G.get_edges()
+    edges = edges[np.argsort(edges[:, 2], kind='mergesort')]
+    return edges[:, 0], edges[:, 1], edges[:, 2]
+
+
+def edge_columns(G, vertex_indices=None, edge_indices=None):
+    """Source, target and edge index columns of the subgraph of G (a
+    graph_tool.Graph or a GraphStore) induced by the given vertex and edge
+    indices, ordered by edge index.
+    """
+
+    if isinstance(G, GraphStore):
+        return G.edge_columns(vertex_indices, edge_indices)
+    return edge_array(induced_view(G, vertex_indices, edge_indices))
+
+
+def vertex_set(G, vertex_indices=None):
+    """Sorted ids of the vertices of G (a graph_tool.Graph or a GraphStore)
+    induced by the given vertex indices.
+    """
+
+    if isinstance(G, GraphStore):
+        return G.vertex_set(vertex_indices)
+    H = induced_view(G, vertex_indices, None)
+    return np.where(H.new_vp('bool', vals=True).a == 1)[0]
+
+
+def graph_store(G, path):
+    """Attach to the GraphStore at path, exporting G to it first unless a
+    complete store is already there.
+
+    Args:
+        G (graph_tool.Graph): The graph instance (unfiltered).
+        path (str): Directory of the store.
+
+    Returns:
+        The attached GraphStore.
+    """
+
+    if GraphStore.exists(path):
+        store = GraphStore(path)
+        if (store.num_vertices == G.num_vertices() and
+                store.num_edges == G.num_edges()):
+            return store
+    src, tar, eidx = edge_array(G)
+    return GraphStore.create(path, src, tar, eidx, G.num_vertices(),
+                             directed=G.is_directed())
+
+
+def group_by_label(labels, values):
+    """Group values by their corresponding labels.
+
+    Returns:
+        The sorted distinct labels and a list with one array of values per
+        label, in the same order. Values keep their relative order.
+    """
+    if len(labels) == 0:
+        return labels, []
+    order = np.argsort(labels, kind='mergesort')
+    labels = labels[order]
+    bounds = np.flatnonzero(labels[1:] != labels[:-1]) + 1
+    keys = labels[np.concatenate(([0], bounds))]
+    return keys, np.split(values[order], bounds)
+
+
+def distinct_pairs(labels, values):
+    """Drop repeated (label, value) pairs, returning both columns sorted by
+    label and then by value.
+    """
+    order = np.lexsort((values, labels))
+    labels = labels[order]
+    values = values[order]
+    keep = np.ones(len(labels), dtype=bool)
+    keep[1:] = (labels[1:] != labels[:-1]) | (values[1:] != values[:-1])
+    return labels[keep], values[keep]
+
+
+def _csr_histograms(indptr, neighbors):
+    # degree, component size and peel value histograms of a CSR adjacency,
+    # each as a (bins, counts) pair of arrays
+    deg_bins, deg_counts = np.unique(np.diff(indptr), return_counts=True)
+    _, cc_hist = np.unique(component_labels(indptr, neighbors),
+                           return_counts=True)
+    cc_sizes, cc_counts = np.unique(cc_hist, return_counts=True)
+    peel_bins, peel_counts = np.unique(core_numbers(indptr, neighbors),
+                                       return_counts=True)
+    return [deg_bins, deg_counts, cc_sizes, cc_counts, peel_bins, peel_counts]
+
+
+def _store_statistics(store):
+    """Same statistics as statistics(), computed from the arrays of a
+    GraphStore without building a graph.
+    """
+
+    float_formatter = lambda x: '{:.2f}'.format(x)
+    deg_bins, deg_counts, cc_sizes, cc_counts, peel_bins, peel_counts = \
+        _csr_histograms(store.indptr, store.neighbors)
+
+    vlogv = store.num_vertices * np.log2(store.num_vertices)
+
+    return {
+        'num_vertices': store.num_vertices,
+        'num_edges': store.num_edges,
+        'num_cc': int(cc_counts.sum()),
+        'num_singletons': int((store.degree() == 0).sum()),
+        'vlogv': float_formatter(vlogv),
+        'deg_bins': deg_bins.tolist(),
+        'deg_counts': deg_counts.tolist(),
+        'cc_sizes': cc_sizes.tolist(),
+        'cc_counts': cc_counts.tolist(),
+        'peel_bins': peel_bins.tolist(),
+        'peel_counts': peel_counts.tolist(),
+    }
+
+
+def subgraph_statistics(G, vertex_indices=None, edge_indices=None):
+    """Summarize the subgraph of G (a graph_tool.Graph or a GraphStore)
+    induced by the given vertex and edge indices.
+
+    Returns:
+        The vertex and edge counts of the subgraph, followed by the lengths
+        and then the bins and counts of its degree, component size and peel
+        value histograms, packed into one array (see unpack_statistics).
+    """
+
+    vertices = vertex_set(G, vertex_indices)
+    src, tar, _ = edge_columns(G, vertex_indices, edge_indices)
+    return _pack_statistics(vertices, src, tar)
+
+
+def _pack_statistics(vertices, src, tar):
+    # statistics of the graph of the given (sorted) vertices and edges
+    indptr, neighbors, _ = csr_adjacency(np.searchsorted(vertices, src),
+                                         np.searchsorted(vertices, tar),
+                                         len(vertices))
+    histograms = _csr_histograms(indptr, neighbors)
+    header = [len(vertices), len(src)] + [len(h) for h in histograms[::2]]
+    return IndexPool.as_array(np.concatenate([header] + histograms))
+
+
+def _contains(sorted_values, values):
+    # whether each of values is in sorted_values
+    if len(sorted_values) == 0:
+        return np.zeros(len(values), dtype=bool)
+    positions = np.searchsorted(sorted_values, values)
+    positions[positions == len(sorted_values)] = 0
+    return sorted_values[positions] == values
+
+
+def unpack_statistics(stats):
+    """Expand an array packed by subgraph_statistics.
+
+    Returns:
+        A dict with the keys of statistics(), and the edge density of the
+        subgraph.
+    """
+
+    float_formatter = lambda x: '{:.2f}'.format(x)
+    num_vertices = int(stats[0])
+    num_edges = int(stats[1])
+    lengths = np.repeat(stats[2:5], 2)
+    bounds = 5 + np.concatenate(([0], np.cumsum(lengths)))
+    deg_bins, deg_counts, cc_sizes, cc_counts, peel_bins, peel_counts = \
+        [stats[a:b].tolist() for a, b in zip(bounds[:-1], bounds[1:])]
+
+    vlogv = num_vertices * np.log2(num_vertices) if num_vertices else 0
+    num_pairs = num_vertices * (num_vertices - 1) / 2.0
+    density = num_edges / num_pairs if num_pairs else 0
+
+    return {
+        'num_vertices': num_vertices,
+        'num_edges': num_edges,
+        'num_cc': sum(cc_counts),
+        'num_singletons': deg_counts[0] if deg_bins[:1] == [0] else 0,
+        'vlogv': float_formatter(vlogv),
+        'density': float_formatter(density),
+        'deg_bins': deg_bins,
+        'deg_counts': deg_counts,
+        'cc_sizes': cc_sizes,
+        'cc_counts': cc_counts,
+        'peel_bins': peel_bins,
+        'peel_counts': peel_counts,
+    }
+
+
+def annotate_statistics(G, nodes, within=None):
+    """Set the statistics (see subgraph_statistics) of the given
+    PartitionNodes that have none yet.
+
+    Args:
+        G (graph_tool.Graph): The graph instance, or a GraphStore.
+        nodes (list): The PartitionNodes.
+        within (tuple): Vertex and edge indices of the node that the nodes
+            were decomposed from, if any. Its edges are then read from G
+            once, and each node's statistics computed from those in time
+            linear in the node's size, instead of in the size of G.
+    """
+
+    nodes = [node for node in nodes if node.stats is None]
+    if within is None:
+        for node in nodes:
+            node.stats = subgraph_statistics(G, node.vertex_indices,
+                                             node.edge_indices)
+        return
+    if not nodes:
+        return
+
+    src, tar, eidx = edge_columns(G, *within)
+    for node in nodes:
+        vertices = np.unique(node.vertex_indices).astype(np.int64)
+        edges = np.unique(node.edge_indices).astype(np.int64)
+        # the node's edges among the parent's (ordered by edge index), with
+        # both endpoints in the node
+        positions = np.searchsorted(eidx, edges)
+        positions = positions[_contains(eidx, edges)]
+        positions = positions[_contains(vertices, src[positions]) &
+                              _contains(vertices, tar[positions])]
+        node.stats = _pack_statistics(vertices, src[positions],
+                                      tar[positions])
+
+
 def statistics(G):
     """Provides general graph statistics.
 
     Args:
-        G (graph_tool.Graph): The graph instance.
+        G (graph_tool.Graph): The graph instance, or a GraphStore.
 
     Returns:
         An object with describing many statistical properties of the graph.
@@ -22,6 +280,8 @@ def statistics(G):
 
     if not G:
         return 'No Graph Loaded'
+    if isinstance(G, GraphStore):
+        return _store_statistics(G)
     float_formatter = lambda x: '{:.2f}'.format(x)
 
     if G.get_vertex_filter()[0] is not None:
@@ -88,18 +348,11 @@ def kcore_decomposition(G, vlist=[], elist=[]):
         Dict with keys as kcore values and values as vertex IDs.
     """
 
-    # initiate filters, if necessary
-    if vlist or elist:
-        vp = G.new_vp('bool', vals=False)
-        ep = G.new_ep('bool', vals=False)
-        if vlist is []:
-            vlist = np.ones_like(vp.a)
-        elif elist is []:
-            elist = np.ones_like(ep.a)
-        vp.a[vlist] = True
-        ep.a[elist] = True
-        G.set_vertex_filter(vp)
-        G.set_edge_filter(ep)
+    # induce subgraph, if necessary
+    if len(vlist) or len(elist):
+        G = induced_view(G,
+                         vlist if len(vlist) else None,
+                         elist if len(elist) else None)
 
     cmd = './app/bin/graph_peeling.bin -t core -o core'
     p = Popen([cmd], shell=True, stdout=PIPE, stdin=PIPE)
@@ -132,18 +385,15 @@ def traverse_tree(T, fully_qualified_label):
 
     Returns:
         PartitionNode with given label.
+
+    Raises:
+        KeyError: No node of T has the given label.
     """
 
-    if fully_qualified_label.lower() == 'root':
-        return T.root
     sub_ids = fully_qualified_label.split('|')
     if sub_ids[0].lower() == 'root':
         sub_ids = sub_ids[1:]
-    node = T.root
-    for s in xrange(len(sub_ids)):
-        idx = int(sub_ids[s].split('_')[-1])
-        node = node.children[idx]
-    return node
+    return T.find('|'.join([T.root.label] + sub_ids))
 
 
 def get_indices(T, fully_qualified_label):
@@ -159,12 +409,7 @@ def get_indices(T, fully_qualified_label):
     """
 
     node = traverse_tree(T, fully_qualified_label)
-    if len(node.vertex_indices) != 0:
-        vlist = node.vertex_indices
-        elist = node.edge_indices
-    else:
-        vlist, elist = PartitionTree.collect_indices(node)
-    return vlist, elist
+    return node.vertex_indices, node.edge_indices
 
 
 def save_adjacency(G, vlist, elist, filename):
@@ -172,7 +417,7 @@ def save_adjacency(G, vlist, elist, filename):
     resulting adjacency list to a file.
 
     Args:
-        G (graph_tool.Graph): The graph instance.
+        G (graph_tool.Graph): The graph instance, or a GraphStore.
         vlist (list): List of vertex indices to induce upon.
         elist (list): List of edge indices to induce upon.
         filename (str): Filepath to write adjacency.
@@ -181,13 +426,20 @@ def save_adjacency(G, vlist, elist, filename):
         Confirmation or error message.
     """
 
-    # get proper indices
-    vp = G.new_vp('bool', vals=False)
-    ep = G.new_ep('bool', vals=False)
-    vp.a[vlist] = True
-    ep.a[elist] = True
-    G.set_vertex_filter(vp)
-    G.set_edge_filter(ep)
+    if isinstance(G, GraphStore):
+        vertices = G.vertex_set(vlist)
+        src, tar, _ = G.edge_columns(vlist, elist)
+        indptr, neighbors, _ = csr_adjacency(np.searchsorted(vertices, src),
+                                             np.searchsorted(vertices, tar),
+                                             len(vertices))
+        neighbors = vertices[neighbors]
+        with open(filename, 'w') as f:
+            for i, v in enumerate(vertices):
+                row = np.concatenate(([v], neighbors[indptr[i]:indptr[i + 1]]))
+                f.write(' '.join(map(str, row)) + '\n')
+        return {'msg': 'Adjacency saved as {}'.format(filename)}
+
+    G = induced_view(G, vlist, elist)
 
     with open(filename, 'w') as f:
         for v in G.vertices():
@@ -392,3 +644,297 @@ def to_vis_json_metagraph(metanodes, cross_edges):
         })
 
     return {'nodes': nodes, 'edges': edges}
+
+
+class VisColumns(object):
+    """Vis.js formatted network data held as columns.
+
+    Serializes to the same JSON as the to_vis_json* functions' output, but
+    is built from whole arrays of the graph instead of per vertex and per
+    edge, and is written out in chunks (see stream_json).
+
+    Args:
+        nodes (list): (key, values) pairs, one per field of the nodes.
+        edges (list): (key, values) pairs, one per field of the edges.
+    """
+
+    def __init__(self, nodes, edges):
+        self.nodes = [(key, np.asarray(values)) for key, values in nodes]
+        self.edges = [(key, np.asarray(values)) for key, values in edges]
+
+    def num_nodes(self):
+        return len(self.nodes[0][1]) if self.nodes else 0
+
+    def chunks(self, chunk_size=2048):
+        """JSON text of the data, chunk_size nodes or edges at a time."""
+        yield '{"nodes":['
+        for chunk in _json_records(self.nodes, chunk_size):
+            yield chunk
+        yield '],"edges":['
+        for chunk in _json_records(self.edges, chunk_size):
+            yield chunk
+        yield ']}'
+
+
+def _json_column(values):
+    # JSON text of every value of a column slice
+    if values.dtype.kind in 'iu':
+        return np.char.mod('%d', values)
+    if values.dtype.kind == 'b':
+        return np.where(values, 'true', 'false')
+    return [json.dumps(value) for value in values.tolist()]
+
+
+def _json_records(columns, chunk_size):
+    if not columns:
+        return
+    template = '{' + ','.join('{}:%s'.format(json.dumps(key))
+                              for key, _ in columns) + '}'
+    num_records = len(columns[0][1])
+    for start in xrange(0, num_records, chunk_size):
+        end = start + chunk_size
+        rows = zip(*[_json_column(values[start:end])
+                     for _, values in columns])
+        chunk = ','.join(template % row for row in rows)
+        yield chunk if start == 0 else ',' + chunk
+
+
+def _property_values(prop, indices):
+    # values of a vertex or edge property at the given (unfiltered) indices
+    values = prop.a
+    if values is None:
+        # string properties have no array
+        return [prop[idx] for idx in indices]
+    return values[indices]
+
+
+def _json_default(obj):
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError('{!r} is not JSON serializable'.format(obj))
+
+
+def stream_json(obj, chunk_size=2048):
+    """JSON text of obj in chunks. VisColumns anywhere within obj (a value
+    of nested dicts) are written out chunk by chunk; everything else is
+    serialized at once.
+    """
+
+    if isinstance(obj, VisColumns):
+        for chunk in obj.chunks(chunk_size):
+            yield chunk
+    elif isinstance(obj, dict):
+        yield '{'
+        for idx, (key, value) in enumerate(obj.iteritems()):
+            if not isinstance(key, basestring):
+                key = str(key)
+            yield '{}{}:'.format(',' if idx else '', json.dumps(key))
+            for chunk in stream_json(value, chunk_size):
+                yield chunk
+        yield '}'
+    else:
+        yield json.dumps(obj, default=_json_default)
+
+
+# binary encoding of JSON-like objects holding VisColumns (see pack_binary)
+BINARY_MAGIC = 'VISB'
+BINARY_VERSION = 1
+# typed array element types of packed integer columns, narrowest first
+BINARY_INT_TYPES = [('i1', np.int8), ('i2', np.int16), ('i4', np.int32)]
+
+
+def _pack_column(values):
+    # (field description, little-endian array) of a column; integers are
+    # packed in the narrowest type that holds them (doubles past int32,
+    # exact below 2 ** 53) and anything else as codes into a string table
+    kind = values.dtype.kind
+    if kind == 'b':
+        return {'type': 'bool'}, values.astype('<u1')
+    if kind in 'iu':
+        for code, dtype in BINARY_INT_TYPES:
+            limits = np.iinfo(dtype)
+            if len(values) == 0 or (values.min() >= limits.min and
+                                    values.max() <= limits.max):
+                return {'type': code}, values.astype('<' + code)
+        return {'type': 'f8'}, values.astype('<f8')
+    if kind == 'f':
+        return {'type': 'f8'}, values.astype('<f8')
+
+    items = values.tolist()
+    if all(isinstance(item, basestring) for item in items):
+        field = {'type': 'str'}
+    else:
+        field = {'type': 'json'}
+        items = [json.dumps(item, default=_json_default) for item in items]
+    table = {}
+    codes = np.array([table.setdefault(item, len(table)) for item in items],
+                     dtype=np.int64)
+    code_field, data = _pack_column(codes)
+    field['codes'] = code_field['type']
+    field['table'] = sorted(table, key=table.get)
+    return field, data
+
+
+def _pack_columns(columns, blobs):
+    # description of the columns, whose arrays are appended to blobs
+    fields = []
+    for key, values in columns:
+        field, data = _pack_column(values)
+        data = data.tostring()
+        field['key'] = key
+        field['offset'] = sum(len(blob) for blob in blobs)
+        # typed arrays must start at a multiple of their element size
+        blobs.append(data + '\0' * (-len(data) % 8))
+        fields.append(field)
+    count = len(columns[0][1]) if columns else 0
+    return {'count': count, 'fields': fields}
+
+
+def _pack_value(obj, blobs):
+    if isinstance(obj, VisColumns):
+        return {'$columns': {
+            'nodes': _pack_columns(obj.nodes, blobs),
+            'edges': _pack_columns(obj.edges, blobs),
+        }}
+    if isinstance(obj, dict):
+        return {key if isinstance(key, basestring) else str(key):
+                _pack_value(value, blobs) for key, value in obj.iteritems()}
+    if isinstance(obj, (list, tuple)):
+        return [_pack_value(value, blobs) for value in obj]
+    return obj
+
+
+def pack_binary(obj):
+    """Binary encoding of obj, in chunks: a compact alternative to
+    stream_json for responses holding VisColumns.
+
+    The encoding is the magic 'VISB', the format version and the length of
+    a header (little-endian uint32s), the header, and the packed columns.
+    The header is obj as JSON, with every VisColumns replaced by
+    {'$columns': {'nodes': ..., 'edges': ...}}, each describing its columns
+    (key, type and offset of each array from the end of the header, and
+    string tables) and the number of records. Columns are packed as
+    little-endian arrays, each 8-byte aligned, for the client to read as
+    typed arrays.
+    """
+
+    blobs = []
+    header = json.dumps(_pack_value(obj, blobs), default=_json_default)
+    # pad with whitespace so the columns start 8-byte aligned
+    header += ' ' * (-(len(header) + 12) % 8)
+    yield BINARY_MAGIC + struct.pack('<II', BINARY_VERSION, len(header))
+    yield header
+    for blob in blobs:
+        yield blob
+
+
+def to_vis_columns(G):
+    """Produce Vis.js formatted network data (general), as columns.
+
+    Args:
+        G (graph_tool.Graph): The graph instance.
+
+    Returns:
+        VisColumns of the same data as to_vis_json(G).
+    """
+
+    vertices = G.get_vertices()
+    labels = _property_values(G.vp['id'], vertices)
+    src, tar, eidx = edge_array(G)
+    nodes = [
+        ('id', vertices),
+        ('label', labels),
+        ('title', labels),
+        ('value', G.get_out_degrees(vertices)),
+        ('group', np.ones(len(vertices), dtype=int)),
+    ]
+    edges = [
+        ('id', eidx),
+        ('from', src),
+        ('to', tar),
+    ]
+    return VisColumns(nodes, edges)
+
+
+def to_vis_columns_bcc_tree(G):
+    """Produce Vis.js formatted network data (for BCC trees), as columns.
+
+    Args:
+        G (graph_tool.Graph): The graph instance.
+
+    Returns:
+        VisColumns of the same data as to_vis_json_bcc_tree(G).
+    """
+
+    AP_GROUP = 0
+    BCC_METANODE_GROUP = 1
+    vertices = G.get_vertices()
+    counts = G.vp['count'].a[vertices]
+    is_art = G.vp['is_articulation'].a[vertices].astype(bool)
+    ids = _property_values(G.vp['id'], vertices)
+    titles = ['AP: {}'.format(ids[idx]) if is_art[idx] else
+              'BCC: {} | Count: {}'.format(v_id, counts[idx])
+              for idx, v_id in enumerate(vertices)]
+    labels = [ids[idx] if is_art[idx] else title
+              for idx, title in enumerate(titles)]
+    src, tar, eidx = edge_array(G)
+    nodes = [
+        ('id', vertices),
+        ('label', labels),
+        ('title', titles),
+        ('value', counts),
+        ('group', np.where(is_art, AP_GROUP, BCC_METANODE_GROUP)),
+    ]
+    edges = [
+        ('id', eidx),
+        ('from', src),
+        ('to', tar),
+        ('value', G.ep['count'].a[eidx]),
+    ]
+    return VisColumns(nodes, edges)
+
+
+def to_vis_columns_cluster_map(G,
+                               cluster_assignment,
+                               landmark_map,
+                               spine,
+                               branches):
+    """Produce Vis.js formatted network data (for clusters), as columns.
+
+    Args:
+        G (graph_tool.Graph): The graph instance.
+        cluster_assignment (dict): Mapping of vertices to clusters.
+        landmark_map (set): Set containing landmark vertices.
+        spine (set): Set containing edges on spine.
+        branches (set): Set containing edges on spinal branches.
+
+    Returns:
+        VisColumns of the same data as to_vis_json_cluster_map(G, ...).
+    """
+
+    vertices = G.get_vertices()
+    labels = _property_values(G.vp['id'], vertices)
+    is_landmark = np.in1d(vertices, list(landmark_map))
+    src, tar, eidx = edge_array(G)
+    spine_idx = [G.edge_index[e] for e in spine]
+    branch_idx = [G.edge_index[e] for e in branches]
+    category = np.where(np.in1d(eidx, branch_idx), 'branch', 'none')
+    category = np.where(np.in1d(eidx, spine_idx), 'spine', category)
+    nodes = [
+        ('id', vertices),
+        ('label', labels),
+        ('title', labels),
+        ('value', G.get_out_degrees(vertices)),
+        ('group', [cluster_assignment[v] for v in vertices.tolist()]),
+        ('shape', np.where(is_landmark, 'star', 'dot')),
+        ('borderWidth', np.where(is_landmark, 2, 1)),
+    ]
+    edges = [
+        ('id', eidx),
+        ('from', src),
+        ('to', tar),
+        ('category', category),
+    ]
+    return VisColumns(nodes, edges)
@@ -5,14 +5,207 @@ import Queue
 """HierarchicalPartitioningTree
 
 This module contains the class definitions for the Hierarchical Partitioning
-Tree -- PartitionTree and PartitionNode.
+Tree -- PartitionTree and PartitionNode -- along with IndexPool, in which the
+nodes of a tree keep their vertex and edge indices.
 """
 
+INT32_MAX = np.iinfo(np.int32).max
+
+
+class IndexPool(object):
+    """Index sets stored back to back in one growable array.
+
+    The nodes of a tree share one vertex pool and one edge pool and only
+    keep the (offset, length) of their own slice. When a tree is compacted,
+    children are laid out within their parent's slice whenever they do not
+    overlap, so the pools take up about one int32 per vertex or edge of the
+    graph plus the indices that are repeated across overlapping children.
+
+    A pool may sit on top of a base array it does not own (e.g. a memory-
+    mapped one, see TreeStorage.load_tree): indices appended later go to an
+    in-memory overflow past the end of the base, which is never copied. The
+    dtype of a pool is fixed when it is created; a tree's pools are created
+    with its root, whose indices bound those of every other node.
+    """
+
+    __slots__ = ('base', 'data', 'size')
+
+    def __init__(self, indices=(), dtype=None):
+        data = IndexPool.as_array(indices)
+        if dtype is not None:
+            data = IndexPool.cast(data, dtype)
+        self.base = np.empty(0, dtype=data.dtype)
+        # the overflow, with spare capacity past size
+        self.data = data
+        self.size = len(data)
+
+    @staticmethod
+    def wrap(data):
+        """Pool over an existing array (e.g. a memory-mapped one), without
+        copying it.
+        """
+        pool = IndexPool(dtype=data.dtype)
+        pool.base = data
+        return pool
+
+    @staticmethod
+    def as_array(indices, dtype=np.int32):
+        """Copy indices into a new int32 array (int64 if they do not fit)."""
+        if isinstance(indices, (set, frozenset)):
+            indices = list(indices)
+        indices = np.asarray(indices)
+        if len(indices) and indices.max() > INT32_MAX:
+            dtype = np.int64
+        return indices.astype(dtype)
+
+    @staticmethod
+    def cast(indices, dtype):
+        """indices (as returned by as_array) as an array of dtype.
+
+        Raises:
+            ValueError: The indices do not fit dtype.
+        """
+        dtype = np.dtype(dtype)
+        if indices.dtype.itemsize > dtype.itemsize:
+            err_msg = 'Indices do not fit an index pool of {}'.format(dtype)
+            raise ValueError(err_msg)
+        return indices.astype(dtype, copy=False)
+
+    @property
+    def dtype(self):
+        return self.base.dtype
+
+    def view(self, offset, length):
+        base_size = len(self.base)
+        if offset < base_size:
+            return self.base[offset:offset + length]
+        offset -= base_size
+        return self.data[offset:offset + length]
+
+    def array(self):
+        """All indices of the pool (zero-copy unless it has both a base and
+        an overflow).
+        """
+        if len(self.base) == 0:
+            return self.data[:self.size]
+        if self.size == 0:
+            return self.base
+        return np.concatenate((self.base, self.data[:self.size]))
+
+    def append(self, indices):
+        """Store indices at the end of the pool and return their offset.
+        Slices already stored (and views of them) are left untouched.
+        """
+        indices = IndexPool.cast(IndexPool.as_array(indices), self.dtype)
+        offset = self.size
+        end = offset + len(indices)
+        if end > len(self.data):
+            grown = np.empty(max(end, 2 * len(self.data)),
+                             dtype=self.dtype)
+            grown[:offset] = self.data[:offset]
+            self.data = grown
+        self.data[offset:end] = indices
+        self.size = end
+        return len(self.base) + offset
+
+    def write(self, offset, indices):
+        """Overwrite the slice starting at offset with indices (which must
+        lie within the base or within the overflow).
+        """
+        indices = IndexPool.cast(IndexPool.as_array(indices), self.dtype)
+        base_size = len(self.base)
+        if offset < base_size:
+            self.base[offset:offset + len(indices)] = indices
+        else:
+            offset -= base_size
+            self.data[offset:offset + len(indices)] = indices
+
+    def resident_nbytes(self):
+        """Bytes of the pool held in memory (memory-mapped bases live in
+        the page cache).
+        """
+        nbytes = self.data.nbytes
+        if not isinstance(self.base, np.memmap):
+            nbytes += self.base.nbytes
+        return nbytes
+
+    def __len__(self):
+        return len(self.base) + self.size
+
+    def __getstate__(self):
+        # spare capacity is not saved
+        return (self.array(),)
+
+    def __setstate__(self, state):
+        data, = state
+        self.base = np.empty(0, dtype=data.dtype)
+        self.data = data
+        self.size = len(data)
+
 
 class PartitionTree(object):
 
+    # node attributes rebuilt from the rows of a pickled tree
+    _LINKS = ('_vertex_pool', '_edge_pool', 'parent', 'children')
+
     def __init__(self):
         self.root = None
+        # records structural edits when set (see TreeStorage.TreeJournal)
+        self.journal = None
+
+    @property
+    def root(self):
+        return self._root
+
+    @root.setter
+    def root(self, node):
+        self._root = node
+        # fully qualified label -> node; built on first lookup
+        self._labels = None
+
+    def __getstate__(self):
+        # the nodes are pickled as rows over compacted copies of the pools,
+        # leaving the tree itself as it is
+        if self.root is None:
+            return {'root': None}
+        vertex_pool, edge_pool, ranges = self.compact_layout()
+        rows = []
+        row = {}
+        stack = [self.root]
+        while len(stack) > 0:
+            node = stack.pop()
+            row[id(node)] = len(rows)
+            state = {name: getattr(node, name)
+                     for name in PartitionNode.__slots__
+                     if name not in PartitionTree._LINKS}
+            state['_vertex_range'], state['_edge_range'] = ranges[id(node)]
+            parent = row[id(node.parent)] if node is not self.root else -1
+            rows.append((parent, state))
+            stack += node.children[::-1]
+        return {'vertex_pool': vertex_pool, 'edge_pool': edge_pool,
+                'nodes': rows}
+
+    def __setstate__(self, state):
+        self.journal = None
+        if 'nodes' in state:
+            nodes = []
+            for parent, node_state in state['nodes']:
+                node = PartitionNode.__new__(PartitionNode)
+                node.__setstate__(node_state)
+                node._vertex_pool = state['vertex_pool']
+                node._edge_pool = state['edge_pool']
+                node.parent = nodes[parent] if parent >= 0 else None
+                node.children = []
+                if node.parent is not None:
+                    node.parent.children.append(node)
+                nodes.append(node)
+            self.root = nodes[0]
+            return
+        self.root = state['root']
+        # trees pickled before index pools existed have one pool per node
+        if self.root is not None and not self._shares_pools():
+            self._fill_internal_nodes()
+            self.compact()
 
     # def __repr__(self):
     #     pass
@@ -26,43 +219,179 @@ class PartitionTree(object):
     def __iter__(self):
         pass
 
-    def check_integrity(self, G):
-        # TODO: Recursively check each node's indices fall within graph G.
-        # TODO: Verify length of childrens' indices is less than those of self
-        pass
+    def check_integrity(self, G, root=None):
+        """Verify the nodes of the tree (or of the subtree at root) against G.
+
+        See IntegrityChecker.check_node for what is verified of each node.
+
+        Args:
+            G (graph_tool.Graph): The graph instance, or a GraphStore.
+            root (PartitionNode): Root of the subtree to verify (default:
+                                  the tree's root).
+
+        Returns:
+            A list of messages describing the problems found; empty if the
+            tree is consistent with G.
+        """
+
+        checker = IntegrityChecker.for_graph(G)
+        problems = []
+        stack = [root if root is not None else self.root]
+        while len(stack) > 0:
+            node = stack.pop()
+            problems += checker.check_node(node)
+            stack += node.children[::-1]
+        return problems
+
+    def _label_index(self):
+        if self._labels is None:
+            self._labels = {}
+            stack = [self.root] if self.root is not None else []
+            while len(stack) > 0:
+                node = stack.pop()
+                self._labels.setdefault(node.label, node)
+                stack += node.children[::-1]
+        return self._labels
+
+    def find(self, fully_qualified_label):
+        """Look up a node by its fully qualified label.
+
+        Raises:
+            KeyError: No node of the tree has this label.
+        """
+        try:
+            return self._label_index()[fully_qualified_label]
+        except KeyError:
+            err_msg = 'No node labeled {}'.format(fully_qualified_label)
+            raise KeyError(err_msg)
+
+    def add_children(self, node, children):
+        """Attach children (new leaves) to node, qualify their labels with
+        node's and index them by label.
+        """
+        labels = self._label_index()
+        if self.journal is not None:
+            self.journal.record_add_children(node, children)
+        node.adopt(children)
+        for idx, child in enumerate(children):
+            label = node.label + '|' + child.label
+            # sibling labels must be unique to be looked up
+            if label in labels:
+                label += '_{}'.format(idx)
+            child.label = label
+            labels[label] = child
+
+    def remove_children(self, node):
+        """Remove node's children (and their subtrees) from the tree."""
+        labels = self._label_index()
+        if self.journal is not None:
+            self.journal.record_remove_children(node)
+        stack = list(node.children)
+        while len(stack) > 0:
+            descendant = stack.pop()
+            if labels.get(descendant.label) is descendant:
+                del labels[descendant.label]
+            stack += descendant.children
+        node.remove_children()
+
+    def _shares_pools(self):
+        stack = [self.root]
+        while len(stack) > 0:
+            node = stack.pop()
+            if (node._vertex_pool is not self.root._vertex_pool or
+                    node._edge_pool is not self.root._edge_pool):
+                return False
+            stack += node.children
+        return True
+
+    def compact_layout(self):
+        """Lay out the indices of the tree in new index pools, holding only
+        the slices used by its nodes. Nodes are laid out top-down, nesting
+        children within their parent's slice wherever they do not overlap.
+        The tree itself is left untouched.
+
+        Returns:
+            (vertex pool, edge pool, ranges), where ranges maps the id of
+            each node to its (vertex range, edge range) in the new pools.
+        """
+        root = self.root
+        vertex_pool = IndexPool(dtype=root._vertex_pool.dtype)
+        edge_pool = IndexPool(dtype=root._edge_pool.dtype)
+        ranges = {id(root): (
+            (vertex_pool.append(root.vertex_indices), root._vertex_range[1]),
+            (edge_pool.append(root.edge_indices), root._edge_range[1]))}
+        stack = [root]
+        while len(stack) > 0:
+            node = stack.pop()
+            v_range, e_range = ranges[id(node)]
+            # nobody holds views of the new pools yet, so children may be
+            # nested in place
+            v_ranges = PartitionNode._nest(
+                vertex_pool, v_range,
+                [child.vertex_indices for child in node.children], True)
+            e_ranges = PartitionNode._nest(
+                edge_pool, e_range,
+                [child.edge_indices for child in node.children], True)
+            for child, v_range, e_range in zip(node.children, v_ranges,
+                                               e_ranges):
+                ranges[id(child)] = (v_range, e_range)
+            stack += node.children[::-1]
+        return vertex_pool, edge_pool, ranges
+
+    def compact(self):
+        """Rewrite the index pools of the tree as laid out by
+        compact_layout, dropping the slices no longer used by any node.
+        """
+        if self.root is None:
+            return
+        vertex_pool, edge_pool, ranges = self.compact_layout()
+        stack = [self.root]
+        while len(stack) > 0:
+            node = stack.pop()
+            node._vertex_pool = vertex_pool
+            node._edge_pool = edge_pool
+            node._vertex_range, node._edge_range = ranges[id(node)]
+            stack += node.children
+
+    def _fill_internal_nodes(self):
+        # internal nodes of trees pickled before index pools existed were
+        # emptied; rebuild them bottom-up from their children
+        order = []
+        stack = [self.root]
+        while len(stack) > 0:
+            node = stack.pop()
+            order.append(node)
+            stack += node.children
+        for node in reversed(order):
+            if node.is_leaf() or len(node.vertex_indices):
+                continue
+            cross_edges = [e for edges in (node.cross_edges or {}).values()
+                           for e in edges]
+            vlist = np.concatenate([c.vertex_indices for c in node.children])
+            elist = np.concatenate([c.edge_indices for c in node.children] +
+                                   [IndexPool.as_array(cross_edges)])
+            node.vertex_indices = np.unique(vlist)
+            node.edge_indices = np.unique(elist)
 
     def save(self, filename):
+        # TreeStorage builds on this module
+        from TreeStorage import EXTENSION, save_tree
         if not isinstance(filename, str):
             err_msg = 'filename must be string'
             raise ValueError(err_msg)
-        with open(filename, 'wb') as f:
-            pickle.dump(self, f)
+        if not filename.endswith(EXTENSION):
+            filename += EXTENSION
+        save_tree(self, filename)
 
     @classmethod
     def collect_indices(cls, root):
-        Q = Queue.Queue()
-        vlist = set()
-        elist = set()
-        Q.put(root)
-        while Q.qsize() > 0:
-            node = Q.get()
-            # TODO (deprecate):
-            #   In newly created trees, nodes will always have the cross_edge
-            #   attribute, even if it empty, []. Then, the getattr() call can
-            #   be replaced with direct call as such: node.cross_edges
-            cross_edges = getattr(node, 'cross_edges', [])
-            if cross_edges:
-                cross_edges = \
-                    [e for edges in cross_edges.values() for e in edges]
-            elist.update(cross_edges)
-            if node.is_leaf():
-                vlist.update(node.vertex_indices)
-                elist.update(node.edge_indices)
-            for child in node.children:
-                Q.put(child)
-        assert len(vlist) == root.num_vertices()
-        assert len(elist) == root.num_edges()
-        return list(vlist), list(elist)
+        """Vertex and edge indices of the subgraph a node stands for.
+
+        Internal nodes keep their own slice of the index pools (children are
+        nested within it wherever they do not overlap), so this is a zero-copy
+        lookup for internal nodes and leaves alike.
+        """
+        return root.vertex_indices, root.edge_indices
 
     @classmethod
     def traverse_dfs(cls, root, return_stats=False):
@@ -101,14 +430,218 @@ class PartitionTree(object):
         return nodes
 
 
+class IntegrityChecker(object):
+    """Checks hierarchy tree nodes against a graph.
+
+    Membership is tested with bitmaps over the graph's vertex and edge
+    indices, and repeated indices are counted by stamping every index with
+    its position, so checking a node takes time linear in the number of
+    indices it and its children hold. The bitmaps are allocated once and
+    cleared after each node.
+
+    Args:
+        num_vertices (int): Number of vertices of the graph.
+        src (numpy.ndarray): Source vertex of each edge.
+        tar (numpy.ndarray): Target vertex of each edge.
+        eidx (numpy.ndarray): Edge index of each edge.
+    """
+
+    def __init__(self, num_vertices, src, tar, eidx):
+        num_edge_slots = int(eidx.max()) + 1 if len(eidx) else 0
+        self.num_vertices = num_vertices
+        self.is_edge = np.zeros(num_edge_slots, dtype=bool)
+        self.is_edge[eidx] = True
+        self.src = np.zeros(num_edge_slots, dtype=np.int64)
+        self.src[eidx] = src
+        self.tar = np.zeros(num_edge_slots, dtype=np.int64)
+        self.tar[eidx] = tar
+        self.vertex_bits = np.zeros(num_vertices, dtype=bool)
+        self.edge_bits = np.zeros(num_edge_slots, dtype=bool)
+        self.child_edge_bits = np.zeros(num_edge_slots, dtype=bool)
+        self.vertex_stamps = np.zeros(num_vertices, dtype=np.int64)
+        self.edge_stamps = np.zeros(num_edge_slots, dtype=np.int64)
+        self.owners = np.zeros(num_vertices, dtype=np.int64)
+
+    @staticmethod
+    def for_graph(G):
+        """Checker for G (a graph_tool.Graph or a GraphStore)."""
+        from GraphStore import GraphStore
+        from Helpers import edge_columns
+        if isinstance(G, GraphStore):
+            num_vertices = G.num_vertices
+        else:
+            num_vertices = G.num_vertices(ignore_filter=True)
+        src, tar, eidx = edge_columns(G)
+        return IntegrityChecker(num_vertices, src, tar, eidx)
+
+    @staticmethod
+    def _repeats(stamps, indices):
+        # number of indices equal to another one; whichever position ends
+        # up stamped, the other positions of a repeated index mismatch
+        positions = np.arange(len(indices))
+        stamps[indices] = positions
+        return int((stamps[indices] != positions).sum())
+
+    def _in_bounds(self, vertex_indices, edge_indices):
+        if len(vertex_indices) and (vertex_indices.min() < 0 or
+                                    vertex_indices.max() >= self.num_vertices):
+            return False
+        if len(edge_indices) and (edge_indices.min() < 0 or
+                                  edge_indices.max() >= len(self.is_edge)):
+            return False
+        return bool(self.is_edge[edge_indices].all())
+
+    def check_node(self, node):
+        """Verify a node's own indices and how its children divide them.
+
+        Checked of every node:
+         - its indices are indices of vertices and edges of the graph, held
+           once each, and as many as its vertex and edge counts,
+         - the endpoints of its edges are among its vertices.
+        Checked of the children of a node:
+         - their indices are among the node's,
+         - 'vertex' children hold every vertex of the node exactly once and
+           no edge twice, and the edges none of them holds run between two
+           children (e.g. the edges peel_one drops),
+         - 'edge' children hold every edge of the node exactly once,
+         - 'cover' children hold every vertex of the node,
+         - if the node has cross edges, those are held by no child and
+           together with the children's edges account for every edge of
+           the node.
+
+        Returns:
+            A list of messages describing the problems found.
+        """
+
+        problems = []
+
+        def report(msg, *args):
+            problems.append('{}: {}'.format(node.label, msg.format(*args)))
+
+        v_idx = np.asarray(node.vertex_indices, dtype=np.int64)
+        e_idx = np.asarray(node.edge_indices, dtype=np.int64)
+        if (len(v_idx) != node.num_vertices() or
+                len(e_idx) != node.num_edges()):
+            report('holds {} vertices and {} edges, but counts {} and {}',
+                   len(v_idx), len(e_idx), node.num_vertices(),
+                   node.num_edges())
+        if not self._in_bounds(v_idx, e_idx):
+            report('vertex or edge indices not in G')
+            return problems
+        num_repeated = IntegrityChecker._repeats(self.vertex_stamps, v_idx)
+        if num_repeated:
+            report('{} repeated vertex indices', num_repeated)
+        num_repeated = IntegrityChecker._repeats(self.edge_stamps, e_idx)
+        if num_repeated:
+            report('{} repeated edge indices', num_repeated)
+
+        self.vertex_bits[v_idx] = True
+        self.edge_bits[e_idx] = True
+        try:
+            is_inside = (self.vertex_bits[self.src[e_idx]] &
+                         self.vertex_bits[self.tar[e_idx]])
+            if not is_inside.all():
+                report('{} edges with an endpoint outside the node',
+                       len(e_idx) - is_inside.sum())
+            if len(node.children) > 0:
+                self._check_children(node, v_idx, e_idx, report)
+        finally:
+            self.vertex_bits[v_idx] = False
+            self.edge_bits[e_idx] = False
+        return problems
+
+    def _check_children(self, node, v_idx, e_idx, report):
+        # expects the node's vertices and edges marked in the bitmaps
+        children = node.children
+        partition_types = set(child.partition_type for child in children)
+        if len(partition_types) > 1:
+            report('children of mixed partition types: {}',
+                   ', '.join(sorted(partition_types)))
+        if 'root' in partition_types:
+            report('children of partition type \'root\'')
+        child_v = [np.asarray(child.vertex_indices, dtype=np.int64)
+                   for child in children]
+        child_e = [np.asarray(child.edge_indices, dtype=np.int64)
+                   for child in children]
+        if not all(self._in_bounds(v, e) for v, e in zip(child_v, child_e)):
+            # reported when the children are checked
+            return
+        all_v = np.concatenate(child_v)
+        all_e = np.concatenate(child_e)
+
+        if not self.vertex_bits[all_v].all():
+            report('children hold vertices outside the node')
+        if not self.edge_bits[all_e].all():
+            report('children hold edges outside the node')
+        repeated_v = IntegrityChecker._repeats(self.vertex_stamps, all_v)
+        repeated_e = IntegrityChecker._repeats(self.edge_stamps, all_e)
+        num_uncovered_v = len(v_idx) - (len(all_v) - repeated_v)
+        self.child_edge_bits[all_e] = True
+        try:
+            uncovered_e = e_idx[~self.child_edge_bits[e_idx]]
+            if 'vertex' in partition_types:
+                if repeated_v:
+                    report('{} vertices held by more than one child',
+                           repeated_v)
+                elif num_uncovered_v:
+                    report('{} vertices held by no child', num_uncovered_v)
+                else:
+                    for i, v in enumerate(child_v):
+                        self.owners[v] = i
+                    is_within = (self.owners[self.src[uncovered_e]] ==
+                                 self.owners[self.tar[uncovered_e]])
+                    if is_within.any():
+                        report('{} edges within a child not held by it',
+                               is_within.sum())
+            if 'vertex' in partition_types or 'edge' in partition_types:
+                if repeated_e:
+                    report('{} edges held by more than one child',
+                           repeated_e)
+            if 'edge' in partition_types and len(uncovered_e):
+                report('{} edges held by no child', len(uncovered_e))
+            if 'cover' in partition_types and num_uncovered_v:
+                report('{} vertices held by no child', num_uncovered_v)
+            if node.cross_edges:
+                self._check_cross_edges(node, uncovered_e, report)
+        finally:
+            self.child_edge_bits[all_e] = False
+
+    def _check_cross_edges(self, node, uncovered_e, report):
+        # expects the node's and its children's edges marked in the bitmaps
+        cross_e = np.array([e for edges in node.cross_edges.values()
+                            for e in edges], dtype=np.int64)
+        if not self._in_bounds(cross_e[:0], cross_e):
+            report('cross edge indices not in G')
+            return
+        if not self.edge_bits[cross_e].all():
+            report('cross edges outside the node')
+        if self.child_edge_bits[cross_e].any():
+            report('{} cross edges held by a child',
+                   self.child_edge_bits[cross_e].sum())
+        repeated = IntegrityChecker._repeats(self.edge_stamps, cross_e)
+        if repeated:
+            report('{} repeated cross edges', repeated)
+        elif len(cross_e) != len(uncovered_e):
+            report('{} edges held by no child, but {} cross edges',
+                   len(uncovered_e), len(cross_e))
+
+
 class PartitionNode(object):
 
+    __slots__ = ('_vertex_pool', '_vertex_range', '_edge_pool', '_edge_range',
+                 '_num_vertices', '_num_edges', 'label', 'parent', 'children',
+                 'cross_edges', 'partition_type', 'note', 'stats')
+
     def __init__(self, vertex_indices, edge_indices, label,
                  parent=None, partition_type='vertex', note=''):
-        self.vertex_indices = vertex_indices
-        self.edge_indices = edge_indices
-        self._num_vertices = len(vertex_indices)
-        self._num_edges = len(edge_indices)
+        # a node starts out with pools of its own; adopt() moves children
+        # into their parent's pools
+        self._vertex_pool = IndexPool(vertex_indices)
+        self._vertex_range = (0, len(self._vertex_pool))
+        self._edge_pool = IndexPool(edge_indices)
+        self._edge_range = (0, len(self._edge_pool))
+        self._num_vertices = len(self._vertex_pool)
+        self._num_edges = len(self._edge_pool)
         if parent is not None:
             if not isinstance(parent, PartitionNode):
                 err_msg = 'Parent must be either PartitionNode object or None'
@@ -118,13 +651,123 @@ class PartitionNode(object):
         self.children = []
         self.cross_edges = []
         partition_type = partition_type.lower()
-        if partition_type not in ['vertex', 'edge', 'root']:
-            err_msg = 'Partition type must be either \'{}\', \'{}\', or \'{}\''
-            raise ValueError(err_msg.format('vertex', 'edge', 'root'))
+        # 'cover' children may overlap, i.e. do not partition their parent
+        if partition_type not in ['vertex', 'edge', 'cover', 'root']:
+            err_msg = ('Partition type must be either \'{}\', \'{}\', '
+                       '\'{}\', or \'{}\'')
+            raise ValueError(err_msg.format('vertex', 'edge', 'cover', 'root'))
         if partition_type == 'root':
             assert self.parent is None
         self.partition_type = partition_type
         self.note = note
+        # packed summary of the node's subgraph (see
+        # Helpers.subgraph_statistics), if computed
+        self.stats = None
+
+    def __getstate__(self):
+        state = {name: getattr(self, name) for name in PartitionNode.__slots__}
+        # only this node's slices of the pools it shares with its tree
+        state['_vertex_pool'] = IndexPool(self.vertex_indices,
+                                          dtype=self._vertex_pool.dtype)
+        state['_vertex_range'] = (0, self._vertex_range[1])
+        state['_edge_pool'] = IndexPool(self.edge_indices,
+                                        dtype=self._edge_pool.dtype)
+        state['_edge_range'] = (0, self._edge_range[1])
+        return state
+
+    def __setstate__(self, state):
+        state = dict(state)
+        # nodes pickled before index pools existed hold their own lists
+        if 'vertex_indices' in state:
+            vertex_pool = IndexPool(state.pop('vertex_indices'))
+            edge_pool = IndexPool(state.pop('edge_indices'))
+            state['_vertex_pool'] = vertex_pool
+            state['_vertex_range'] = (0, len(vertex_pool))
+            state['_edge_pool'] = edge_pool
+            state['_edge_range'] = (0, len(edge_pool))
+        state.setdefault('cross_edges', [])
+        state.setdefault('stats', None)
+        for name, value in state.iteritems():
+            setattr(self, name, value)
+
+    @property
+    def vertex_indices(self):
+        """Zero-copy view of this node's vertex indices."""
+        return self._vertex_pool.view(*self._vertex_range)
+
+    @vertex_indices.setter
+    def vertex_indices(self, indices):
+        self._vertex_range = PartitionNode._store(self._vertex_pool, indices)
+        self._num_vertices = self._vertex_range[1]
+
+    @property
+    def edge_indices(self):
+        """Zero-copy view of this node's edge indices."""
+        return self._edge_pool.view(*self._edge_range)
+
+    @edge_indices.setter
+    def edge_indices(self, indices):
+        self._edge_range = PartitionNode._store(self._edge_pool, indices)
+        self._num_edges = self._edge_range[1]
+
+    @staticmethod
+    def _store(pool, indices):
+        # always a fresh slice: the node's current one may hold its
+        # children's, and lies within its ancestors'
+        indices = IndexPool.as_array(indices)
+        return pool.append(indices), len(indices)
+
+    @staticmethod
+    def _nest(pool, node_range, blocks, nest=False):
+        # children are appended to the pool, unless nest is set: then
+        # children whose indices are disjoint subsets of the parent's are
+        # written to the front of its slice, followed by the parent's
+        # remaining indices (e.g. edges dropped between children), so the
+        # slice still holds the parent's set. Nesting reorders the parent's
+        # slice, so it is only done while compact_layout() lays out fresh
+        # pools: views of a live tree's slices never change under their
+        # holders
+        offset, length = node_range
+        merged = IndexPool.as_array(np.concatenate(blocks)) \
+            if len(blocks) else IndexPool.as_array([])
+        if nest:
+            parent = pool.view(offset, length)
+            ordered = np.sort(merged)
+            nest = (len(merged) <= length and
+                    not (ordered[1:] == ordered[:-1]).any() and
+                    np.in1d(ordered, parent).all())
+        if nest:
+            rest = parent[~np.in1d(parent, ordered)]
+            pool.write(offset, np.concatenate((merged, rest)))
+        else:
+            offset = pool.append(merged)
+        starts = offset + np.cumsum([0] + [len(b) for b in blocks[:-1]])
+        return [(int(start), len(b)) for start, b in zip(starts, blocks)]
+
+    def adopt(self, children):
+        """Make children (new leaves) the children of this node and move
+        their indices into this node's pools. The indices are appended, so
+        views of the slices of the tree's nodes stay as they are.
+        """
+        self._place(children)
+        for child in children:
+            child.parent = self
+        self.children = children
+
+    def _place(self, children):
+        # point children at this node's pools, appending their indices there
+        # (see _nest)
+        v_ranges = PartitionNode._nest(
+            self._vertex_pool, self._vertex_range,
+            [child.vertex_indices for child in children])
+        e_ranges = PartitionNode._nest(
+            self._edge_pool, self._edge_range,
+            [child.edge_indices for child in children])
+        for child, v_range, e_range in zip(children, v_ranges, e_ranges):
+            child._vertex_pool = self._vertex_pool
+            child._vertex_range = v_range
+            child._edge_pool = self._edge_pool
+            child._edge_range = e_range
 
     def __len__(self):
         # if self.partition_type == 'edge':
@@ -167,39 +810,28 @@ class PartitionNode(object):
     def remove_children(self):
         if len(self.children) == 0:
             return
-        assert self.vertex_indices == []
-        assert self.edge_indices == []
-        vlist, elist = PartitionTree.collect_indices(self)
-        self.vertex_indices = vlist
-        self.edge_indices = elist
+        # this node's own slice was never released
         assert len(self.vertex_indices) == self.num_vertices()
         assert len(self.edge_indices) == self.num_edges()
         self.cross_edges = []
         self.children = []
 
     def induce_subgraph(self, G):
+        """Return a GraphView of G induced by this node's indices. G's own
+        filters are left untouched.
+        """
         if self.partition_type == 'root':
-            print('Node is root. Nothing to induce. G unmodified.')
-            return
-        G.clear_filters()
+            print('Node is root. Nothing to induce.')
+            return gt.GraphView(G)
         vp = G.new_vp('bool', vals=False)
         ep = G.new_ep('bool', vals=False)
-
-        if self.vertex_indices and self.edge_indices:
-            vlist = self.vertex_indices
-            elist = self.edge_indices
-        else:
-            vlist, elist = PartitionTree.collect_indices(self)
-
         try:
-            vp.a[vlist] = True
-            ep.a[elist] = True
+            vp.a[self.vertex_indices] = True
+            ep.a[self.edge_indices] = True
         except:
             err_msg = 'vertex or edge indices not in G'
             raise IndexError(err_msg)
-        G.set_vertex_filter(vp)
-        G.set_edge_filter(ep)
-        print('Vertex and edge filters applied to G')
+        return gt.GraphView(G, vfilt=vp, efilt=ep)
 
     @classmethod
     def is_rock(cls, node, num_vertices_threshold=None, check_if_dense=False):
@@ -0,0 +1,153 @@
+import threading
+import time
+import traceback
+import uuid
+from Queue import Queue
+"""Jobs
+
+This module provides a queue of background jobs for the UI. Long requests
+(decompositions, landmark clustering, BCC trees) are submitted as jobs and
+return at once with the job's id; worker threads run the jobs, which report
+their progress through a callback, and the UI polls a job until it is over.
+
+Jobs are cancelled cooperatively: a running job stops, by raising
+JobCancelled, at its next progress report. The operations report before
+they change anything, so a cancelled decomposition leaves the tree as it
+was.
+"""
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job(object):
+    """A function run in the background on behalf of a workspace.
+
+    Args:
+        owner (str): Id of the workspace that submitted the job.
+        func (callable): Called with the given arguments and a 'progress'
+                         keyword argument, a callback taking the amount of
+                         work done, the total amount and a message.
+    """
+
+    def __init__(self, owner, func, args, kwargs):
+        self.id = uuid.uuid4().hex
+        self.owner = owner
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        # queued -> running -> done, failed or cancelled
+        self.status = 'queued'
+        self.done = 0
+        self.total = 0
+        self.message = ''
+        self.result = None
+        self.error = None
+        self.cancel_requested = False
+        self.finished = None
+
+    def report(self, done, total, message=''):
+        """Progress callback of the job's function."""
+        if self.cancel_requested:
+            raise JobCancelled()
+        self.done = done
+        self.total = total
+        self.message = message
+
+    def run(self):
+        self.status = 'running'
+        try:
+            self.result = self.func(*self.args, progress=self.report,
+                                    **self.kwargs)
+            self.status = 'done'
+        except JobCancelled:
+            self.status = 'cancelled'
+        except Exception as e:
+            traceback.print_exc()
+            self.error = '{}: {}'.format(type(e).__name__, e)
+            self.status = 'failed'
+        self.finished = time.time()
+
+    def is_over(self):
+        return self.status in ('done', 'failed', 'cancelled')
+
+    def info(self):
+        """JSON-serializable state of the job (its result once done)."""
+        info = {
+            'job_id': self.id,
+            'status': self.status,
+            'done': self.done,
+            'total': self.total,
+            'message': self.message,
+        }
+        if self.status == 'done':
+            info['result'] = self.result
+        elif self.status == 'failed':
+            info['error'] = self.error
+        return info
+
+
+class JobQueue(object):
+    """Runs submitted jobs in worker threads, oldest first.
+
+    Args:
+        workers (int): Number of worker threads.
+        ttl (int): Seconds a finished job is kept for its owner to poll.
+    """
+
+    def __init__(self, workers=2, ttl=60 * 60):
+        self.ttl = ttl
+        self.jobs = {}
+        self.queue = Queue()
+        self.lock = threading.Lock()
+        for _ in xrange(workers):
+            worker = threading.Thread(target=self._work)
+            worker.daemon = True
+            worker.start()
+
+    def submit(self, owner, func, *args, **kwargs):
+        """Queue func(*args, progress=..., **kwargs) and return its Job."""
+        job = Job(owner, func, args, kwargs)
+        now = time.time()
+        with self.lock:
+            for job_id, old in self.jobs.items():
+                if old.is_over() and now - old.finished > self.ttl:
+                    del self.jobs[job_id]
+            self.jobs[job.id] = job
+        self.queue.put(job)
+        return job
+
+    def get(self, job_id, owner):
+        """The job with the given id, if owner submitted it (else None)."""
+        job = self.jobs.get(job_id)
+        if job is None or job.owner != owner:
+            return None
+        return job
+
+    def cancel(self, job_id, owner):
+        """Cancel a queued job, or ask a running one to stop.
+
+        Returns:
+            The job, or None if owner submitted no job with that id.
+        """
+
+        job = self.get(job_id, owner)
+        if job is None:
+            return None
+        with self.lock:
+            job.cancel_requested = True
+            if job.status == 'queued':
+                job.status = 'cancelled'
+                job.finished = time.time()
+        return job
+
+    def _work(self):
+        while True:
+            job = self.queue.get()
+            with self.lock:
+                # cancelled while queued
+                if job.status != 'queued':
+                    continue
+                job.status = 'running'
+            job.run()
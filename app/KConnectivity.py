@@ -0,0 +1,327 @@
+import graph_tool.all as gt
+import numpy as np
+from GraphPeeling import core_numbers, csr_adjacency, gather
+from Helpers import group_by_label
+"""KConnectivity
+
+This module enumerates the maximal k-vertex-connected components (k-VCCs) of
+a graph given as plain source/target edge columns. Components are found by
+recursively splitting the graph along vertex cuts of size less than k, with
+the usual reductions applied before any flow is run:
+
+ - pruning to the k-core, since every vertex of a k-VCC has degree >= k,
+ - splitting at cut vertices, since a k-VCC (k >= 2) lies within one BCC,
+ - searching for cuts on a sparse certificate (the union of k scan-first
+   search forests), which preserves local connectivities up to k and whose
+   small vertex cuts are vertex cuts of the original graph,
+ - skipping flow computations for vertices with k neighbors already known
+   to be k-connected to the source ("neighbor sweep").
+
+Max flows are computed by graph-tool on a split-vertex network.
+"""
+
+
+def _local_graph(num_vertices, src, tar, directed=False):
+    H = gt.Graph(directed=directed)
+    H.add_vertex(num_vertices)
+    H.add_edge_list(np.column_stack((src, tar)))
+    return H
+
+
+def _split_edges(src, tar, num_vertices, k):
+    """Group edge positions by connected component (k == 1) or by
+    biconnected component (k >= 2).
+    """
+    H = _local_graph(num_vertices, src, tar)
+    if k == 1:
+        comp, _ = gt.label_components(H)
+        labels = comp.a[src]
+    else:
+        bicomp, _, _ = gt.label_biconnected_components(H)
+        labels = bicomp.a[:len(src)]
+    _, parts = group_by_label(labels, np.arange(len(src)))
+    return parts
+
+
+def scan_first_forest(src, tar, num_vertices):
+    """Positions of the edges of a scan-first search (here, breadth-first)
+    spanning forest of the graph.
+    """
+    indptr, neighbors, positions = csr_adjacency(src, tar, num_vertices)
+    comp, _ = gt.label_components(_local_graph(num_vertices, src, tar))
+    _, roots = np.unique(comp.a[:num_vertices], return_index=True)
+
+    visited = np.zeros(num_vertices, dtype=bool)
+    visited[roots] = True
+    frontier = roots
+    forest = []
+    while len(frontier) > 0:
+        # every frontier vertex is scanned in turn; an unvisited vertex is
+        # attached to the first scanned vertex it is adjacent to
+        entries = gather(indptr, frontier)
+        entries = entries[~visited[neighbors[entries]]]
+        frontier, first = np.unique(neighbors[entries], return_index=True)
+        forest.append(positions[entries[first]])
+        visited[frontier] = True
+    return np.concatenate(forest)
+
+
+def sparse_certificate(src, tar, num_vertices, k):
+    """Positions of the edges of a sparse certificate for k-vertex
+    connectivity: the union of k successive scan-first search forests.
+    """
+    remaining = np.arange(len(src))
+    certificate = []
+    for _ in xrange(k):
+        if len(remaining) == 0:
+            break
+        forest = scan_first_forest(src[remaining], tar[remaining],
+                                   num_vertices)
+        certificate.append(remaining[forest])
+        keep = np.ones(len(remaining), dtype=bool)
+        keep[forest] = False
+        remaining = remaining[keep]
+    return np.sort(np.concatenate(certificate))
+
+
+class _SplitVertexNetwork(object):
+    """Flow network in which every vertex v is split into v_in (v) and v_out
+    (v + n) joined by a unit capacity arc, so that max flows between
+    v_out and w_in count internally vertex-disjoint v-w paths.
+    """
+
+    def __init__(self, src, tar, num_vertices, k):
+        n = num_vertices
+        m = len(src)
+        self.n = n
+        self.k = k
+        internal = np.column_stack((np.arange(n), np.arange(n) + n))
+        forward = np.column_stack((src + n, tar))
+        backward = np.column_stack((tar + n, src))
+        self.g = gt.Graph(directed=True)
+        self.g.add_vertex(2 * n)
+        self.g.add_edge_list(np.concatenate((internal, forward, backward)))
+        self.cap = self.g.new_ep('int', vals=k)
+        self.cap.a[:n] = 1
+
+        # arcs leaving v_out, grouped by v, to read off flow values
+        indptr, _, positions = csr_adjacency(src, tar, n)
+        owners = np.repeat(np.arange(n), np.diff(indptr))
+        self.out_indptr = indptr
+        self.out_arcs = np.where(src[positions] == owners,
+                                 n + positions,
+                                 n + m + positions)
+
+    def vertex_cut(self, a, b):
+        """A minimum a-b vertex cut if it has fewer than k vertices, else
+        None.
+        """
+        source = self.g.vertex(a + self.n)
+        target = self.g.vertex(b)
+        res = gt.boykov_kolmogorov_max_flow(self.g, source, target, self.cap)
+        arcs = self.out_arcs[self.out_indptr[a]:self.out_indptr[a + 1]]
+        # the flow may circulate back into a_out through a's own arc, the
+        # only arc entering it
+        flow = ((self.cap.a[arcs] - res.a[arcs]).sum() -
+                (self.cap.a[a] - res.a[a]))
+        if flow >= self.k:
+            return None
+        part = gt.min_st_cut(self.g, source, self.cap, res)
+        side = part.a.astype(bool)
+        return np.flatnonzero(side[:self.n] & ~side[self.n:])
+
+
+def find_vertex_cut(src, tar, num_vertices, k, use_certificate=True):
+    """Find a vertex cut with fewer than k vertices.
+
+    Args:
+        src (numpy.ndarray): Source vertex of each edge.
+        tar (numpy.ndarray): Target vertex of each edge.
+        num_vertices (int): Number of vertices (ids are 0..n-1).
+        k (int): Connectivity being tested for.
+        use_certificate (bool): Search on a sparse certificate.
+
+    Returns:
+        Array of cut vertices, or None if the graph is k-connected.
+    """
+
+    n = num_vertices
+    if use_certificate and len(src) > k * n:
+        certificate = sparse_certificate(src, tar, n, k)
+        src = src[certificate]
+        tar = tar[certificate]
+    indptr, neighbors, _ = csr_adjacency(src, tar, n)
+    network = _SplitVertexNetwork(src, tar, n, k)
+
+    # a cut S either misses the source u, and then separates it from some
+    # non-neighbor, or contains it, and then separates two of its neighbors
+    u = np.argmin(np.diff(indptr))
+    u_neighbors = np.unique(neighbors[indptr[u]:indptr[u + 1]])
+
+    # visit non-neighbors in breadth-first order from u so that the neighbor
+    # sweep can skip as many flow computations as possible
+    order = []
+    visited = np.zeros(n, dtype=bool)
+    visited[u] = True
+    visited[u_neighbors] = True
+    frontier = u_neighbors
+    while len(frontier) > 0:
+        frontier = np.unique(neighbors[gather(indptr, frontier)])
+        frontier = frontier[~visited[frontier]]
+        visited[frontier] = True
+        order.append(frontier)
+
+    # strength[w]: neighbors of w known to be k-connected to u; a vertex
+    # with k such neighbors cannot be separated from u by fewer than k
+    strength = np.bincount(neighbors[gather(indptr, u_neighbors)],
+                           minlength=n)
+    for v in np.concatenate(order or [np.array([], dtype=np.int64)]):
+        if strength[v] >= k:
+            continue
+        cut = network.vertex_cut(u, v)
+        if cut is not None:
+            return cut
+        strength[neighbors[indptr[v]:indptr[v + 1]]] += 1
+
+    for i, a in enumerate(u_neighbors):
+        a_neighbors = neighbors[indptr[a]:indptr[a + 1]]
+        for b in u_neighbors[i + 1:]:
+            b_neighbors = neighbors[indptr[b]:indptr[b + 1]]
+            if b in a_neighbors:
+                continue
+            # k common neighbors already give k disjoint paths
+            if len(np.intersect1d(a_neighbors, b_neighbors)) >= k:
+                continue
+            cut = network.vertex_cut(a, b)
+            if cut is not None:
+                return cut
+    return None
+
+
+def _separate(src, tar, num_vertices, cut):
+    """Split a graph along a vertex cut. Returns one array of edge positions
+    per side; every side keeps the cut vertices and the edges among them.
+    """
+    in_cut = np.zeros(num_vertices, dtype=bool)
+    in_cut[cut] = True
+    outside = ~in_cut[src] & ~in_cut[tar]
+    comp, _ = gt.label_components(
+        _local_graph(num_vertices, src[outside], tar[outside]))
+    comp = comp.a[:num_vertices]
+
+    within_cut = in_cut[src] & in_cut[tar]
+    labels = np.where(in_cut[src], comp[tar], comp[src])[~within_cut]
+    _, sides = group_by_label(labels, np.flatnonzero(~within_cut))
+    shared = np.flatnonzero(within_cut)
+    return [np.sort(np.concatenate((side, shared))) for side in sides]
+
+
+def k_vertex_connected_components(src, tar, k):
+    """Enumerate the maximal k-vertex-connected components of a graph.
+
+    Args:
+        src (numpy.ndarray): Source vertex of each edge.
+        tar (numpy.ndarray): Target vertex of each edge.
+        k (int): Vertex connectivity of the components (k >= 1).
+
+    Returns:
+        A list of sorted vertex id arrays, one per component. Components
+        may share (fewer than k) vertices.
+    """
+
+    keep = src != tar
+    pieces = [(src[keep], tar[keep])]
+    components = []
+    while pieces:
+        s, t = pieces.pop()
+        vertices, local = np.unique(np.concatenate((s, t)),
+                                    return_inverse=True)
+        n = len(vertices)
+        if n <= k:
+            continue
+        ls = local[:len(s)]
+        lt = local[len(s):]
+
+        # prune to the k-core
+        indptr, neighbors, _ = csr_adjacency(ls, lt, n)
+        inside = core_numbers(indptr, neighbors) >= k
+        if not inside.all():
+            keep = inside[ls] & inside[lt]
+            if keep.any():
+                pieces.append((s[keep], t[keep]))
+            continue
+
+        # split along cut vertices (or into connected components for k == 1)
+        parts = _split_edges(ls, lt, n, k)
+        if len(parts) > 1:
+            pieces.extend((s[part], t[part]) for part in parts)
+            continue
+
+        cut = find_vertex_cut(ls, lt, n, k)
+        if cut is None:
+            components.append(vertices)
+            continue
+        sides = _separate(ls, lt, n, cut)
+        if len(sides) < 2:
+            # guard: fall back to searching the full edge set
+            cut = find_vertex_cut(ls, lt, n, k, use_certificate=False)
+            if cut is None:
+                components.append(vertices)
+                continue
+            sides = _separate(ls, lt, n, cut)
+        pieces.extend((s[side], t[side]) for side in sides)
+    return components
+
+
+def component_edges(src, tar, components):
+    """Assign edges to (possibly overlapping) vertex sets.
+
+    Args:
+        src (numpy.ndarray): Source vertex of each edge.
+        tar (numpy.ndarray): Target vertex of each edge.
+        components (list): Vertex id arrays.
+
+    Returns:
+        edges, cross_edges: edges[i] holds the positions of the edges with
+        both endpoints in components[i]; cross_edges maps (i, j) to the
+        positions of edges lying within no single component, keyed by the
+        first component containing each endpoint.
+    """
+
+    num_components = len(components)
+    members = np.concatenate(components)
+    owners = np.repeat(np.arange(num_components),
+                       [len(c) for c in components])
+    order = np.lexsort((owners, members))
+    members = members[order]
+    owners = owners[order]
+    keys = members * num_components + owners
+
+    # every component containing an edge's source, then check the target
+    starts = np.searchsorted(members, src, side='left')
+    counts = np.searchsorted(members, src, side='right') - starts
+    offsets = starts - (np.cumsum(counts) - counts)
+    candidates = np.repeat(offsets, counts) + np.arange(counts.sum())
+    edge_pos = np.repeat(np.arange(len(src)), counts)
+    candidate_owners = owners[candidates]
+    target_keys = tar[edge_pos] * num_components + candidate_owners
+    found = np.searchsorted(keys, target_keys)
+    found[found == len(keys)] = 0
+    hit = keys[found] == target_keys
+
+    _, groups = group_by_label(candidate_owners[hit], edge_pos[hit])
+    edges = [np.array([], dtype=np.int64)] * num_components
+    for c, group in zip(np.unique(candidate_owners[hit]), groups):
+        edges[c] = group
+
+    # cross edges, keyed by the first component of each endpoint
+    is_cross = np.ones(len(src), dtype=bool)
+    is_cross[edge_pos[hit]] = False
+    first = np.searchsorted(members, np.concatenate((src, tar)))
+    first_src = owners[first[:len(src)]]
+    first_tar = owners[first[len(src):]]
+    cross_edges = {}
+    for pos in np.flatnonzero(is_cross):
+        a, b = sorted((int(first_src[pos]), int(first_tar[pos])))
+        cross_edges.setdefault((a, b), []).append(pos)
+    return edges, cross_edges
@@ -0,0 +1,171 @@
+import graph_tool.all as gt
+import hashlib
+import json
+import numpy as np
+import os
+import tempfile
+from Helpers import VisColumns
+"""Layouts
+
+This module lays out the views drawn by the client on the server, so the
+browser draws them at fixed positions instead of running its physics
+simulation. Layouts are computed with graph-tool's SFDP layout and cached
+in a directory next to the tree (the tree's path with a .layouts
+extension), one file per node and view type. A cached layout is only used
+while the view still draws the same graph: each file keeps a fingerprint of
+the node ids and edges it was computed for.
+
+Views are drawn with the layouts cached for them; a view with no cached
+layout is drawn by the client's physics simulation while its layout is
+computed in the background (see LayoutCache.positions), and moved to its
+positions once they are computed.
+"""
+
+EXTENSION = '.layouts'
+# median edge length of a layout, in pixels (the spring length of the
+# client's physics simulation)
+EDGE_LENGTH = 200
+
+
+def compute_layout(ids, src, tar):
+    """Lay a graph out with gt.sfdp_layout.
+
+    Args:
+        ids (numpy.ndarray): Id of each node.
+        src (numpy.ndarray): Id of the source node of each edge.
+        tar (numpy.ndarray): Id of the target node of each edge.
+
+    Returns:
+        numpy.ndarray of the (x, y) position of each node, in pixels and
+        centered on the origin.
+    """
+
+    if len(ids) == 0:
+        return np.zeros((0, 2))
+    order = np.argsort(ids, kind='mergesort')
+    src = order[np.searchsorted(ids, src, sorter=order)]
+    tar = order[np.searchsorted(ids, tar, sorter=order)]
+    H = gt.Graph(directed=False)
+    H.add_vertex(len(ids))
+    H.add_edge_list(np.column_stack((src, tar)))
+    pos = gt.sfdp_layout(H).get_2d_array([0, 1]).T
+
+    lengths = np.hypot(*(pos[src] - pos[tar]).T)
+    lengths = lengths[lengths > 0]
+    scale = EDGE_LENGTH
+    if len(lengths):
+        scale /= np.median(lengths)
+    return np.round((pos - pos.mean(axis=0)) * scale, 1)
+
+
+def fingerprint(ids, src, tar):
+    """Digest of the nodes and edges of a graph (see LayoutCache)."""
+    digest = hashlib.sha1()
+    for values in (ids, src, tar):
+        digest.update(np.asarray(values, dtype=np.int64).tostring())
+        digest.update('|')
+    return digest.hexdigest()
+
+
+class LayoutCache(object):
+    """Layouts of the views of a tree's nodes, on disk next to the tree.
+
+    Args:
+        tree_filename (str): Path of the tree (a .tree directory or a
+                             legacy pickle).
+    """
+
+    def __init__(self, tree_filename):
+        self.path = tree_filename.rstrip('/') + EXTENSION
+
+    def filename(self, label, view, path=()):
+        """File of the layout of a node's view.
+
+        Args:
+            label (str): Fully qualified label of the node.
+            view (str): View type (e.g. 'subgraph' or 'bcc_tree').
+            path (list): Steps drilled into the node's coarsened views (see
+                         LevelOfDetail), if any.
+        """
+
+        key = json.dumps([label, view, [list(step) for step in path]])
+        return os.path.join(self.path, hashlib.sha1(key).hexdigest() + '.npz')
+
+    def cached(self, label, view, ids, src, tar, path=()):
+        """Cached positions of the nodes of a node's view (see
+        compute_layout), or None if the cache holds no layout of the same
+        graph.
+        """
+
+        filename = self.filename(label, view, path)
+        if not os.path.isfile(filename):
+            return None
+        try:
+            with open(filename, 'rb') as f:
+                cached = np.load(f)
+                if str(cached['fingerprint']) == fingerprint(ids, src, tar):
+                    return cached['pos']
+        except (IOError, OSError):
+            pass
+        return None
+
+    def get(self, label, view, ids, src, tar, path=()):
+        """Positions of the nodes of a node's view (see compute_layout),
+        from the cache if it holds a layout of the same graph, else computed
+        and cached.
+        """
+
+        pos = self.cached(label, view, ids, src, tar, path)
+        if pos is not None:
+            return pos
+
+        pos = compute_layout(ids, src, tar)
+        filename = self.filename(label, view, path)
+        try:
+            if not os.path.isdir(self.path):
+                os.makedirs(self.path)
+            # written aside and moved into place, readers see whole files
+            fd, tmp_filename = tempfile.mkstemp(dir=self.path)
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, fingerprint=np.array(fingerprint(ids, src, tar)),
+                         pos=pos)
+            os.rename(tmp_filename, filename)
+        except (IOError, OSError):
+            # the layout is still served, only not cached
+            pass
+        return pos
+
+    def lay_out(self, vis_data, label, view, path=()):
+        """Add the cached positions of the nodes of vis_data (VisColumns of
+        a node's view) as their x and y fields.
+
+        Returns:
+            Whether vis_data was laid out; if not, its layout is not cached
+            yet (see positions).
+        """
+
+        nodes = dict(vis_data.nodes)
+        edges = dict(vis_data.edges)
+        pos = self.cached(label, view, nodes['id'], edges['from'],
+                          edges['to'], path)
+        if pos is None:
+            return False
+        vis_data.nodes += [('x', pos[:, 0]), ('y', pos[:, 1])]
+        return True
+
+    def positions(self, label, view, ids, src, tar, path=(), progress=None):
+        """Lay out a node's view and cache its layout (see get). Meant to
+        run as a background job (see Jobs) for views that lay_out found no
+        layout of.
+
+        Returns:
+            dict with the VisColumns of the id, x and y of each node as
+            'positions'.
+        """
+
+        if progress is not None:
+            progress(0, 1, 'Laying out {} nodes'.format(len(ids)))
+        pos = self.get(label, view, ids, src, tar, path)
+        positions = VisColumns([('id', ids), ('x', pos[:, 0]),
+                                ('y', pos[:, 1])], [])
+        return {'positions': positions}
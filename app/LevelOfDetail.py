@@ -0,0 +1,228 @@
+import numpy as np
+from GraphPeeling import component_labels, core_numbers, csr_adjacency
+from Helpers import VisColumns
+"""LevelOfDetail
+
+This module provides coarsened views of nodes too large to draw. A view is
+drawn over a level: the subgraph of a tree node, or of a region of it that
+the user drilled into. A level too large for the client's budget is shown
+as metanodes, one per group of its vertices, with metaedges counting the
+edges between groups. Vertices are grouped by
+ - 'children': the node's child in the tree (the first child, for vertices
+   that children share),
+ - 'component': connected component of the level's subgraph (named by
+   its smallest vertex),
+ - 'peel': peel value (core number) within the level's subgraph,
+and the smallest groups are merged into one rest group as needed to keep
+within the budget.
+
+Drilling into a metanode of a child opens the child's own view; drilling
+into any other metanode opens the level of its vertices, identified by the
+node and the path of (mode, group) steps taken from it. Levels cache their
+groupings, so moving back and forth between levels does not recompute them.
+"""
+
+COARSENING_MODES = ('children', 'component', 'peel')
+# group of the vertices that are not shown as metanodes of their own
+REST_GROUP = -1
+
+
+class Level(object):
+    """Vertices and edges of a node's subgraph, or of a region of it.
+
+    Args:
+        node (PartitionNode): The node the level belongs to.
+        vertices (numpy.ndarray): Sorted vertex ids of the level.
+        src (numpy.ndarray): Source vertex of each edge of the level.
+        tar (numpy.ndarray): Target vertex of each edge of the level.
+        eidx (numpy.ndarray): Edge index of each edge of the level.
+    """
+
+    dirty = False
+
+    def __init__(self, node, vertices, src, tar, eidx):
+        self.node = node
+        self.vertices = vertices
+        self.src = src
+        self.tar = tar
+        self.eidx = eidx
+        # mode -> group of every vertex (children groups are not cached,
+        # the node's children may change)
+        self.groupings = {}
+
+    @staticmethod
+    def of_node(store, node):
+        """The level of a node's whole subgraph.
+
+        Args:
+            store (GraphStore): Store of the graph the node's tree is of.
+            node (PartitionNode): The node.
+        """
+
+        src, tar, eidx = store.edge_columns(node.vertex_indices,
+                                            node.edge_indices)
+        return Level(node, store.vertex_set(node.vertex_indices),
+                     src, tar, eidx)
+
+    def num_vertices(self):
+        return len(self.vertices)
+
+    def num_edges(self):
+        return len(self.eidx)
+
+    def nbytes(self):
+        arrays = [self.vertices, self.src, self.tar, self.eidx]
+        return sum(a.nbytes for a in arrays + self.groupings.values())
+
+    def in_use(self):
+        return False
+
+    def close(self):
+        pass
+
+    def groups(self, mode, budget):
+        """Group of every vertex of the level (see the module docstring),
+        with at most budget distinct groups.
+        """
+
+        if mode == 'children':
+            groups = self._children_groups()
+        elif mode in self.groupings:
+            groups = self.groupings[mode]
+        else:
+            indptr, neighbors, _ = csr_adjacency(
+                np.searchsorted(self.vertices, self.src),
+                np.searchsorted(self.vertices, self.tar),
+                len(self.vertices))
+            if mode == 'component':
+                # named by their smallest vertex
+                groups = self.vertices[component_labels(indptr, neighbors)]
+            elif mode == 'peel':
+                groups = core_numbers(indptr, neighbors)
+            else:
+                err_msg = 'Coarsening mode must be one of {}'
+                raise ValueError(err_msg.format(', '.join(COARSENING_MODES)))
+            self.groupings[mode] = groups
+        return cap_groups(groups, budget)
+
+    def _children_groups(self):
+        groups = np.empty(len(self.vertices), dtype=np.int64)
+        groups.fill(REST_GROUP)
+        # earlier children take the vertices they share with later ones
+        for idx in xrange(len(self.node.children) - 1, -1, -1):
+            child = self.node.children[idx]
+            indices = child.vertex_indices
+            positions = np.searchsorted(self.vertices, indices)
+            found = positions < len(self.vertices)
+            positions = positions[found]
+            groups[positions[self.vertices[positions] == indices[found]]] = idx
+        return groups
+
+    def region(self, groups, group):
+        """The level of the vertices in the given group.
+
+        Args:
+            groups (numpy.ndarray): Group of every vertex, as returned by
+                                    groups().
+            group (int): The group.
+        """
+
+        inside = groups == group
+        if not inside.any():
+            err_msg = 'No vertices in group {}'.format(group)
+            raise ValueError(err_msg)
+        keep = (inside[np.searchsorted(self.vertices, self.src)] &
+                inside[np.searchsorted(self.vertices, self.tar)])
+        return Level(self.node, self.vertices[inside],
+                     self.src[keep], self.tar[keep], self.eidx[keep])
+
+    def coarsening_modes(self, is_node):
+        """Modes to try coarsening the level by, in order of preference.
+
+        Args:
+            is_node (bool): Whether the level is the node's whole subgraph
+                            (children are preferred only then).
+        """
+
+        modes = ['component', 'peel']
+        if not self.node.is_leaf():
+            if is_node:
+                modes.insert(0, 'children')
+            else:
+                modes.append('children')
+        return modes
+
+
+def cap_groups(groups, budget):
+    """Merge the smallest groups (ties: the largest labels) into the rest
+    group until at most budget groups are left.
+    """
+
+    keys, counts = np.unique(groups, return_counts=True)
+    if len(keys) <= budget:
+        return groups
+    order = np.argsort(-counts, kind='mergesort')
+    kept = keys[order[:max(budget - 1, 1)]]
+    kept = kept[kept != REST_GROUP]
+    return np.where(np.in1d(groups, kept), groups, REST_GROUP)
+
+
+def coarsen(level, groups, mode):
+    """Produce Vis.js formatted network data of a level's metagraph.
+
+    Args:
+        level (Level): The level.
+        groups (numpy.ndarray): Group of every vertex of the level.
+        mode (str): Coarsening mode the groups are of.
+
+    Returns:
+        VisColumns with one node per group (its id being the group) and one
+        edge per pair of groups that edges run between.
+    """
+
+    keys, members = np.unique(groups, return_inverse=True)
+    num_groups = len(keys)
+    sizes = np.bincount(members, minlength=num_groups)
+    a = members[np.searchsorted(level.vertices, level.src)]
+    b = members[np.searchsorted(level.vertices, level.tar)]
+    internal = np.bincount(a[a == b], minlength=num_groups)
+    lo = np.minimum(a, b)[a != b]
+    hi = np.maximum(a, b)[a != b]
+    pairs, weights = np.unique(lo * num_groups + hi, return_counts=True)
+
+    # components are named by rank, their labels are arbitrary
+    ranks = np.empty(num_groups, dtype=np.int64)
+    ranks[np.argsort(-sizes, kind='mergesort')] = np.arange(num_groups)
+    children = level.node.children
+    labels = []
+    qualified = []
+    for idx, key in enumerate(keys.tolist()):
+        if key == REST_GROUP:
+            labels.append('Rest')
+            qualified.append('')
+        elif mode == 'children':
+            labels.append(children[key].label.split('|')[-1])
+            qualified.append(children[key].label)
+        elif mode == 'component':
+            labels.append('CC {}'.format(ranks[idx]))
+        else:
+            labels.append('Peel {}'.format(key))
+    titles = ['<p>{}<br>|V|: {}<br>|E|: {}'.format(label, V, E)
+              for label, V, E in zip(labels, sizes, internal)]
+    nodes = [
+        ('id', keys),
+        ('label', labels),
+        ('title', titles),
+        ('value', sizes),
+        ('group', ranks),
+    ]
+    if mode == 'children':
+        nodes.append(('fullyQualifiedLabel', qualified))
+    edges = [
+        ('id', np.arange(len(pairs))),
+        ('from', keys[pairs // num_groups]),
+        ('to', keys[pairs % num_groups]),
+        ('value', weights),
+        ('title', ['meta-edge size: {}'.format(w) for w in weights]),
+    ]
+    return VisColumns(nodes, edges)
@@ -1,12 +1,34 @@
 import graph_tool.all as gt
-# import networkx as nx
 import numpy as np
 from subprocess import Popen, PIPE
+from GraphPeeling import core_numbers, csr_adjacency, peel_layers
+from GraphStore import GraphStore
+from Helpers import distinct_pairs, edge_array, edge_columns, group_by_label
+from Helpers import induced_view, vertex_set
 from HierarchicalPartitioningTree import PartitionTree, PartitionNode
-# from networkx.algorithms.flow import edmonds_karp, shortest_augmenting_path
+from KConnectivity import component_edges, k_vertex_connected_components
 
 
-def connected_components(G, vertex_indices=None, edge_indices=None):
+def _report(progress, done, total, message):
+    if progress is None:
+        print(message)
+    else:
+        progress(done, total, message)
+
+
+def _renumber(labels):
+    # number labels 0, 1, ... in order of first appearance, so that they do
+    # not depend on the order graph-tool found the components in (which
+    # differs between a view of G and a local graph of a GraphStore)
+    _, first, inverse = np.unique(labels, return_index=True,
+                                  return_inverse=True)
+    ranks = np.empty(len(first), dtype=labels.dtype)
+    ranks[np.argsort(first, kind='mergesort')] = np.arange(len(first))
+    return ranks[inverse]
+
+
+def connected_components(G, vertex_indices=None, edge_indices=None,
+                         progress=None):
     """Partition by connected components.
 
     Partition Type: Vertex
@@ -14,65 +36,60 @@ def connected_components(G, vertex_indices=None, edge_indices=None):
         induce subgraph and partition vertices by connected components.
 
     Args:
-        G (graph_tool.Graph): The graph instance.
+        G (graph_tool.Graph): The graph instance, or a GraphStore.
         vertex_indices (list): List of vertex indices to induce upon.
         edge_indices (list): List of edge indices to induce upon.
+        progress (callable): Called before each phase (labeling, grouping
+            and building the children) with the number of phases done, the
+            total and a message.
 
     Returns:
         A list of information dicts about the newly-created children nodes
         after partitioning/decomposition.
     """
 
-    if not isinstance(G, gt.Graph):
-        err_msg = 'G must be a graph_tool.Graph instance'
+    if not isinstance(G, (gt.Graph, GraphStore)):
+        err_msg = 'G must be a graph_tool.Graph or GraphStore instance'
         raise ValueError(err_msg)
 
     if vertex_indices is None and edge_indices is None:
         err_msg = 'Must provide either vertex indices or edge indices'
         raise ValueError(err_msg)
 
-    vp = G.new_vp('bool', vals=False)
-    ep = G.new_ep('bool', vals=False)
-    try:
-        vp.a[vertex_indices] = True
-        ep.a[edge_indices] = True
-    except:
-        err_msg = 'vertex or edge indices not in G'
-        raise IndexError(err_msg)
-    G.set_vertex_filter(vp)
-    G.set_edge_filter(ep)
-
-    # label connected components
-    comp, _ = gt.label_components(G)
-
-    # avoids having to induce subgraph each time
-    # downfall: edge iterator...
-    vlists = {}
-    elists = {}
-    for idx, e in enumerate(G.edges()):
-        src = e.source()
-        tar = e.target()
-        assert comp[src] == comp[tar]
-        CC = comp[src]
-        if CC not in vlists:
-            vlists[CC] = set()
-        if CC not in elists:
-            elists[CC] = set()
-        vlists[CC].add(G.vertex_index[src])
-        vlists[CC].add(G.vertex_index[tar])
-        elists[CC].add(G.edge_index[e])
-        if idx % 500e3 == 0 and idx > 0:
-            print idx
-
-    non_isolated_vertices = set()
+    # label connected components, numbered by their smallest vertex
+    if progress is not None:
+        progress(0, 3, 'Labeling connected components')
+    if isinstance(G, GraphStore):
+        vertices = G.vertex_set(vertex_indices)
+        src, tar, eidx = G.edge_columns(vertex_indices, edge_indices)
+        comp, _ = gt.label_components(G.local_graph(vertices, src, tar))
+        labels = np.zeros(G.num_vertices, dtype=comp.a.dtype)
+        labels[vertices] = _renumber(comp.a[:len(vertices)])
+    else:
+        H = induced_view(G, vertex_indices, edge_indices)
+        comp, _ = gt.label_components(H)
+        labels = comp.a
+        vertices = vertex_set(G, vertex_indices)
+        labels[vertices] = _renumber(labels[vertices])
+        src, tar, eidx = edge_array(H)
+
+    # group the filtered edge array by component label instead of walking
+    # the edge iterator; every edge of a component shares its label
+    if progress is not None:
+        progress(1, 3, 'Grouping {} edges by component'.format(len(eidx)))
+    e_keys, e_groups = group_by_label(labels[src], eidx)
+    non_isolated_vertices = np.unique(np.concatenate((src, tar)))
+    v_keys, v_groups = \
+        group_by_label(labels[non_isolated_vertices], non_isolated_vertices)
+    assert np.array_equal(e_keys, v_keys)
+
+    if progress is not None:
+        progress(2, 3, 'No. of CC\'s: {}'.format(len(e_keys)))
+
     children = []
-    keys = sorted(vlists.keys())
-    for idx, CC in enumerate(keys):
-        non_isolated_vertices.update(vlists[CC])
-        v_idx = list(vlists[CC])
-        e_idx = list(elists[CC])
-        node = PartitionNode(vertex_indices=v_idx,
-                             edge_indices=e_idx,
+    for idx, CC in enumerate(e_keys):
+        node = PartitionNode(vertex_indices=v_groups[idx],
+                             edge_indices=e_groups[idx],
                              partition_type='vertex',
                              label='CC_{}_{}'.format(CC, idx),
                              note='Connected Components')
@@ -80,19 +97,20 @@ def connected_components(G, vertex_indices=None, edge_indices=None):
 
     # TODO: Decide whether or not to group all isolated vertices together
     if vertex_indices is not None:
-        for idx, v in enumerate(set(vertex_indices) - non_isolated_vertices):
-            node = PartitionNode(vertex_indices=[v],
-                                 edge_indices=[],
+        isolated_vertices = np.setdiff1d(vertex_indices, non_isolated_vertices)
+        for idx, v in enumerate(isolated_vertices):
+            node = PartitionNode(vertex_indices=np.array([v]),
+                                 edge_indices=np.array([], dtype=eidx.dtype),
                                  partition_type='vertex',
-                                 label='CC_{}_{}'.format(comp[v], idx),
+                                 label='CC_{}_{}'.format(labels[v], idx),
                                  note='Connected Components')
             children.append(node)
 
-    G.clear_filters()
     return children
 
 
-def biconnected_components(G, vertex_indices=None, edge_indices=None):
+def biconnected_components(G, vertex_indices=None, edge_indices=None,
+                           progress=None, articulation_points=None):
     """Partition by biconnected components.
 
     Partition Type: Edge
@@ -100,97 +118,114 @@ def biconnected_components(G, vertex_indices=None, edge_indices=None):
         induce subgraph and partition vertices by biconnected components.
 
     Args:
-        G (graph_tool.Graph): The graph instance.
+        G (graph_tool.Graph): The graph instance, or a GraphStore.
         vertex_indices (list): List of vertex indices to induce upon.
         edge_indices (list): List of edge indices to induce upon.
+        progress (callable): Called before each phase (labeling, grouping
+            and building the children) with the number of phases done, the
+            total and a message (the number of components found is printed
+            instead if no callback is given).
+        articulation_points (callable): Called with the ids of the
+            articulation points of the subgraph. By default they are marked
+            in G's 'is_articulation' vertex property; a GraphStore is
+            read-only, so for one they are only passed to the callback.
 
     Returns:
         A list of information dicts about the newly-created children nodes
         after partitioning/decomposition.
     """
 
-    if not isinstance(G, gt.Graph):
-        err_msg = 'G must be a graph_tool.Graph instance'
+    if not isinstance(G, (gt.Graph, GraphStore)):
+        err_msg = 'G must be a graph_tool.Graph or GraphStore instance'
         raise ValueError(err_msg)
 
     if vertex_indices is None and edge_indices is None:
         err_msg = 'Must provide either vertex indices or edge indices'
         raise ValueError(err_msg)
 
-    vp = G.new_vp('bool', vals=False)
-    ep = G.new_ep('bool', vals=False)
-    try:
-        vp.a[vertex_indices] = True
-        ep.a[edge_indices] = True
-    except:
-        err_msg = 'vertex or edge indices not in G'
-        raise IndexError(err_msg)
-    G.set_vertex_filter(vp)
-    G.set_edge_filter(ep)
-
-    # label connected components
-    bicomp, art, _ = gt.label_biconnected_components(G)
-
-    # avoids having to induce subgraph each time
-    # downfall: edge iterator...
-    vlists = {}
-    elists = {}
-    for idx, e in enumerate(G.edges()):
-        src = e.source()
-        tar = e.target()
-        BCC = bicomp[e]
-        if BCC not in vlists:
-            vlists[BCC] = set()
-        if BCC not in elists:
-            elists[BCC] = set()
-        vlists[BCC].add(G.vertex_index[src])
-        vlists[BCC].add(G.vertex_index[tar])
-        elists[BCC].add(G.edge_index[e])
-        if idx % 500e3 == 0 and idx > 0:
-            print idx
+    # label biconnected components
+    if progress is not None:
+        progress(0, 3, 'Labeling biconnected components')
+    if isinstance(G, GraphStore):
+        vertices = G.vertex_set(vertex_indices)
+        src, tar, eidx = G.edge_columns(vertex_indices, edge_indices)
+        bicomp, art, _ = \
+            gt.label_biconnected_components(G.local_graph(vertices, src, tar))
+        bcc_labels = bicomp.a[:len(eidx)]
+    else:
+        H = induced_view(G, vertex_indices, edge_indices)
+        bicomp, art, _ = gt.label_biconnected_components(H)
+        src, tar, eidx = edge_array(H)
+        bcc_labels = bicomp.a[eidx]
+    # numbered by their smallest edge index
+    bcc_labels = _renumber(bcc_labels)
+
+    # group the filtered edge array by BCC label; each BCC's vertex set is
+    # made of the distinct endpoints of its edges
+    if progress is not None:
+        progress(1, 3, 'Grouping {} edges by component'.format(len(eidx)))
+    keys, e_groups = group_by_label(bcc_labels, eidx)
+    _, v_groups = group_by_label(*distinct_pairs(
+        np.concatenate((bcc_labels, bcc_labels)),
+        np.concatenate((src, tar))))
 
     children = []
-    print('No. of BCC\'s: {}'.format(len(elists)))
-    keys = sorted(elists.keys())
+    _report(progress, 2, 3, 'No. of BCC\'s: {}'.format(len(keys)))
     for idx, BCC in enumerate(keys):
-        v_idx = list(vlists[BCC])
-        e_idx = list(elists[BCC])
-        node = PartitionNode(vertex_indices=v_idx,
-                             edge_indices=e_idx,
+        node = PartitionNode(vertex_indices=v_groups[idx],
+                             edge_indices=e_groups[idx],
                              partition_type='edge',
                              label='BCC_{}_{}'.format(BCC, idx),
                              note='Biconnected Components')
         children.append(node)
 
-    # label articulation points
-    if 'is_articulation' not in G.vp:
-        G.vp['is_articulation'] = G.new_vp('bool', vals=False)
-        ap_indices = np.where(art.a == 1)[0]
-        G.vp['is_articulation'].a[ap_indices] = True
+    # label articulation points (a GraphStore is read-only)
+    if isinstance(G, GraphStore):
+        articulation = vertices[art.a[:len(vertices)] == 1]
+    else:
+        articulation = np.flatnonzero(art.a == 1)
+    if articulation_points is not None:
+        articulation_points(articulation)
+    elif isinstance(G, gt.Graph):
+        mark_articulation_points(G, articulation)
 
-    G.clear_filters()
     return children
 
 
-def edge_peel(G, vertex_indices=None, edge_indices=None):
-    """Partition by edge peeling.
+def mark_articulation_points(G, vertices):
+    """Set G's 'is_articulation' vertex property of the given vertices,
+    adding the property if G has none.
+    """
+
+    if 'is_articulation' not in G.vp:
+        G.vp['is_articulation'] = G.new_vp('bool', vals=False)
+    G.vp['is_articulation'].a[vertices] = True
+
+
+def edge_peel(G, vertex_indices=None, edge_indices=None, progress=None):
+    """Partition by edge peeling, with graph_peeling.bin.
 
     Partition Type: Edge
     Description: Given graph G and sets of both vertex and edge indices,
         induce subgraph and partition edges by means of iterative peeling.
+        Launches graph_peeling.bin once per layer; native_edge_peel gives
+        the same layers in process and is the one used by default.
 
     Args:
-        G (graph_tool.Graph): The graph instance.
+        G (graph_tool.Graph): The graph instance, or a GraphStore.
         vertex_indices (list): List of vertex indices to induce upon.
         edge_indices (list): List of edge indices to induce upon.
+        progress (callable): Called as the partitioning advances with the
+            number of edges partitioned so far, the total and a message
+            (the message is printed instead if no callback is given).
 
     Returns:
         A list of information dicts about the newly-created children nodes
         after partitioning/decomposition.
     """
 
-    if not isinstance(G, gt.Graph):
-        err_msg = 'G must be a graph_tool.Graph instance'
+    if not isinstance(G, (gt.Graph, GraphStore)):
+        err_msg = 'G must be a graph_tool.Graph or GraphStore instance'
         raise ValueError(err_msg)
 
     if vertex_indices is None and edge_indices is None:
@@ -199,34 +234,23 @@ def edge_peel(G, vertex_indices=None, edge_indices=None):
 
     cmd = './app/bin/graph_peeling.bin -t core -o core'
 
-    vp = G.new_vp('bool', vals=False)
-    ep = G.new_ep('bool', vals=False)
-    try:
-        vp.a[vertex_indices] = True
-        ep.a[edge_indices] = True
-    except:
-        err_msg = 'vertex or edge indices not in G'
-        raise IndexError(err_msg)
-    G.set_vertex_filter(vp)
-    G.set_edge_filter(ep)
-    efilt = ep
+    src, tar, eidx = edge_columns(G, vertex_indices, edge_indices)
+    remaining = np.ones(len(eidx), dtype=bool)
 
     children = []
     idx = 0
-    while G.num_edges() > 0:
+    num_edges = len(eidx)
+    num_peeled = 0
+    while remaining.any():
         p = Popen([cmd], shell=True, stdout=PIPE, stdin=PIPE)
-        for e in G.edges():
-            p.stdin.write('{} {}\n'.format(e.source(), e.target()))
-            p.stdin.flush()
-        p.stdin.close()
+        out, _ = p.communicate(''.join(
+            '{} {}\n'.format(u, v)
+            for u, v in zip(src[remaining], tar[remaining])))
 
         # get line from stdout that contains top peel layer
         top_layer_line = ''
         top_peel = -1
-        while True:
-            line = p.stdout.readline()
-            if line == '':
-                break
+        for line in out.splitlines():
             if not line.startswith('Core'):
                 continue
             peel = int(line.split(' = ')[0].split('_')[-1])
@@ -242,18 +266,18 @@ def edge_peel(G, vertex_indices=None, edge_indices=None):
         label, vertices = top_layer_line.strip().split(' = ')
         peel = int(label.split('_')[-1])
         assert peel == top_peel
-        v_idx = [int(v) for v in vertices.split()]
-
-        # keep only relevant vertices/edges and label edge peels
-        vfilt = G.new_vp('bool', vals=False)
-        vfilt.a[v_idx] = True
-        G.set_vertex_filter(vfilt)
-        print('peel: {}, |V|: {}, |E|: {}'.format(peel,
-                                                  G.num_vertices(),
-                                                  G.num_edges()))
-
-        e_idx = np.where(G.new_ep('bool', vals=True).a == 1)[0]
-        efilt.a[e_idx] = False
+        v_idx = np.array([int(v) for v in vertices.split()])
+
+        # the layer holds the remaining edges among the top peel's vertices
+        in_layer = remaining & np.in1d(src, v_idx) & np.in1d(tar, v_idx)
+        e_idx = eidx[in_layer]
+        remaining &= ~in_layer
+        num_peeled += len(e_idx)
+        _report(progress, num_peeled, num_edges,
+                'peel: {}, |V|: {}, |E|: {}'.format(peel,
+                                                    len(v_idx),
+                                                    len(e_idx)))
+
         node = PartitionNode(vertex_indices=v_idx,
                              edge_indices=e_idx,
                              partition_type='edge',
@@ -261,10 +285,57 @@ def edge_peel(G, vertex_indices=None, edge_indices=None):
                              note='peel {}'.format(peel))
         children.append(node)
         idx += 1
-        G.set_vertex_filter(vp)
-        G.set_edge_filter(efilt)
 
-    G.clear_filters()
+    return children
+
+
+def native_edge_peel(G, vertex_indices=None, edge_indices=None,
+                     progress=None):
+    """Partition by edge peeling, computed in process.
+
+    Partition Type: Edge
+    Description: Given graph G and sets of both vertex and edge indices,
+        induce subgraph and partition edges by means of iterative peeling.
+        Produces the same layers as edge_peel, but peels every layer in a
+        single call on NumPy arrays instead of launching graph_peeling.bin
+        once per layer.
+
+    Args:
+        G (graph_tool.Graph): The graph instance, or a GraphStore.
+        vertex_indices (list): List of vertex indices to induce upon.
+        edge_indices (list): List of edge indices to induce upon.
+        progress (callable): Called as the partitioning advances with the
+            number of edges partitioned so far, the total and a message
+            (the message is printed instead if no callback is given).
+
+    Returns:
+        A list of information dicts about the newly-created children nodes
+        after partitioning/decomposition.
+    """
+
+    if not isinstance(G, (gt.Graph, GraphStore)):
+        err_msg = 'G must be a graph_tool.Graph or GraphStore instance'
+        raise ValueError(err_msg)
+
+    if vertex_indices is None and edge_indices is None:
+        err_msg = 'Must provide either vertex indices or edge indices'
+        raise ValueError(err_msg)
+
+    src, tar, eidx = edge_columns(G, vertex_indices, edge_indices)
+
+    children = []
+    layers = peel_layers(
+        src, tar,
+        progress=lambda done, total, message:
+            _report(progress, done, total, message))
+    for idx, (peel, v_idx, e_pos) in enumerate(layers):
+        node = PartitionNode(vertex_indices=v_idx,
+                             edge_indices=eidx[e_pos],
+                             partition_type='edge',
+                             label='EPL_{}_{}'.format(peel, idx),
+                             note='peel {}'.format(peel))
+        children.append(node)
+
     return children
 
 
@@ -276,14 +347,12 @@ def peel_one(G):
     Description: Given graph G and sets of both vertex and edge indices,
         induce subgraph and group nodes as either peel less than or equal to 1,
         or greater than 1.
-    NOTE: Input graph G will have its filters cleared, if any
+    NOTE: Operates on the whole of G (or of the GraphView passed as G)
     NOTE: Usage recommended only at beginning of tree exploration
     NOTE: peel one is not a proper edge partition
 
     Args:
         G (graph_tool.Graph): The graph instance.
-        vertex_indices (list): List of vertex indices to induce upon.
-        edge_indices (list): List of edge indices to induce upon.
 
     Returns:
         A list of information dicts about the newly-created children nodes
@@ -293,19 +362,15 @@ def peel_one(G):
         err_msg = 'G must be a graph_tool.Graph instance'
         raise ValueError(err_msg)
 
-    G.clear_filters()
-    vertex_indices = range(G.num_vertices())
-    edge_indices = range(G.num_edges())
+    vertex_indices = np.where(G.new_vp('bool', vals=True).a == 1)[0]
+    src, tar, edge_indices = edge_array(G)
     kcore = gt.kcore_decomposition(G)
 
     # peel one vertex and edge indices
-    peel_one_vertex_idx = np.where(kcore.a <= 1)[0]
-    vfilt = G.new_vp('bool', vals=False)
-    vfilt.a[peel_one_vertex_idx] = True
-    G.set_vertex_filter(vfilt)
-    efilt = G.new_ep('bool', vals=True)
-    peel_one_edge_idx = np.where(efilt.a == 1)[0]
-    G.clear_filters()
+    is_peel_one = G.new_vp('bool', vals=False)
+    is_peel_one.a[vertex_indices] = kcore.a[vertex_indices] <= 1
+    peel_one_vertex_idx = np.where(is_peel_one.a == 1)[0]
+    peel_one_edge_idx = edge_indices[is_peel_one.a[src] & is_peel_one.a[tar]]
 
     children = []
     # Cases where all nodes are either at most peel 1 or at least peel 1
@@ -325,13 +390,11 @@ def peel_one(G):
         return children
 
     # Case where there are mixed peel values
-    higher_peel_vertex_idx = np.where(kcore.a > 1)[0]
-    vfilt = G.new_vp('bool', vals=False)
-    vfilt.a[higher_peel_vertex_idx] = True
-    G.set_vertex_filter(vfilt)
-    efilt = G.new_ep('bool', vals=True)
-    higher_peel_edge_idx = np.where(efilt.a == 1)[0]
-    G.clear_filters()
+    is_higher_peel = G.new_vp('bool', vals=False)
+    is_higher_peel.a[vertex_indices] = kcore.a[vertex_indices] > 1
+    higher_peel_vertex_idx = np.where(is_higher_peel.a == 1)[0]
+    higher_peel_edge_idx = \
+        edge_indices[is_higher_peel.a[src] & is_higher_peel.a[tar]]
 
     node = PartitionNode(vertex_indices=peel_one_vertex_idx,
                          edge_indices=peel_one_edge_idx,
@@ -364,16 +427,16 @@ def landmark_cluster_partition(G, vlist, elist, cluster_assignment):
 
     Returns:
         A list of information dicts about the newly-created children nodes
-        after partitioning/decomposition.
+        after partitioning/decomposition, and the cross edges of the
+        metagraph, mapping pairs of positions of children to the edge
+        indices running between them.
     """
     if not isinstance(G, gt.Graph):
         err_msg = 'G must be a graph_tool.Graph instance'
         raise ValueError(err_msg)
 
-    G.clear_filters()
-    efilt = G.new_ep('bool', vals=False)
-    efilt.a[elist] = True
-    G.set_edge_filter(efilt)
+    H = induced_view(G, vlist, elist)
+    src, tar, eidx = edge_array(H)
 
     cluster_assignment = {int(k): v for k, v in cluster_assignment.iteritems()}
     # create reverse map
@@ -386,29 +449,45 @@ def landmark_cluster_partition(G, vlist, elist, cluster_assignment):
     # parses vertex ids as ints
     clusters = {k: [int(i) for i in v] for k, v in clusters.iteritems()}
 
+    membership = G.new_vp('int', vals=-1)
+    for k, v in clusters.iteritems():
+        membership.a[v] = k
+    src_cluster = membership.a[src]
+    tar_cluster = membership.a[tar]
+    is_intra = src_cluster == tar_cluster
+
+    # children are in order of cluster
+    cluster_keys = sorted(clusters.keys())
+    position = {k: idx for idx, k in enumerate(cluster_keys)}
+
     # cross edges and counts of metagraph
-    # k: tuple (v1, v2) | v: list of edge indices
+    # k: tuple (child position, child position) | v: list of edge indices
     cross_edges = {}
-    for e in G.edges():
-        src = cluster_assignment[G.vertex_index[e.source()]]
-        tar = cluster_assignment[G.vertex_index[e.target()]]
-        if src == tar:
+    cross_idx = np.where(~is_intra)[0]
+    for src, tar, e in zip(src_cluster[cross_idx].tolist(),
+                           tar_cluster[cross_idx].tolist(),
+                           eidx[cross_idx].tolist()):
+        # edges to vertices in no cluster are in no child
+        if src not in position or tar not in position:
             continue
+        src = position[src]
+        tar = position[tar]
         if (src, tar) in cross_edges:
-            cross_edges[(src, tar)].append(G.edge_index[e])
+            cross_edges[(src, tar)].append(e)
         elif (tar, src) in cross_edges:
-            cross_edges[(tar, src)].append(G.edge_index[e])
+            cross_edges[(tar, src)].append(e)
         else:
-            cross_edges[(src, tar)] = [G.edge_index[e]]
+            cross_edges[(src, tar)] = [e]
+
+    # edges within each cluster
+    intra_keys, intra_groups = \
+        group_by_label(src_cluster[is_intra], eidx[is_intra])
+    intra_edges = dict(zip(intra_keys.tolist(), intra_groups))
 
-    cluster_keys = sorted(clusters.keys())
     children = []
     for k in cluster_keys:
         v_idx = clusters[k]
-        vfilt = G.new_vp('bool', vals=False)
-        vfilt.a[v_idx] = True
-        G.set_vertex_filter(vfilt)
-        e_idx = np.where(G.new_ep('bool', vals=True).a == 1)[0]
+        e_idx = intra_edges.get(k, np.array([], dtype=eidx.dtype))
         node = PartitionNode(vertex_indices=v_idx,
                              edge_indices=e_idx,
                              label='LMK_{}_{}'.format(k, len(children)),
@@ -418,67 +497,91 @@ def landmark_cluster_partition(G, vlist, elist, cluster_assignment):
     return children, cross_edges
 
 
-def k_connected_components(G, vertex_indices=None, edge_indices=None):
-    """Partition by k-connected components
-    TODO: Implement
+def k_connected_components(G, vertex_indices=None, edge_indices=None, k=None,
+                           progress=None):
+    """Break into maximal k-connected components.
 
-    Partition Type: TBD (kind of vertex and edge, but not really a partition)
+    Partition Type: Cover (children may share vertices; not a partition)
     Description: Given graph G and sets of both vertex and edge indices,
         induce subgraph and maximally break (NOT PARTITION) into k-connected
-        components.
+        components. Unless k is given, the largest k for which the subgraph
+        has a k-connected component is used, trying k from the top core
+        number down. Vertices outside every component are grouped into one
+        additional child.
 
     Args:
-        G (graph_tool.Graph): The graph instance.
+        G (graph_tool.Graph): The graph instance, or a GraphStore.
         vertex_indices (list): List of vertex indices to induce upon.
         edge_indices (list): List of edge indices to induce upon.
+        k (int): Vertex connectivity of the components.
+        progress (callable): Called after every k tried with the number
+            of values tried, the number of candidates and a message (the
+            message is printed instead if no callback is given).
 
     Returns:
         A list of information dicts about the newly-created children nodes
-        after partitioning/decomposition.
+        after decomposition, and the cross edges of the metagraph, mapping
+        pairs of positions of children to the edge indices running between
+        them.
     """
 
-    """
-    if not isinstance(G, gt.Graph):
-        err_msg = 'G must be a graph_tool.Graph instance'
+    if not isinstance(G, (gt.Graph, GraphStore)):
+        err_msg = 'G must be a graph_tool.Graph or GraphStore instance'
         raise ValueError(err_msg)
 
     if vertex_indices is None and edge_indices is None:
         err_msg = 'Must provide either vertex indices or edge indices'
         raise ValueError(err_msg)
 
-    vp = G.new_vp('bool', vals=False)
-    ep = G.new_ep('bool', vals=False)
-    try:
-        vp.a[vertex_indices] = True
-        ep.a[edge_indices] = True
-    except:
-        err_msg = 'vertex or edge indices not in G'
-        raise IndexError(err_msg)
-    G.set_vertex_filter(vp)
-    G.set_edge_filter(ep)
-
-    H = nx.Graph()
-    for e in G.edges():
-        src_idx = G.vertex_index[e.source()]
-        tar_idx = G.vertex_index[e.target()]
-        H.add_edge(src_idx, tar_idx)
-
-    if G.num_edges() > G.num_vertices() * np.log2(G.num_vertices()):
-        flow_func = shortest_augmenting_path
+    src, tar, eidx = edge_columns(G, vertex_indices, edge_indices)
+    if len(eidx) == 0:
+        return [], {}
+
+    # every vertex of a k-connected component lies in the k-core; core
+    # numbers are computed once and each candidate k searches its core only
+    _, local = np.unique(np.concatenate((src, tar)), return_inverse=True)
+    indptr, neighbors, _ = csr_adjacency(local[:len(src)], local[len(src):],
+                                         local.max() + 1)
+    core = core_numbers(indptr, neighbors)
+    edge_core = np.minimum(core[local[:len(src)]], core[local[len(src):]])
+    if k is None:
+        # from the top core down; a k-connected component has more than k
+        # vertices, so cores of at most k vertices are skipped
+        sizes = np.bincount(core)[::-1].cumsum()[::-1]
+        candidates = [c for c in xrange(len(sizes) - 1, 0, -1)
+                      if sizes[c] > c]
     else:
-        flow_func = edmonds_karp
-    k_components = nx.k_components(H, flow_func=flow_func)
-    for k, vertex_sets in k_components.iteritems():
-        print('k = {} | No. of Components: {}'.format(k, len(vertex_sets)))
-        for vs in vertex_sets:
-            print('    {}'.format(vs))
-        print('')
-
-    # make meta graph
-    largest_k = max(k_components.keys())
-
-    N = len(k_components[largest_k])
-    for s in k_components[largest_k]:
-        pass
-    """
-    return
+        candidates = [k]
+    components = []
+    for idx, k in enumerate(candidates):
+        in_core = edge_core >= k
+        components = k_vertex_connected_components(src[in_core],
+                                                   tar[in_core], k)
+        _report(progress, idx + 1, len(candidates),
+                'k: {}, No. of components: {}'.format(k, len(components)))
+        if components:
+            break
+    if not components:
+        return [], {}
+
+    all_vertices = vertex_set(G, vertex_indices)
+    rest = np.setdiff1d(all_vertices, np.concatenate(components))
+    groups = components + ([rest] if len(rest) else [])
+    edges, cross_positions = component_edges(src, tar, groups)
+
+    children = []
+    for idx, (v_idx, e_pos) in enumerate(zip(groups, edges)):
+        if idx < len(components):
+            note = '{}-connected component'.format(k)
+        else:
+            note = 'outside every {}-connected component'.format(k)
+        node = PartitionNode(vertex_indices=v_idx,
+                             edge_indices=eidx[e_pos],
+                             partition_type='cover',
+                             label='KCC_{}_{}'.format(k, idx),
+                             note=note)
+        children.append(node)
+
+    cross_edges = {key: eidx[positions].tolist()
+                   for key, positions in cross_positions.iteritems()}
+    return children, cross_edges
@@ -0,0 +1,157 @@
+import multiprocessing
+import threading
+from collections import OrderedDict
+from PartitionMethods import mark_articulation_points
+from TreeExploration import TreeExploration, _init_worker, _partition_worker
+"""Prefetcher
+
+This module provides speculative decomposition of hierarchy tree nodes. In
+the UI, listing a node's children is usually followed by decomposing the
+largest of them, so those are decomposed ahead of time, in worker processes
+attached to a GraphStore of the graph, with the operation TreeExploration
+would pick for them. Decompose requests for a prefetched node and operation
+then take the children from a bounded cache instead of partitioning again.
+
+The worker processes are shared by the prefetchers of all loaded graphs
+(see worker_pool); each task attaches its worker to the store of its
+graph. The pool is meant to be created before the server starts any
+threads, as forking a threaded process copies the locks other threads
+hold.
+"""
+
+# seconds between checks of whether a prefetch being waited for was dropped
+POLL_INTERVAL = 0.5
+
+# path of the GraphStore this worker process is attached to
+_worker_store_path = None
+
+
+def worker_pool(workers):
+    """Worker processes for DecompositionPrefetchers."""
+    return multiprocessing.Pool(workers)
+
+
+def _prefetch_worker(store_path, operation_name, vertex_indices,
+                     edge_indices):
+    global _worker_store_path
+    if store_path != _worker_store_path:
+        _init_worker(store_path)
+        _worker_store_path = store_path
+    return _partition_worker(operation_name, vertex_indices, edge_indices)
+
+
+class DecompositionPrefetcher(object):
+    """Decomposes likely-next leaves in the background.
+
+    Args:
+        store (GraphStore): Store of the graph the tree partitions.
+        pool (multiprocessing.Pool): Worker processes (see worker_pool).
+        num_nodes (int): Number of (largest) leaves prefetched per schedule
+                         call.
+        cache_size (int): Maximum number of prefetched decompositions kept;
+                          the least recently scheduled are dropped first.
+        min_vertices (int): Leaves with fewer vertices are not prefetched.
+        timeout (float): Seconds a prefetch is waited for before the caller
+                         decomposes the node itself instead (e.g. if the
+                         worker running it died).
+    """
+
+    def __init__(self, store, pool, num_nodes=3, cache_size=32,
+                 min_vertices=256, timeout=600):
+        self.store = store
+        self.pool = pool
+        self.num_nodes = num_nodes
+        self.cache_size = cache_size
+        self.min_vertices = min_vertices
+        self.timeout = timeout
+        # (id(node), operation name) -> (node, AsyncResult); holding the
+        # node keeps its id from being reused while the entry exists
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+        self.closed = False
+        # number of callers waiting for a prefetch
+        self.waiting = 0
+
+    def schedule(self, nodes):
+        """Start decomposing the largest leaves among nodes."""
+        leaves = [node for node in nodes
+                  if node.is_leaf() and
+                  node.num_vertices() >= self.min_vertices]
+        leaves.sort(key=lambda node: node.num_vertices(), reverse=True)
+        for node in leaves[:self.num_nodes]:
+            try:
+                operation = TreeExploration._determine_partition_method(node)
+            except ValueError:
+                # e.g. landmark clusters; TreeExploration never decomposes
+                # these on its own
+                continue
+            key = (id(node), operation.__name__)
+            with self.lock:
+                if self.closed or key in self.cache:
+                    continue
+                result = self.pool.apply_async(
+                    _prefetch_worker,
+                    (self.store.path,
+                     operation.__name__,
+                     node.vertex_indices,
+                     node.edge_indices))
+                self.cache[key] = (node, result)
+                while len(self.cache) > self.cache_size:
+                    self.cache.popitem(last=False)
+
+    def take(self, node, operation_name, G):
+        """Remove and return the prefetched decomposition of node.
+
+        A decomposition still in progress is waited for, as it was started
+        before the caller's would be, unless the prefetcher is closed or
+        the wait exceeds the timeout meanwhile.
+
+        Args:
+            node (PartitionNode): The node.
+            operation_name (str): Name of the partitioning operation.
+            G (graph_tool.Graph): The graph; articulation points found by a
+                                  prefetched biconnected_components are
+                                  marked in it, as the operation would.
+
+        Returns:
+            What the operation returned for node, or None if node was not
+            prefetched with it (or its prefetch failed or was given up on);
+            the caller then decomposes node itself.
+        """
+
+        with self.lock:
+            node_result = self.cache.pop((id(node), operation_name), None)
+            if node_result is None or node_result[0] is not node:
+                return None
+            self.waiting += 1
+        try:
+            result = node_result[1]
+            waited = 0
+            while not result.ready():
+                if self.closed or waited >= self.timeout:
+                    return None
+                result.wait(POLL_INTERVAL)
+                waited += POLL_INTERVAL
+            children, articulation, error = result.get()
+        finally:
+            with self.lock:
+                self.waiting -= 1
+        if error is not None:
+            return None
+        if articulation is not None:
+            mark_articulation_points(G, articulation)
+        return children
+
+    def in_use(self):
+        """Whether a caller is waiting for a prefetch."""
+        with self.lock:
+            return self.waiting > 0
+
+    def close(self):
+        """Drop pending prefetches (the shared worker processes finish
+        those already started, and are left running).
+        """
+
+        with self.lock:
+            self.closed = True
+            self.cache.clear()
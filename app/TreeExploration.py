@@ -1,7 +1,20 @@
 import cPickle as pickle
 import graph_tool.all as gt
+import json
+import multiprocessing
 import numpy as np
-from HierarchicalPartitioningTree import PartitionTree, PartitionNode
+import os
+import resource
+import shutil
+import tempfile
+import time
+import traceback
+import TreeStorage
+from Queue import Empty, Queue
+from GraphStore import GraphStore
+from Helpers import annotate_statistics, graph_store, induced_view
+from HierarchicalPartitioningTree import IntegrityChecker, PartitionTree
+from HierarchicalPartitioningTree import PartitionNode
 from PartitionMethods import *
 """TreeExploration
 
@@ -12,14 +25,88 @@ and its grandparent contain the same exact vertex and edge indices.
 """
 
 
+# file of a checkpoint directory listing the nodes left to partition
+CHECKPOINT_FILE = 'pending.json'
+# file of a spill directory listing the subtrees spilled to it
+SPILL_FILE = 'spilled.json'
+
+# GraphStore used by pool workers; every worker attaches to the same files
+_worker_graph = None
+
+# seconds between checks that the pool's workers are alive
+POLL_INTERVAL = 1
+# a node in flight whenever that many workers died fails the build
+MAX_WORKER_LOSSES = 2
+
+
+def _resident_memory():
+    # resident set size of this process in bytes (Linux)
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * resource.getpagesize()
+
+
+def _init_worker(store_path):
+    global _worker_graph
+    _worker_graph = GraphStore(store_path)
+    # workers already run in parallel; avoid oversubscribing the cores
+    if hasattr(gt, 'openmp_set_num_threads'):
+        gt.openmp_set_num_threads(1)
+
+
+def _start_pool(workers, store_path):
+    pool = multiprocessing.Pool(workers, initializer=_init_worker,
+                                initargs=(store_path,))
+    return pool, set(process.pid for process in pool._pool)
+
+
+def _workers_alive(pool, pids):
+    # the pool replaces a worker that died, but not the task it was running
+    processes = pool._pool
+    return (all(process.exitcode is None for process in processes) and
+            set(process.pid for process in processes) == pids)
+
+
+def _partition_worker(operation_name, vertex_indices, edge_indices):
+    try:
+        operation = globals()[operation_name]
+        # the store is read-only; articulation points are marked by the
+        # parent process
+        found = []
+        kwargs = {}
+        if operation is biconnected_components:
+            kwargs['articulation_points'] = found.append
+        children = operation(_worker_graph,
+                             vertex_indices=vertex_indices,
+                             edge_indices=edge_indices, **kwargs)
+        articulation = found[0] if found else None
+        if children:
+            annotate_statistics(_worker_graph, children,
+                                (vertex_indices, edge_indices))
+        return children, articulation, None
+    except Exception:
+        return None, None, traceback.format_exc()
+
+
 class TreeExploration(object):
 
-    def __init__(self, G):
+    def __init__(self, G, store=None):
+        """
+        'store' is the directory of a GraphStore of G for worker processes
+            to attach to; it is exported from G on first use
+        """
         if isinstance(G, str):
             G = gt.load_graph(G)
         G.clear_filters()
         self.G = G
+        self.store = store
         self.initialized = False
+        # built on the first checked decomposition
+        self.checker = None
+        # (label of the stub, tree directory) of the subtrees spilled to
+        # disk, in the order they were spilled
+        self.spilled = []
+        self.spill_dir = None
+        self.memory_limit = None
 
     def _reached_stopping_criteria(self, node, threshold):
         if node.num_vertices() < threshold:
@@ -33,12 +120,13 @@ class TreeExploration(object):
                 return node.parent.parent.num_siblings() == 0
         return False
 
-    def _determine_partition_method(self, node):
+    @staticmethod
+    def _determine_partition_method(node):
         short_label = node.label.split('|')[-1].upper()
         if short_label.startswith('CC'):
             operation = biconnected_components
         elif short_label.startswith('BCC'):
-            operation = edge_peel
+            operation = native_edge_peel
         elif (short_label.startswith('EPL') or
               short_label.startswith('VP') or
               short_label == 'ROOT'):
@@ -62,23 +150,17 @@ class TreeExploration(object):
     def _attach_children(self, node, children, check_partition):
         '''
         Attaches children to node as node.children. Modifies each child with
-            new label. Appends each new child to stack.
+            new label and statistics. Appends each new child to stack.
         NOTE: No return value; input objects are modified instead.
         '''
-        node.children = children
-        v_part = set()
-        e_part = set()
-        for child in node.children:
-            child.parent = node
-            child.label = child.parent.label + '|' + child.label
-            if check_partition:
-                v_part.update(child.vertex_indices)
-                e_part.update(child.edge_indices)
+        annotate_statistics(self.G, children,
+                            (node.vertex_indices, node.edge_indices))
+        self.T.add_children(node, children)
         if check_partition:
-            assert len(v_part) == node.num_vertices()
-            assert len(e_part) == node.num_edges()
-        node.vertex_indices = []
-        node.edge_indices = []
+            if self.checker is None:
+                self.checker = IntegrityChecker.for_graph(self.G)
+            problems = self.checker.check_node(node)
+            assert not problems, '\n'.join(problems)
 
     def create_root(self, root_note=''):
         vp = self.G.new_vp('bool', vals=True)
@@ -91,18 +173,31 @@ class TreeExploration(object):
                                partition_type='root',
                                label='root',
                                note=root_note)
+        annotate_statistics(self.G, [T.root])
         self.T = T
         self.initialized = True
         return self.T.root
 
     def explore_tree(self, root=None, threshold=256,
-                     separate_peel_one=True, check_partition=False):
+                     separate_peel_one=True, check_partition=False,
+                     workers=1, checkpoint=None, checkpoint_interval=600,
+                     memory_limit=None, spill_dir=None):
         """
         Begin partitioning by recursively breaking nodes where |V| < threshold.
         'separate_peel_one' creates two children of root node partitioning
             vertices by less than or equal to peel 1 and greater than peel 1
-        'check_partition' checks the integrity of the partitioning;
-            considerably increases running time
+        'check_partition' checks the integrity of every decomposition (see
+            IntegrityChecker.check_node) as it is made
+        'workers' partitions independent leaves in that many processes;
+            the resulting tree is the same as that of a serial run
+        'checkpoint' is a tree directory to which the partial tree and the
+            nodes left to partition are written every 'checkpoint_interval'
+            seconds; an interrupted run is continued with resume_tree
+        'memory_limit' (bytes) bounds the resident memory of this process:
+            once it is exceeded, finished subtrees (those without nodes left
+            to partition) are saved to 'spill_dir' (a temporary directory
+            by default, or the checkpoint's path with a .spill extension)
+            and replaced by their roots; save_tree assembles the full tree
         """
 
         if not root:
@@ -113,9 +208,174 @@ class TreeExploration(object):
             if node is not None:
                 root = node
 
-        stack = []
-        stack.append(root)
+        self._limit_memory(memory_limit, spill_dir, checkpoint)
+        self._explore([root], threshold, check_partition, workers,
+                      checkpoint, checkpoint_interval)
+
+    def resume_tree(self, checkpoint, threshold=256, check_partition=False,
+                    workers=1, checkpoint_interval=600, memory_limit=None,
+                    spill_dir=None):
+        """
+        Continue the explore_tree run that checkpointed to 'checkpoint',
+            partitioning only the nodes it had left, and keep checkpointing
+            there (unless 'checkpoint_interval' is 0). The remaining
+            arguments are those of explore_tree.
+        """
+
+        filename = os.path.join(checkpoint, CHECKPOINT_FILE)
+        if not os.path.isfile(filename):
+            err_msg = 'No checkpoint in {}'.format(checkpoint)
+            raise IOError(err_msg)
+        with open(filename) as f:
+            labels = json.load(f)
+        self.T = TreeStorage.open_tree(checkpoint)
+        self.initialized = True
+        # nodes partitioned after the checkpoint was written (if its journal
+        # got ahead of it) are not leaves, so their children are explored
+        stack = [self.T.find(label.encode('utf-8')) for label in labels]
+        self._limit_memory(memory_limit, spill_dir, checkpoint)
+        self._load_spilled()
+        spilled = set(label for label, _ in self.spilled)
+        stack = [node for node in stack if node.label not in spilled]
+        if checkpoint_interval <= 0:
+            self.T.journal = None
+            checkpoint = None
+        self._explore(stack, threshold, check_partition, workers,
+                      checkpoint, checkpoint_interval)
+
+    def _explore(self, stack, threshold, check_partition, workers,
+                 checkpoint, checkpoint_interval):
+        if checkpoint is not None:
+            self._write_checkpoint(checkpoint, stack)
+        if workers > 1:
+            self._explore_tree_parallel(stack, threshold, check_partition,
+                                        workers, checkpoint,
+                                        checkpoint_interval)
+        else:
+            self._explore_tree_serial(stack, threshold, check_partition,
+                                      checkpoint, checkpoint_interval)
+        if checkpoint is not None:
+            self._write_checkpoint(checkpoint, [])
+            # later edits are saved with save_tree
+            journal = self.T.journal
+            if journal.compaction is not None:
+                journal.compaction.join()
+            self.T.journal = None
+
+    def _write_checkpoint(self, checkpoint, pending):
+        # the edits since the last checkpoint are appended to the tree's
+        # journal; the pending nodes are replaced atomically afterwards
+        TreeStorage.commit_tree(self.T, checkpoint)
+        filename = os.path.join(checkpoint, CHECKPOINT_FILE)
+        with open(filename + '.partial', 'w') as f:
+            json.dump([node.label for node in pending], f)
+            f.flush()
+            os.fsync(f.fileno())
+        with self.T.journal.lock:
+            os.rename(filename + '.partial', filename)
+
+    def _limit_memory(self, memory_limit, spill_dir, checkpoint):
+        self.memory_limit = memory_limit
+        self.spill_threshold = memory_limit
+        if spill_dir is None and checkpoint is not None:
+            # spilled subtrees must outlive the run to be resumed
+            spill_dir = checkpoint.rstrip('/') + '.spill'
+        self.spill_dir = spill_dir
+
+    def _load_spilled(self):
+        # subtrees spilled by the run being resumed; those whose removal
+        # from the tree was not checkpointed are still in the tree
+        if self.spill_dir is None:
+            return
+        filename = os.path.join(self.spill_dir, SPILL_FILE)
+        if not os.path.isfile(filename):
+            return
+        with open(filename) as f:
+            spilled = json.load(f)
+        for label, path in spilled:
+            label = label.encode('utf-8')
+            try:
+                is_stub = self.T.find(label).is_leaf()
+            except KeyError:
+                # a leaf of a subtree spilled later
+                is_stub = True
+            if is_stub:
+                self.spilled.append((label, path))
+
+    def _spill(self, pending):
+        """
+        Save the finished subtrees of the tree to the spill directory and
+            replace each by its root, if the process has outgrown its memory
+            limit. 'pending' are the nodes left to partition; subtrees
+            holding any of them are not finished.
+        """
+        if _resident_memory() <= self.spill_threshold:
+            return
+
+        active = set()
+        for node in pending:
+            while node is not None and id(node) not in active:
+                active.add(id(node))
+                node = node.parent
+        finished = []
+        stack = [self.T.root]
+        while len(stack) > 0:
+            node = stack.pop()
+            if id(node) in active:
+                stack += node.children
+            elif not node.is_leaf():
+                finished.append(node)
+
+        if len(finished) == 0:
+            return
+        self._spill_subtrees(finished)
+        # memory the tree cannot give back (e.g. that of the graph) must not
+        # set off a spill after every decomposition
+        self.spill_threshold = max(self.memory_limit,
+                                   _resident_memory() + self.memory_limit / 16)
+
+    def _spill_subtrees(self, finished):
+        if self.spill_dir is None:
+            self.spill_dir = tempfile.mkdtemp(suffix='.spill')
+        if not os.path.isdir(self.spill_dir):
+            os.makedirs(self.spill_dir)
+        for node in finished:
+            path = os.path.join(self.spill_dir, '{}{}'.format(
+                len(self.spilled), TreeStorage.EXTENSION))
+            subtree = PartitionTree()
+            subtree.root = node
+            TreeStorage.save_tree(subtree, path)
+            self.spilled.append((node.label, path))
+        # recorded before the subtrees leave the tree (and its checkpoint)
+        filename = os.path.join(self.spill_dir, SPILL_FILE)
+        with open(filename + '.partial', 'w') as f:
+            json.dump(self.spilled, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.rename(filename + '.partial', filename)
+        for node in finished:
+            self.T.remove_children(node)
+        # drop the slices of the spilled nodes from the index pools
+        self.T.compact()
+
+    def _remove_spilled(self):
+        for _, path in self.spilled:
+            shutil.rmtree(path)
+        self.spilled = []
+        filename = os.path.join(self.spill_dir, SPILL_FILE)
+        if os.path.isfile(filename):
+            os.remove(filename)
+        if len(os.listdir(self.spill_dir)) == 0:
+            os.rmdir(self.spill_dir)
+
+    def _explore_tree_serial(self, stack, threshold, check_partition,
+                             checkpoint, checkpoint_interval):
+        last_checkpoint = time.time()
         while len(stack) > 0:
+            if (checkpoint is not None and
+                    time.time() - last_checkpoint >= checkpoint_interval):
+                self._write_checkpoint(checkpoint, stack)
+                last_checkpoint = time.time()
             node = stack.pop()
             s = '{} --> |V|: {}, |E|: {}'.format(node.label,
                                                  node.num_vertices(),
@@ -138,27 +398,142 @@ class TreeExploration(object):
             # modifies node.children; no return
             self._attach_children(node, children, check_partition)
             stack += node.children
+            if self.memory_limit is not None:
+                self._spill(stack)
 
-    def save_tree(self, filename):
-        if not filename.endswith('.pkl'):
-            filename += '.pkl'
-        with open(filename, 'wb') as f:
-            pickle.dump(self.T, f)
+    def _explore_tree_parallel(self, stack, threshold, check_partition,
+                               workers, checkpoint, checkpoint_interval):
+        """
+        Same traversal as explore_tree, except that leaves to be partitioned
+        are handed to a pool of worker processes. The tree and stopping
+        decisions stay in this process; workers attach to a GraphStore of
+        the graph, run the partitioning operation and send back the children.
+        If a worker dies, the nodes in flight are partitioned again by a new
+        pool, and the build fails (after a final checkpoint) once a node was
+        lost MAX_WORKER_LOSSES times.
+        """
+        store_path = self.store
+        if store_path is None:
+            store_path = tempfile.mkdtemp(suffix='.store')
+        graph_store(self.G, store_path)
+        pool, pids = _start_pool(workers, store_path)
+        results = Queue()
+        # nodes handed to workers, by id; pending again at a checkpoint
+        in_flight = {}
+        # number of worker deaths each node in flight was lost to
+        losses = {}
+        # results of a pool that was replaced are discarded
+        generation = 0
+        last_checkpoint = time.time()
 
-    def display_adjacency_list(self, root):
-        vlist, elist = PartitionTree.collect_indices(root)
+        try:
+            while len(stack) > 0 or len(in_flight) > 0:
+                while len(stack) > 0:
+                    node = stack.pop()
+                    if not node.is_leaf():
+                        stack += node.children
+                        continue
+                    if self._reached_stopping_criteria(node, threshold):
+                        continue
+                    self._submit(pool, generation, node, results)
+                    in_flight[id(node)] = node
+                if len(in_flight) == 0:
+                    break
+
+                try:
+                    done, node, result = results.get(timeout=POLL_INTERVAL)
+                except Empty:
+                    if _workers_alive(pool, pids):
+                        continue
+                    # which tasks died with the worker is unknown, so every
+                    # node in flight is handed to a new pool
+                    pool.terminate()
+                    pool.join()
+                    lost = in_flight.values()
+                    for node in lost:
+                        losses[id(node)] = losses.get(id(node), 0) + 1
+                    failed = [node.label for node in lost
+                              if losses[id(node)] >= MAX_WORKER_LOSSES]
+                    if failed:
+                        err_msg = 'Workers died partitioning {}'.format(
+                            ', '.join(failed))
+                        raise RuntimeError(err_msg)
+                    generation += 1
+                    pool, pids = _start_pool(workers, store_path)
+                    for node in lost:
+                        self._submit(pool, generation, node, results)
+                    continue
+                if done != generation:
+                    continue
+                children, articulation, error = result
+                if error is not None:
+                    raise RuntimeError('Partitioning {} failed:\n{}'.format(
+                        node.label, error))
+                del in_flight[id(node)]
+                losses.pop(id(node), None)
+                if articulation is not None:
+                    mark_articulation_points(self.G, articulation)
+                # this shouldn't happen
+                if children:
+                    # modifies node.children; no return
+                    self._attach_children(node, children, check_partition)
+                    stack += node.children
+                if self.memory_limit is not None:
+                    self._spill(in_flight.values() + stack)
+                if (checkpoint is not None and
+                        time.time() - last_checkpoint >= checkpoint_interval):
+                    self._write_checkpoint(checkpoint,
+                                           in_flight.values() + stack)
+                    last_checkpoint = time.time()
+        except BaseException:
+            # the run can be resumed from where it failed
+            if checkpoint is not None:
+                self._write_checkpoint(checkpoint,
+                                       in_flight.values() + stack)
+            raise
+        finally:
+            pool.terminate()
+            pool.join()
+            if self.store is None:
+                shutil.rmtree(store_path)
 
-        vfilt = self.G.new_vp('bool', vals=False)
-        vfilt.a[vlist] = True
-        self.G.set_vertex_filter(vfilt)
+    def _submit(self, pool, generation, node, results):
+        operation = self._determine_partition_method(node)
+        pool.apply_async(
+            _partition_worker,
+            (operation.__name__, node.vertex_indices, node.edge_indices),
+            callback=lambda result, node=node:
+                results.put((generation, node, result)))
 
-        efilt = self.G.new_ep('bool', vals=False)
-        efilt.a[elist] = True
-        self.G.set_edge_filter(efilt)
+    def save_tree(self, filename, verify=False):
+        '''
+        'verify' reopens the saved tree and checks its integrity against G,
+            raising ValueError if any problems are found
+        Subtrees spilled to disk are grafted back onto the saved tree, which
+            then replaces the one in memory.
+        '''
+        if not filename.endswith(TreeStorage.EXTENSION):
+            filename += TreeStorage.EXTENSION
+        if len(self.spilled) > 0:
+            # subtrees spilled later may hold the stubs of earlier ones
+            TreeStorage.graft_tree(self.T, self.spilled[::-1], filename)
+            self.T = TreeStorage.load_tree(filename)
+            self._remove_spilled()
+        else:
+            TreeStorage.save_tree(self.T, filename)
+        if verify:
+            problems = TreeStorage.load_tree(filename).check_integrity(self.G)
+            if problems:
+                err_msg = 'Saved tree failed integrity check:\n{}'
+                raise ValueError(err_msg.format('\n'.join(problems)))
+
+    def display_adjacency_list(self, root):
+        vlist, elist = PartitionTree.collect_indices(root)
+        H = induced_view(self.G, vlist, elist)
 
         # First column for v; following columns are neighbors.
         # NOTE: Adjacency list is redundant for undirected graphs
-        for v in self.G.vertices():
+        for v in H.vertices():
             neighbors = [u for u in v.out_neighbours()]
             out_str = '{} ' + ('{} ' * len(neighbors))[:-1] + '\n'
             out_str = out_str.format(v, *neighbors)
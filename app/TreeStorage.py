@@ -0,0 +1,549 @@
+import cPickle as pickle
+import json
+import numpy as np
+import os
+import shutil
+import sys
+import threading
+import HierarchicalPartitioningTree
+from HierarchicalPartitioningTree import IndexPool, PartitionNode
+from HierarchicalPartitioningTree import PartitionTree
+"""TreeStorage
+
+This module reads and writes PartitionTrees in a versioned, columnar on-disk
+format. A tree is a directory holding:
+
+ - header.json: format name and version, and the number of nodes,
+ - nodes.npy: the node table, one row per node in depth-first order, with
+   the parent row (-1 for the root), the (offset, length) of the node's
+   vertex and edge slices, its vertex and edge counts and partition type,
+   and the (offset, length) of its statistics (length -1 if it has none),
+ - nodes.json: the labels, notes and cross edges of the nodes,
+ - vertices.npy, edges.npy: the tree's index pools,
+ - stats.npy: the packed statistics of the nodes, back to back.
+
+Opening a tree reads the node table and memory-maps the index pools, so a
+node's vertex and edge indices are only paged in when they are touched.
+Opened pools are copy-on-write; changes to the tree never reach the files.
+
+A tree directory may also hold journal.pkl, the edits (decompositions and
+removals of children) saved since the snapshot was written. open_tree
+replays the journal over the snapshot; commit_tree appends the edits made
+since the tree was opened, and folds the journal into a new snapshot in the
+background once it has grown large.
+"""
+
+FORMAT = 'partition-tree'
+FORMAT_VERSION = 1
+EXTENSION = '.tree'
+
+HEADER_FILE = 'header.json'
+NODES_FILE = 'nodes.npy'
+NODE_DATA_FILE = 'nodes.json'
+VERTICES_FILE = 'vertices.npy'
+EDGES_FILE = 'edges.npy'
+STATS_FILE = 'stats.npy'
+JOURNAL_FILE = 'journal.pkl'
+
+# journal size at which commit_tree starts writing a new snapshot
+COMPACT_BYTES = 64 * 2 ** 20
+
+PARTITION_TYPES = ['vertex', 'edge', 'cover', 'root']
+NODE_COLUMNS = ['parent', 'vertex_offset', 'vertex_length', 'edge_offset',
+                'edge_length', 'num_vertices', 'num_edges', 'partition_type',
+                'stats_offset', 'stats_length']
+
+
+def is_tree_dir(path):
+    return os.path.isfile(os.path.join(path, HEADER_FILE))
+
+
+def save_tree(T, path):
+    """Write a PartitionTree to path (a directory).
+
+    The tree is written next to path first and then moved into place, so
+    that a tree opened from path remains readable while it is overwritten.
+
+    Args:
+        T (PartitionTree): The hierarchy tree instance.
+        path (str): Directory to write the tree to.
+    """
+
+    tmp_path = path.rstrip('/') + '.partial'
+    _write_tree(T, tmp_path)
+    _replace_dir(tmp_path, path)
+
+
+def _write_tree(T, path):
+    # returns the nodes in the order of their rows
+    if T.root is None:
+        err_msg = 'Cannot save an empty tree'
+        raise ValueError(err_msg)
+    # the pools are written compacted; the tree itself is left as it is
+    vertex_pool, edge_pool, ranges = T.compact_layout()
+
+    nodes = []
+    stack = [T.root]
+    while len(stack) > 0:
+        node = stack.pop()
+        nodes.append(node)
+        stack += node.children[::-1]
+    row = {id(node): i for i, node in enumerate(nodes)}
+
+    table = np.zeros((len(nodes), len(NODE_COLUMNS)), dtype=np.int64)
+    labels = []
+    notes = []
+    cross_edges = {}
+    # int32 unless some node's statistics need int64
+    stats = IndexPool(dtype=np.result_type(
+        np.int32, *[node.stats.dtype for node in nodes
+                    if node.stats is not None]))
+    for i, node in enumerate(nodes):
+        stats_range = (0, -1)
+        if node.stats is not None:
+            stats_range = (stats.append(node.stats), len(node.stats))
+        vertex_range, edge_range = ranges[id(node)]
+        # the root may be a subtree's root, which has a parent
+        table[i] = [row[id(node.parent)] if node is not T.root else -1,
+                    vertex_range[0], vertex_range[1],
+                    edge_range[0], edge_range[1],
+                    node.num_vertices(), node.num_edges(),
+                    PARTITION_TYPES.index(node.partition_type),
+                    stats_range[0], stats_range[1]]
+        labels.append(node.label)
+        notes.append(node.note)
+        if node.cross_edges:
+            cross_edges[i] = [[int(a), int(b), [int(e) for e in edges]]
+                              for (a, b), edges in node.cross_edges.items()]
+
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    os.makedirs(path)
+    np.save(os.path.join(path, NODES_FILE), table)
+    np.save(os.path.join(path, VERTICES_FILE), vertex_pool.array())
+    np.save(os.path.join(path, EDGES_FILE), edge_pool.array())
+    np.save(os.path.join(path, STATS_FILE), stats.array())
+    with open(os.path.join(path, NODE_DATA_FILE), 'w') as f:
+        json.dump({
+            'labels': labels,
+            'notes': notes,
+            'cross_edges': cross_edges,
+        }, f)
+    # the header is written last; a directory without one is partial
+    with open(os.path.join(path, HEADER_FILE), 'w') as f:
+        json.dump({
+            'format': FORMAT,
+            'version': FORMAT_VERSION,
+            'num_nodes': len(nodes),
+            'node_columns': NODE_COLUMNS,
+        }, f)
+    return nodes
+
+
+def graft_tree(T, subtrees, path):
+    """Write a PartitionTree to path (a directory), grafting saved subtrees
+    onto it.
+
+    The node tables of the subtrees are appended to T's, and their index
+    pools are copied over in chunks, so the subtrees are never loaded back
+    into memory as a whole.
+
+    Args:
+        T (PartitionTree): The hierarchy tree instance.
+        subtrees (list): (label, directory) pairs, where the directory holds
+            a tree saved by save_tree whose root stands for the leaf with
+            that label, which takes on the root's children and cross edges.
+            The leaf may be one of a subtree grafted before.
+        path (str): Directory to write the tree to.
+    """
+
+    tmp_path = path.rstrip('/') + '.partial'
+    _write_tree(T, tmp_path)
+    with open(os.path.join(tmp_path, NODE_DATA_FILE)) as f:
+        node_data = json.load(f)
+    row = {label: i for i, label in enumerate(node_data['labels'])}
+    tables = [np.load(os.path.join(tmp_path, NODES_FILE))]
+    pool_names = [VERTICES_FILE, EDGES_FILE, STATS_FILE]
+    pools = {name: [_map_array(os.path.join(tmp_path, name))]
+             for name in pool_names}
+    num_rows = len(node_data['labels'])
+
+    parent = NODE_COLUMNS.index('parent')
+    offsets = {
+        VERTICES_FILE: NODE_COLUMNS.index('vertex_offset'),
+        EDGES_FILE: NODE_COLUMNS.index('edge_offset'),
+        STATS_FILE: NODE_COLUMNS.index('stats_offset'),
+    }
+    stats_length = NODE_COLUMNS.index('stats_length')
+    for label, subtree_path in subtrees:
+        node_row = row[label.decode('utf-8')]
+        table = np.load(os.path.join(subtree_path, NODES_FILE))
+        with open(os.path.join(subtree_path, NODE_DATA_FILE)) as f:
+            subtree_data = json.load(f)
+        # row 0 (the subtree's root) is node's row
+        rows = table[1:].copy()
+        rows[:, parent] = np.where(rows[:, parent] == 0, node_row,
+                                   rows[:, parent] - 1 + num_rows)
+        for name in pool_names:
+            pool = _map_array(os.path.join(subtree_path, name))
+            base = sum(len(p) for p in pools[name])
+            if name == STATS_FILE:
+                rows[rows[:, stats_length] >= 0, offsets[name]] += base
+            else:
+                rows[:, offsets[name]] += base
+            pools[name].append(pool)
+        for i, label in enumerate(subtree_data['labels'][1:]):
+            row[label] = num_rows + i
+        node_data['labels'] += subtree_data['labels'][1:]
+        node_data['notes'] += subtree_data['notes'][1:]
+        for i, edges in subtree_data['cross_edges'].iteritems():
+            i = node_row if int(i) == 0 else int(i) - 1 + num_rows
+            node_data['cross_edges'][str(i)] = edges
+        tables.append(rows)
+        num_rows += len(rows)
+
+    np.save(os.path.join(tmp_path, NODES_FILE), np.concatenate(tables))
+    with open(os.path.join(tmp_path, NODE_DATA_FILE), 'w') as f:
+        json.dump(node_data, f)
+    for name in pool_names:
+        _concatenate_arrays(pools[name], os.path.join(tmp_path, name))
+    with open(os.path.join(tmp_path, HEADER_FILE), 'w') as f:
+        json.dump({
+            'format': FORMAT,
+            'version': FORMAT_VERSION,
+            'num_nodes': num_rows,
+            'node_columns': NODE_COLUMNS,
+        }, f)
+    _replace_dir(tmp_path, path)
+
+
+def _map_array(filename, mode='r'):
+    data = np.load(filename, mmap_mode=mode)
+    if len(data) == 0:
+        # empty files cannot be memory-mapped
+        data = np.load(filename)
+    return data
+
+
+def _concatenate_arrays(arrays, filename, chunk_size=2 ** 22):
+    # writes the arrays back to back to a .npy file through a memory map,
+    # one chunk at a time
+    dtype = np.result_type(*arrays)
+    size = sum(len(array) for array in arrays)
+    tmp_filename = filename + '.partial'
+    if size == 0:
+        # empty files cannot be memory-mapped
+        np.save(tmp_filename, np.zeros(0, dtype=dtype))
+        os.rename(tmp_filename + '.npy', filename)
+        return
+    out = np.lib.format.open_memmap(tmp_filename, mode='w+', dtype=dtype,
+                                    shape=(size,))
+    offset = 0
+    for array in arrays:
+        for start in xrange(0, len(array), chunk_size):
+            chunk = array[start:start + chunk_size]
+            out[offset:offset + len(chunk)] = chunk
+            offset += len(chunk)
+    out.flush()
+    del out
+    os.rename(tmp_filename, filename)
+
+
+def _replace_dir(tmp_path, path):
+    # files of a replaced tree stay readable through existing memory maps
+    old_path = path.rstrip('/') + '.old'
+    if os.path.isdir(path):
+        os.rename(path, old_path)
+    os.rename(tmp_path, path)
+    if os.path.isdir(old_path):
+        shutil.rmtree(old_path)
+
+
+def _open_pool(filename):
+    return IndexPool.wrap(_map_array(filename, 'c'))
+
+
+def load_tree(path):
+    """Open a PartitionTree written by save_tree.
+
+    Args:
+        path (str): Directory of the tree.
+
+    Returns:
+        The PartitionTree, with memory-mapped index pools.
+    """
+
+    if not is_tree_dir(path):
+        err_msg = '{} is not a tree directory'.format(path)
+        raise IOError(err_msg)
+    with open(os.path.join(path, HEADER_FILE)) as f:
+        header = json.load(f)
+    if header.get('format') != FORMAT:
+        err_msg = '{} is not a {} directory'.format(path, FORMAT)
+        raise ValueError(err_msg)
+    if header.get('version') != FORMAT_VERSION:
+        err_msg = 'Unsupported tree format version: {}'
+        raise ValueError(err_msg.format(header.get('version')))
+
+    table = np.load(os.path.join(path, NODES_FILE))
+    with open(os.path.join(path, NODE_DATA_FILE)) as f:
+        node_data = json.load(f)
+    vertex_pool = _open_pool(os.path.join(path, VERTICES_FILE))
+    edge_pool = _open_pool(os.path.join(path, EDGES_FILE))
+
+    columns = {name: table[:, i].tolist()
+               for i, name in enumerate(header['node_columns'])}
+    # trees written before node statistics existed have no stats columns
+    stats = None
+    if 'stats_offset' in columns:
+        stats = np.load(os.path.join(path, STATS_FILE))
+    cross_edges = node_data['cross_edges']
+    nodes = []
+    for i in xrange(header['num_nodes']):
+        node = PartitionNode.__new__(PartitionNode)
+        node.__setstate__({
+            '_vertex_pool': vertex_pool,
+            '_vertex_range': (columns['vertex_offset'][i],
+                              columns['vertex_length'][i]),
+            '_edge_pool': edge_pool,
+            '_edge_range': (columns['edge_offset'][i],
+                            columns['edge_length'][i]),
+            '_num_vertices': columns['num_vertices'][i],
+            '_num_edges': columns['num_edges'][i],
+            'label': node_data['labels'][i].encode('utf-8'),
+            'note': node_data['notes'][i].encode('utf-8'),
+            'partition_type': PARTITION_TYPES[columns['partition_type'][i]],
+            'parent': None,
+            'children': [],
+            'cross_edges': {(a, b): edges
+                            for a, b, edges in cross_edges[str(i)]}
+                           if str(i) in cross_edges else [],
+        })
+        if stats is not None and columns['stats_length'][i] >= 0:
+            offset = columns['stats_offset'][i]
+            node.stats = stats[offset:offset + columns['stats_length'][i]]
+        parent = columns['parent'][i]
+        if parent >= 0:
+            node.parent = nodes[parent]
+            node.parent.children.append(node)
+        nodes.append(node)
+
+    T = PartitionTree()
+    T.root = nodes[0]
+    return T
+
+
+class TreeJournal(object):
+    """Edits made to a tree since it was opened from, or saved to, path.
+
+    A PartitionTree with a journal reports each add_children and
+    remove_children call to it. The edits are kept in memory until commit
+    appends them to the journal file of the tree directory, so that saving
+    costs as much as the edits rather than the whole tree.
+
+    Records are pickled tuples, one of
+     - ('add_children', parent label, parent cross edges,
+        [(label, partition type, note, vertex indices, edge indices,
+          stats), ...])
+     - ('remove_children', label)
+    where labels of new children are their labels before add_children
+    prefixed them with the parent's.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.pending = []
+        self.lock = threading.Lock()
+        self.compaction = None
+
+    def record_add_children(self, node, children):
+        self.pending.append((
+            'add_children', node.label, node.cross_edges,
+            [(child.label, child.partition_type, child.note,
+              np.array(child.vertex_indices), np.array(child.edge_indices),
+              child.stats)
+             for child in children]))
+
+    def record_remove_children(self, node):
+        self.pending.append(('remove_children', node.label))
+
+    def filename(self):
+        return os.path.join(self.path, JOURNAL_FILE)
+
+    def commit(self):
+        """Append the pending edits to the journal file and sync it.
+
+        Returns:
+            The size of the journal file in bytes.
+        """
+
+        with self.lock:
+            with open(self.filename(), 'ab') as f:
+                for record in self.pending:
+                    pickle.dump(record, f, pickle.HIGHEST_PROTOCOL)
+                f.flush()
+                os.fsync(f.fileno())
+            self.pending = []
+            return os.path.getsize(self.filename())
+
+    def compact(self):
+        """Fold the journal into a new snapshot of the tree directory.
+
+        The snapshot is built from the files alone, so the tree being edited
+        is not touched; edits committed in the meantime are carried over to
+        the journal of the new snapshot.
+        """
+
+        with self.lock:
+            if not os.path.isfile(self.filename()):
+                return
+            end = os.path.getsize(self.filename())
+        T = load_tree(self.path)
+        replay_journal(T, self.filename(), end)
+        tmp_path = self.path.rstrip('/') + '.partial'
+        _write_tree(T, tmp_path)
+        with self.lock:
+            with open(self.filename(), 'rb') as f:
+                f.seek(end)
+                tail = f.read()
+            if len(tail) > 0:
+                with open(os.path.join(tmp_path, JOURNAL_FILE), 'wb') as f:
+                    f.write(tail)
+                    f.flush()
+                    os.fsync(f.fileno())
+            # files others keep in the directory (e.g. the pending nodes of
+            # an explore_tree checkpoint) are carried over
+            for name in os.listdir(self.path):
+                if (name != JOURNAL_FILE and
+                        not os.path.exists(os.path.join(tmp_path, name))):
+                    shutil.copy2(os.path.join(self.path, name),
+                                 os.path.join(tmp_path, name))
+            _replace_dir(tmp_path, self.path)
+
+    def compact_async(self):
+        """Start compact in a background thread, unless one is running."""
+        if self.compaction is not None and self.compaction.is_alive():
+            return
+        self.compaction = threading.Thread(target=self.compact)
+        self.compaction.daemon = True
+        self.compaction.start()
+
+
+def _read_journal(filename, end=None):
+    # yields (record, offset after record); a record cut short by a crash
+    # while it was written ends the journal
+    with open(filename, 'rb') as f:
+        unpickler = pickle.Unpickler(f)
+        while end is None or f.tell() < end:
+            try:
+                record = unpickler.load()
+            except (EOFError, pickle.UnpicklingError, ValueError,
+                    TypeError, IndexError):
+                return
+            yield record, f.tell()
+
+
+def _journaled_node(label, partition_type, note, vertex_indices,
+                    edge_indices, stats=None):
+    node = PartitionNode(vertex_indices=vertex_indices,
+                         edge_indices=edge_indices,
+                         partition_type=partition_type,
+                         label=label,
+                         note=note)
+    node.stats = stats
+    return node
+
+
+def replay_journal(T, filename, end=None):
+    """Apply the edits recorded in a journal file to T.
+
+    Args:
+        T (PartitionTree): The tree the journal was recorded against.
+        filename (str): Path of the journal file.
+        end (int): Offset to stop replaying at (default: end of file).
+
+    Returns:
+        The offset after the last complete record.
+    """
+
+    offset = 0
+    for record, offset in _read_journal(filename, end):
+        if record[0] == 'add_children':
+            _, label, cross_edges, children = record
+            node = T.find(label)
+            node.cross_edges = cross_edges
+            T.add_children(node, [_journaled_node(*child)
+                                  for child in children])
+        elif record[0] == 'remove_children':
+            T.remove_children(T.find(record[1]))
+        else:
+            err_msg = 'Unknown journal record: {}'.format(record[0])
+            raise ValueError(err_msg)
+    return offset
+
+
+def open_tree(path):
+    """Open a tree directory, replaying its journal, for editing.
+
+    Edits to the returned tree are recorded in its journal and written to
+    path by commit_tree.
+
+    Args:
+        path (str): Directory of the tree.
+
+    Returns:
+        The PartitionTree.
+    """
+
+    T = load_tree(path)
+    filename = os.path.join(path, JOURNAL_FILE)
+    if os.path.isfile(filename):
+        offset = replay_journal(T, filename)
+        if offset < os.path.getsize(filename):
+            # drop a record left incomplete by a crash so that later
+            # records are appended after the last complete one
+            with open(filename, 'r+b') as f:
+                f.truncate(offset)
+    T.journal = TreeJournal(path)
+    return T
+
+
+def commit_tree(T, path):
+    """Save a PartitionTree to path (a directory).
+
+    If T was opened from (or last committed to) path, only the edits made
+    since are appended to its journal; otherwise a full snapshot is written.
+
+    Args:
+        T (PartitionTree): The hierarchy tree instance.
+        path (str): Directory to write the tree to.
+    """
+
+    journal = T.journal
+    if (journal is not None and is_tree_dir(path) and
+            os.path.realpath(journal.path) == os.path.realpath(path)):
+        if journal.commit() > COMPACT_BYTES:
+            journal.compact_async()
+        return
+    if journal is not None and journal.compaction is not None:
+        journal.compaction.join()
+    save_tree(T, path)
+    T.journal = TreeJournal(path)
+
+
+def _find_global(module, name):
+    # pickled trees name the module they were created from, which depends
+    # on how the app was run (see pickling_notes.txt); any module named
+    # HierarchicalPartitioningTree is resolved to this one
+    if module.split('.')[-1] == 'HierarchicalPartitioningTree':
+        return getattr(HierarchicalPartitioningTree, name)
+    __import__(module)
+    return getattr(sys.modules[module], name)
+
+
+def load_pickled_tree(filename):
+    """Load a PartitionTree from a (legacy) pickle file."""
+    with open(filename, 'rb') as f:
+        unpickler = pickle.Unpickler(f)
+        unpickler.find_global = _find_global
+        return unpickler.load()
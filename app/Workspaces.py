@@ -0,0 +1,411 @@
+import threading
+import time
+import uuid
+import TreeStorage
+from collections import OrderedDict
+from contextlib import contextmanager
+from GraphManager import GraphManager
+from Helpers import graph_store
+from LevelOfDetail import Level
+from Prefetcher import DecompositionPrefetcher
+"""Workspaces
+
+This module provides the server state of the UI. Every browser session has
+its own Workspace (loaded graph and tree, current view), and workspaces
+point into one process-wide ResourceCache of loaded graphs and trees, so
+sessions share what they have loaded in common and switching back to a
+recently used graph does not reload it from disk.
+
+The cache evicts the least recently used entries once their estimated
+memory use exceeds its budget. Trees are shared until a session edits one:
+the session then takes the loaded tree over as its own (other sessions
+reload the file), and the tree is not evicted until it is saved or the
+session expires.
+
+The levels of detail that sessions draw large nodes at (see LevelOfDetail)
+are cached alongside, keyed by node and by the number of edits of its tree,
+so drilling back into a region reuses its groupings until the tree changes.
+"""
+
+# rough per-vertex and per-edge memory use of a loaded graph: graph-tool's
+# adjacency lists and property maps plus GraphManager's vertex map
+GRAPH_VERTEX_BYTES = 256
+GRAPH_EDGE_BYTES = 64
+# rough memory use of a tree node besides its slice of the index pools
+TREE_NODE_BYTES = 512
+
+
+class LoadedGraph(object):
+    """A graph loaded from disk, with its GraphStore and prefetcher.
+
+    Args:
+        filename (str): Path of the graph file (.gt extension).
+        prefetch_pool (multiprocessing.Pool): Worker processes of the
+            prefetcher (see Prefetcher.worker_pool); None disables
+            prefetching.
+    """
+
+    dirty = False
+
+    def __init__(self, filename, prefetch_pool=None):
+        self.gm = GraphManager(None)
+        self.g = self.gm.create_graph(graph_file=filename)
+        self.store = graph_store(self.g, filename + '.store')
+        self.prefetcher = None
+        if prefetch_pool is not None:
+            self.prefetcher = DecompositionPrefetcher(self.store,
+                                                      prefetch_pool)
+
+    def nbytes(self):
+        return (self.g.num_vertices() * GRAPH_VERTEX_BYTES +
+                self.g.num_edges() * GRAPH_EDGE_BYTES)
+
+    def in_use(self):
+        # a decomposition waits for a prefetch of the graph
+        return self.prefetcher is not None and self.prefetcher.in_use()
+
+    def close(self):
+        if self.prefetcher is not None:
+            self.prefetcher.close()
+
+
+class LoadedTree(object):
+    """A tree loaded from disk (a .tree directory or a legacy pickle).
+
+    Args:
+        filename (str): Path of the tree.
+    """
+
+    def __init__(self, filename):
+        if TreeStorage.is_tree_dir(filename):
+            self.T = TreeStorage.open_tree(filename)
+        else:
+            self.T = TreeStorage.load_pickled_tree(filename)
+        # edited since it was loaded or last saved
+        self.dirty = False
+        # number of times the tree was edited; part of the cache keys of
+        # the levels of its nodes, which edits may make stale
+        self.version = 0
+        self.lock = threading.RLock()
+
+    def nbytes(self):
+        root = self.T.root
+        if root is None:
+            return 0
+        return (len(self.T._label_index()) * TREE_NODE_BYTES +
+                root._vertex_pool.resident_nbytes() +
+                root._edge_pool.resident_nbytes())
+
+    def in_use(self):
+        return False
+
+    def close(self):
+        pass
+
+
+class ResourceCache(object):
+    """Loaded graphs and trees shared by all workspaces.
+
+    Entries are evicted least recently used first once the sum of their
+    estimated sizes exceeds the budget. The entry being accessed, dirty
+    entries (trees with unsaved edits) and entries in use (graphs that a
+    decomposition waits for a prefetch of) are never evicted.
+
+    Args:
+        budget (int): Memory budget in bytes.
+    """
+
+    def __init__(self, budget):
+        self.budget = budget
+        # key -> resource, least recently used first
+        self.entries = OrderedDict()
+        # key -> estimated size in bytes, as of the last load or edit
+        self.sizes = {}
+        # key -> lock held while the key is loaded
+        self.loading = {}
+        self.lock = threading.RLock()
+
+    def get(self, key, load):
+        """Return the resource cached under key, loading it with load() on
+        a miss, and mark it most recently used. Concurrent misses of a key
+        load it once; other keys stay available while it loads.
+        """
+
+        with self.lock:
+            resource = self._touch(key)
+            if resource is not None:
+                # entries may have been released (saved) since the last
+                # eviction
+                self._evict(key)
+                return resource
+            key_lock = self.loading.setdefault(key, threading.Lock())
+        with key_lock:
+            with self.lock:
+                resource = self._touch(key)
+                if resource is not None:
+                    return resource
+            try:
+                resource = load()
+                size = resource.nbytes()
+                with self.lock:
+                    self.entries[key] = resource
+                    self.sizes[key] = size
+                    self._evict(key)
+                    return resource
+            finally:
+                # only once the entry is in place, or a caller that just
+                # missed it would load it again
+                with self.lock:
+                    self.loading.pop(key, None)
+
+    def _touch(self, key):
+        # move key to the most recently used end
+        resource = self.entries.pop(key, None)
+        if resource is not None:
+            self.entries[key] = resource
+        return resource
+
+    def resize(self, key):
+        """Re-estimate the size of the resource under key (e.g. after an
+        edit).
+        """
+
+        with self.lock:
+            if key in self.entries:
+                self.sizes[key] = self.entries[key].nbytes()
+                self._evict(key)
+
+    def take(self, key, new_key, load):
+        """Move the clean resource under key to new_key, for one holder to
+        own, and mark it dirty, so that nobody else takes it over. If it is
+        dirty (owned) already, or not cached, a copy is loaded with load()
+        for new_key instead. A resource already under new_key is returned
+        as it is.
+        """
+
+        with self.lock:
+            resource = self.entries.get(key)
+            if (new_key not in self.entries and
+                    new_key not in self.loading and
+                    resource is not None and not resource.dirty):
+                resource.dirty = True
+                self.rename(key, new_key)
+
+        def load_copy():
+            resource = load()
+            resource.dirty = True
+            return resource
+
+        return self.get(new_key, load_copy)
+
+    def holds(self, key, resource):
+        """Whether resource is (still) the one cached under key."""
+        with self.lock:
+            return self.entries.get(key) is resource
+
+    def rename(self, key, new_key):
+        """Move the resource under key to new_key, replacing whatever was
+        cached there.
+        """
+
+        with self.lock:
+            if key == new_key or key not in self.entries:
+                return
+            self.discard(new_key)
+            self.entries[new_key] = self.entries.pop(key)
+            self.sizes[new_key] = self.sizes.pop(key)
+
+    def discard(self, key):
+        """Drop the resource under key, if cached."""
+        with self.lock:
+            resource = self.entries.pop(key, None)
+            if resource is not None:
+                del self.sizes[key]
+                resource.close()
+
+    def nbytes(self):
+        return sum(self.sizes.itervalues())
+
+    def _evict(self, keep):
+        total = self.nbytes()
+        for key in list(self.entries):
+            if total <= self.budget:
+                break
+            resource = self.entries[key]
+            if key == keep or resource.dirty or resource.in_use():
+                continue
+            total -= self.sizes[key]
+            self.discard(key)
+
+
+class Workspace(object):
+    """Server state of one session.
+
+    The graph and tree are looked up in the cache on every access, by the
+    filename they were loaded from (and, for a tree the session has edited,
+    by the session's id).
+
+    Args:
+        workspace_id (str): Id of the session's workspace.
+        cache (ResourceCache): Cache of loaded graphs and trees.
+        prefetch_pool (multiprocessing.Pool): Worker processes of the
+            prefetchers of the graphs this workspace loads, if any.
+    """
+
+    def __init__(self, workspace_id, cache, prefetch_pool=None):
+        self.id = workspace_id
+        self.cache = cache
+        self.prefetch_pool = prefetch_pool
+        self.graph_file = None
+        self.tree_key = None
+        # vertex and edge indices of the subgraph last shown
+        self.current_view = {}
+        self.last_used = time.time()
+
+    def load_graph(self, filename):
+        self.graph_file = filename
+        self.current_view = {}
+        return self.graph()
+
+    def graph(self):
+        """The workspace's LoadedGraph (None before a graph is loaded)."""
+        if self.graph_file is None:
+            return None
+        filename = self.graph_file
+        return self.cache.get(
+            ('graph', filename),
+            lambda: LoadedGraph(filename, self.prefetch_pool))
+
+    def load_tree(self, filename):
+        self._release_tree()
+        self.tree_key = ('tree', filename)
+        return self.tree()
+
+    def tree(self):
+        """The workspace's PartitionTree (None before a tree is loaded)."""
+        if self.tree_key is None:
+            return None
+        return self._loaded_tree().T
+
+    def _loaded_tree(self):
+        filename = self.tree_key[1]
+        return self.cache.get(self.tree_key, lambda: LoadedTree(filename))
+
+    @contextmanager
+    def editing_tree(self):
+        """Context in which the workspace's PartitionTree is edited.
+
+        The workspace takes the tree over from other sessions (or loads a
+        copy of its own, if another session took it first), and it stays in
+        the cache until it is saved. Edits of the tree (e.g. by several
+        background jobs of the session) are serialized.
+        """
+
+        while True:
+            filename = self.tree_key[1]
+            private_key = ('tree', filename, self.id)
+            loaded = self.cache.take(self.tree_key, private_key,
+                                     lambda: LoadedTree(filename))
+            loaded.lock.acquire()
+            # the tree may have been saved and shared again while the lock
+            # was awaited; it is then taken over anew
+            if self.cache.holds(private_key, loaded):
+                break
+            loaded.lock.release()
+        try:
+            self.tree_key = private_key
+            yield loaded.T
+        finally:
+            loaded.version += 1
+            loaded.lock.release()
+        self.cache.resize(self.tree_key)
+
+    def tree_saved(self, filename):
+        """Share the workspace's tree again as the tree saved at filename.
+
+        Called within editing_tree, so that no edit lands between saving
+        the tree and sharing it.
+        """
+
+        key = ('tree', filename)
+        loaded = self.cache.get(self.tree_key,
+                                lambda: LoadedTree(self.tree_key[1]))
+        with loaded.lock:
+            loaded.dirty = False
+            self.cache.rename(self.tree_key, key)
+            self.tree_key = key
+
+    def level(self, node, path, budget):
+        """The Level of node reached by the given path of (mode, group)
+        steps (see LevelOfDetail), with groups capped at budget.
+        """
+
+        path = tuple((mode, group) for mode, group in path)
+        key = self._level_key(node, path, budget)
+
+        def load():
+            if not path:
+                return Level.of_node(self.graph().store, node)
+            parent = self.level(node, path[:-1], budget)
+            mode, group = path[-1]
+            groups = parent.groups(mode, budget)
+            self.level_grouped(node, path[:-1], budget)
+            return parent.region(groups, group)
+
+        return self.cache.get(key, load)
+
+    def level_grouped(self, node, path, budget):
+        """Re-estimate the size of a cached Level after grouping it."""
+        path = tuple((mode, group) for mode, group in path)
+        self.cache.resize(self._level_key(node, path, budget))
+
+    def _level_key(self, node, path, budget):
+        # a cached level holds on to its node, so ids are not reused; levels
+        # cached before an edit of the tree are not looked up after it
+        return ('level', self.graph_file, id(node),
+                self._loaded_tree().version, budget, path)
+
+    def _release_tree(self):
+        # drop the workspace's edits of its tree, if it has any
+        if self.tree_key is not None and len(self.tree_key) == 3:
+            self.cache.discard(self.tree_key)
+        self.tree_key = None
+
+    def close(self):
+        self._release_tree()
+
+
+class WorkspaceRegistry(object):
+    """Workspaces of the sessions, dropped once idle for ttl seconds.
+
+    Args:
+        cache (ResourceCache): Cache the workspaces point into.
+        ttl (int): Seconds after which an idle workspace is dropped.
+        prefetch_pool (multiprocessing.Pool): See Workspace.
+    """
+
+    def __init__(self, cache, ttl, prefetch_pool=None):
+        self.cache = cache
+        self.ttl = ttl
+        self.prefetch_pool = prefetch_pool
+        self.workspaces = {}
+        self.lock = threading.Lock()
+
+    def get(self, workspace_id=None):
+        """The workspace with the given id, or a new one if there is no
+        such (live) workspace.
+        """
+
+        now = time.time()
+        with self.lock:
+            for idle_id, workspace in self.workspaces.items():
+                if now - workspace.last_used > self.ttl:
+                    del self.workspaces[idle_id]
+                    workspace.close()
+            workspace = self.workspaces.get(workspace_id)
+            if workspace is None:
+                workspace = Workspace(uuid.uuid4().hex, self.cache,
+                                      self.prefetch_pool)
+                self.workspaces[workspace.id] = workspace
+            workspace.last_used = now
+            return workspace
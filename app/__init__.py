@@ -1,4 +1,9 @@
+import os
 from flask import Flask
 
 app = Flask(__name__)
+# signs the session cookie that ties a browser to its workspace; sessions
+# (like the workspaces themselves) do not outlive the process unless a
+# fixed key is configured
+app.secret_key = os.environ.get('SECRET_KEY') or os.urandom(24)
 from app import views
@@ -1,6 +1,8 @@
 var network;
 var allNodes, allEdges;
 var highlightActive = false;
+// coarsened view being drawn (see showNodeView), null if none
+var lodView = null;
 // It is required that MIN_NODE_SIZE < 0.80 * MAX_NODE_SIZE
 var MIN_NODE_SIZE = 30,
     MAX_NODE_SIZE = 85
@@ -101,6 +103,12 @@ function redrawAll(container='networkCanvas') {
         // }
     };
 
+    // views laid out on the server are drawn at their nodes' positions
+    var ids = nodesDataset.getIds();
+    if (ids.length > 0 && nodesDataset.get(ids[0]).x !== undefined) {
+        options.physics.enabled = false;
+    }
+
     // get a JSON object
     allNodes = nodesDataset.get({
         returnType: "Object"
@@ -123,6 +131,10 @@ function resolveDoubleClick(params) {
     if (params.nodes.length == 0) {
         return;
     }
+    if (lodView !== null) {
+        drillInto(params.nodes[0]);
+        return;
+    }
     var node_id = String(params.nodes[0]);
     fetch_node_info(node_id);
 }
@@ -338,3 +350,120 @@ function focusRandom() {
     finishMessage = 'Node: ' + nodeId + ' in focus.';
     network.focus(nodeId, options);
 }
+
+/*
+Views in the binary encoding of Helpers.pack_binary: a header (JSON) with
+the nodes and edges of each view packed after it as typed arrays, one per
+field, decoded back into the records vis.js takes.
+*/
+var VIEW_ARRAY_TYPES = {
+    bool: Uint8Array,
+    i1: Int8Array,
+    i2: Int16Array,
+    i4: Int32Array,
+    f8: Float64Array
+};
+
+// GETs url with format=binary and passes the decoded response to
+// callbacks.success (plain JSON responses, e.g. errors, are passed as they
+// are); callbacks.complete, if given, is called once the request is over.
+function getView(url, data, callbacks) {
+    var request = new XMLHttpRequest();
+    var params = $.param($.extend({format: 'binary'}, data));
+    request.open('GET', url + '?' + params);
+    request.responseType = 'arraybuffer';
+    request.onload = function() {
+        var contentType = request.getResponseHeader('Content-Type') || '';
+        var response;
+        if (contentType.indexOf('application/octet-stream') === 0) {
+            response = decodeView(request.response);
+        } else {
+            var text = new TextDecoder('utf-8').decode(request.response);
+            response = JSON.parse(text);
+        }
+        if (request.status === 200) {
+            callbacks.success(response);
+        } else if (callbacks.error) {
+            callbacks.error(response);
+        }
+        if (callbacks.complete) {
+            callbacks.complete();
+        }
+    };
+    request.onerror = function() {
+        if (callbacks.error) {
+            callbacks.error(null);
+        }
+        if (callbacks.complete) {
+            callbacks.complete();
+        }
+    };
+    request.send();
+}
+
+function decodeView(buffer) {
+    var header = new DataView(buffer, 0, 12);
+    var magic = String.fromCharCode.apply(null, new Uint8Array(buffer, 0, 4));
+    if (magic !== 'VISB' || header.getUint32(4, true) !== 1) {
+        throw new Error('Unknown view encoding');
+    }
+    var headerLength = header.getUint32(8, true);
+    var text = new TextDecoder('utf-8').decode(
+        new Uint8Array(buffer, 12, headerLength));
+    return decodeViewValue(JSON.parse(text), buffer, 12 + headerLength);
+}
+
+function decodeViewValue(value, buffer, dataStart) {
+    if (value === null || typeof value !== 'object') {
+        return value;
+    }
+    if (Array.isArray(value)) {
+        return value.map(function(item) {
+            return decodeViewValue(item, buffer, dataStart);
+        });
+    }
+    if (value.hasOwnProperty('$columns')) {
+        return {
+            nodes: decodeViewRecords(value['$columns']['nodes'], buffer,
+                                     dataStart),
+            edges: decodeViewRecords(value['$columns']['edges'], buffer,
+                                     dataStart)
+        };
+    }
+    var decoded = {};
+    for (var key in value) {
+        decoded[key] = decodeViewValue(value[key], buffer, dataStart);
+    }
+    return decoded;
+}
+
+function decodeViewRecords(columns, buffer, dataStart) {
+    var count = columns['count'];
+    var records = new Array(count);
+    for (var i = 0; i < count; i++) {
+        records[i] = {};
+    }
+    columns['fields'].forEach(function(field) {
+        var key = field['key'];
+        var type = field['type'];
+        var table = field['table'];
+        var ArrayType = VIEW_ARRAY_TYPES[table ? field['codes'] : type];
+        var values = new ArrayType(buffer, dataStart + field['offset'],
+                                   count);
+        if (type === 'json') {
+            table = table.map(function(item) {
+                return JSON.parse(item);
+            });
+        }
+        for (var i = 0; i < count; i++) {
+            if (table) {
+                records[i][key] = table[values[i]];
+            } else if (type === 'bool') {
+                records[i][key] = values[i] !== 0;
+            } else {
+                records[i][key] = values[i];
+            }
+        }
+    });
+    return records;
+}
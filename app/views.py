@@ -2,27 +2,121 @@ import cPickle as pickle
 import graph_tool.all as gt
 import numpy as np
 import os
+import threading
+import TreeStorage
 from Queue import Queue
-from flask import Flask, jsonify, render_template, request
+from flask import Flask, Response, jsonify, render_template, request
+from flask import session
 from app import app
 from Database_Handlers import *
 from GraphManager import GraphManager
 from Handlers import *
 from Helpers import *
 from HierarchicalPartitioningTree import PartitionTree, PartitionNode
+from Jobs import JobQueue
+from Layouts import LayoutCache, fingerprint
 from PartitionMethods import *
+from Prefetcher import worker_pool
+from Workspaces import ResourceCache, WorkspaceRegistry
 
 GRAPH_FILES_PATH = 'app/data/graphs/'
 TREE_FILES_PATH = 'app/data/trees/'
 CLUSTER_FILES_PATH = 'app/bin/cluster_methods/'
 ADJACENCY_OUT_PATH = 'app/adjacency_out/'
-
-
-class Mem:
-    T = None
-    gm = GraphManager(None)
-    # TODO: Do we really need this current_view?
-    current_view = {}
+# worker processes decomposing the largest children of expanded nodes ahead
+# of time (0 disables prefetching)
+PREFETCH_WORKERS = 1
+# estimated memory that the graphs and trees loaded for all sessions may
+# take up before the least recently used are evicted
+CACHE_BUDGET = 8 * 2 ** 30
+# seconds after which the workspace of an idle session is dropped
+WORKSPACE_TTL = 24 * 60 * 60
+# threads running decompositions and other long requests in the background
+JOB_WORKERS = 2
+# most vertices drawn as they are; larger nodes are drawn coarsened (see
+# LevelOfDetail) unless the client asks for another budget
+VIS_VERTICES = 2194
+
+# forked first, before any thread of the server is started
+prefetch_pool = None
+if PREFETCH_WORKERS > 0:
+    prefetch_pool = worker_pool(PREFETCH_WORKERS)
+# loaded graphs and trees, shared by the sessions' workspaces
+cache = ResourceCache(CACHE_BUDGET)
+workspaces = WorkspaceRegistry(cache, WORKSPACE_TTL,
+                               prefetch_pool=prefetch_pool)
+jobs = JobQueue(JOB_WORKERS)
+# jobs laying out views with no cached layout, by workspace, layout file and
+# fingerprint of the view, so a view drawn again waits on the same job
+layout_jobs = {}
+layout_jobs_lock = threading.Lock()
+
+
+def workspace():
+    """Workspace of the session making the request."""
+    ws = workspaces.get(session.get('workspace'))
+    session['workspace'] = ws.id
+    return ws
+
+
+def lay_out(owner, layouts, vis_data, fully_qualified_label, view,
+            path=()):
+    """Add the cached layout of a node's view to vis_data (see Layouts),
+    or lay the view out in a background job if none is cached.
+
+    Returns:
+        Id of the job laying the view out, or None if vis_data was laid out.
+    """
+
+    if layouts.lay_out(vis_data, fully_qualified_label, view, path):
+        return None
+    ids = dict(vis_data.nodes)['id']
+    edges = dict(vis_data.edges)
+    key = (owner, layouts.filename(fully_qualified_label, view, path),
+           fingerprint(ids, edges['from'], edges['to']))
+    with layout_jobs_lock:
+        for old_key, job in layout_jobs.items():
+            if job.is_over():
+                del layout_jobs[old_key]
+        job = layout_jobs.get(key)
+        if job is None:
+            job = jobs.submit(owner, layouts.positions, fully_qualified_label,
+                              view, ids, edges['from'], edges['to'], path)
+            layout_jobs[key] = job
+    return job.id
+
+
+def laid_out(func, owner, layouts, fully_qualified_label, view):
+    """Wrap func (a handler returning a node's view) to lay its view out
+    (see lay_out), unless the view is too large to be drawn.
+    """
+
+    def run(*args, **kwargs):
+        response = func(*args, **kwargs)
+        vis_data = response.get('vis_data')
+        if vis_data is not None and vis_data.num_nodes() <= VIS_VERTICES:
+            job_id = lay_out(owner, layouts, vis_data,
+                             fully_qualified_label, view)
+            if job_id is not None:
+                response['layout_job'] = job_id
+        return response
+    return run
+
+
+def json_response(obj):
+    """Response streaming obj as JSON (see Helpers.stream_json)."""
+    return Response(stream_json(obj), mimetype='application/json')
+
+
+def view_response(obj):
+    """Response streaming obj (holding a view) as JSON, or packed (see
+    Helpers.pack_binary) if the request asks for format=binary.
+    """
+
+    if request.args.get('format') == 'binary':
+        return Response(pack_binary(obj),
+                        mimetype='application/octet-stream')
+    return json_response(obj)
 
 
 @app.route('/')
@@ -33,10 +127,11 @@ def index():
         if file.endswith('.gt'):
             graph_files.append(file)
 
-    # finds all available tree (.pkl) files
+    # finds all available tree (.tree directories and legacy .pkl) files
     tree_files = []
     for file in os.listdir(TREE_FILES_PATH):
-        if file.endswith('.pkl'):
+        if (TreeStorage.is_tree_dir(TREE_FILES_PATH + file) or
+                file.endswith('.pkl')):
             tree_files.append(file)
 
     # find all available cluster method binaries
@@ -53,22 +148,21 @@ def index():
 
 @app.route('/load-graph')
 def load_graph():
-    Mem.gm = GraphManager(None)
     filename = GRAPH_FILES_PATH + request.args.get('filename')
-    G = Mem.gm.create_graph(graph_file=filename)
+    graph = workspace().load_graph(filename)
+    G = graph.g
     notes = ''
     if 'notes' in G.graph_properties:
         notes = G.graph_properties['notes']
     return render_template('overallGraphStats.html',
                            notes=notes,
-                           **statistics(G))
+                           **statistics(graph.store))
 
 
 @app.route('/load-tree')
 def load_tree():
     filename = TREE_FILES_PATH + request.args.get('filename')
-    with open(filename, 'rb') as f:
-        Mem.T = pickle.load(f)
+    workspace().load_tree(filename)
 
     return jsonify({'msg': 'tree successfully loaded'})
 
@@ -76,11 +170,14 @@ def load_tree():
 @app.route('/save-tree')
 def save_tree():
     filename = request.args.get('filename')
-    if not filename.endswith('.pkl'):
-        filename += '.pkl'
+    if not filename.endswith(TreeStorage.EXTENSION):
+        filename += TreeStorage.EXTENSION
+    ws = workspace()
     try:
-        with open(filename, 'wb') as f:
-            pickle.dump(Mem.T, f)
+        # waits for the session's running decompositions
+        with ws.editing_tree() as T:
+            TreeStorage.commit_tree(T, filename)
+            ws.tree_saved(filename)
     except Exception as e:
         return jsonify({'msg': str(e)})
 
@@ -90,9 +187,15 @@ def save_tree():
 @app.route('/get-hnode-children')
 def node_children():
     fully_qualified_label = request.args.get('fullyQualifiedLabel')
+    ws = workspace()
+    T = ws.tree()
 
-    response = get_node_children(Mem.T, fully_qualified_label)
+    response = get_node_children(T, fully_qualified_label)
     assert 'node_info' in response
+    graph = ws.graph()
+    if graph is not None and graph.prefetcher is not None:
+        node = traverse_tree(T, fully_qualified_label)
+        graph.prefetcher.schedule(node.children)
 
     node_info = response['node_info']
     tree_nodes_html = render_template('treeNodes.html', node_info=node_info)
@@ -103,11 +206,20 @@ def node_children():
     })
 
 
+@app.route('/get-hnode-statistics')
+def hnode_statistics():
+    fully_qualified_label = request.args.get('fullyQualifiedLabel')
+    ws = workspace()
+    return jsonify(node_statistics(ws.tree(), ws.graph().store,
+                                   fully_qualified_label))
+
+
 @app.route('/remove-hnode-children')
 def remove_hnode_children():
     fully_qualified_label = request.args.get('fullyQualifiedLabel')
 
-    response = remove_node_children(Mem.T, fully_qualified_label)
+    with workspace().editing_tree() as T:
+        response = remove_node_children(T, fully_qualified_label)
     assert 'node' in response
 
     return response['node'].label
@@ -118,27 +230,70 @@ def decompose_by_operation():
     fully_qualified_label = request.args.get('fullyQualifiedLabel')
     operation = request.args.get('operation')
 
-    response = \
-        decompose_node(Mem.T, Mem.gm.g, fully_qualified_label, operation)
-    if 'msg' in response:
-        return jsonify(response)
-    assert 'node_info' in response
-
-    return render_template('treeNodes.html', **response)
+    ws = workspace()
+    job = jobs.submit(ws.id, _decompose_job, ws, fully_qualified_label,
+                      operation)
+    return jsonify({'job_id': job.id})
+
+
+def _decompose_job(ws, fully_qualified_label, operation, progress):
+    graph = ws.graph()
+    # the tree is only locked to add the children, so the session's saves
+    # and other edits do not wait on the decomposition
+    partition = partition_node(ws.tree(), graph.g, fully_qualified_label,
+                               operation, prefetcher=graph.prefetcher,
+                               progress=progress)
+    if 'msg' in partition:
+        return partition
+    with ws.editing_tree() as T:
+        response = attach_partition(T, fully_qualified_label, partition)
+        if 'msg' in response:
+            return response
+        assert 'node_info' in response
+        node = traverse_tree(T, fully_qualified_label)
+    if graph.prefetcher is not None:
+        graph.prefetcher.schedule(node.children)
+
+    with app.app_context():
+        html = render_template('treeNodes.html', **response)
+    return {'tree_nodes_html': html}
 
 
 @app.route('/induce-hnode-subgraph')
 def induce_node_subgraph():
     fully_qualified_label = request.args.get('fullyQualifiedLabel')
-    vlist, elist = get_indices(Mem.T, fully_qualified_label)
-    if len(vlist) > 2194:
-        return jsonify({'msg': 'Graph is too large to visualize'})
-
-    Mem.current_view['vlist'] = vlist
-    Mem.current_view['elist'] = elist
+    # (mode, group) steps drilled into the node's coarsened views
+    path = json.loads(request.args.get('path', '[]'))
+    mode = request.args.get('mode') or None
+    budget = max(int(request.args.get('budget', VIS_VERTICES)), 2)
+    ws = workspace()
+    node = traverse_tree(ws.tree(), fully_qualified_label)
+    level = ws.level(node, path, budget)
+
+    response = level_of_detail(ws.graph().g, level, budget, mode,
+                               is_node=not path)
+    ws.level_grouped(node, path, budget)
+    if 'msg' in response:
+        return jsonify(response)
 
-    response = induce_subgraph(Mem.gm.g, vlist, elist)
-    return jsonify(response)
+    # vertices of a coarsened view are metanodes, not vertices of the graph
+    ws.current_view = {}
+    if response['mode'] is None:
+        ws.current_view['vlist'] = level.vertices
+        ws.current_view['elist'] = level.eidx
+        view = 'subgraph'
+    else:
+        view = 'metagraph:' + response['mode']
+    job_id = lay_out(ws.id, LayoutCache(ws.tree_key[1]),
+                     response['vis_data'], fully_qualified_label, view, path)
+    if job_id is not None:
+        response['layout_job'] = job_id
+    response.update({
+        'fullyQualifiedLabel': fully_qualified_label,
+        'path': path,
+        'budget': budget,
+    })
+    return view_response(response)
 
 
 @app.route('/cluster-by-landmarks')
@@ -146,13 +301,19 @@ def cluster_by_landmarks():
     fully_qualified_label = request.args.get('fullyQualifiedLabel')
     filename = request.args.get('filename')
     cmd = CLUSTER_FILES_PATH + filename
+    ws = workspace()
 
-    vlist, elist = get_indices(Mem.T, fully_qualified_label)
-    Mem.current_view['vlist'] = vlist
-    Mem.current_view['elist'] = elist
+    vlist, elist = get_indices(ws.tree(), fully_qualified_label)
+    ws.current_view['vlist'] = vlist
+    ws.current_view['elist'] = elist
 
-    response = landmark_clustering(Mem.gm.g, vlist, elist, cmd)
-    return jsonify(response)
+    # draws the node's subgraph, as its 'subgraph' view does
+    job = jobs.submit(ws.id,
+                      laid_out(landmark_clustering, ws.id,
+                               LayoutCache(ws.tree_key[1]),
+                               fully_qualified_label, 'subgraph'),
+                      ws.graph().g, vlist, elist, cmd)
+    return jsonify({'job_id': job.id})
 
 
 @app.route('/append-landmark-clusters', methods=['POST'])
@@ -160,13 +321,15 @@ def append_landmark_clusters():
     fully_qualified_label = request.form['fullyQualifiedLabel']
     cluster_assignment = json.loads(request.form['cluster_assignment'])
 
-    vlist, elist = get_indices(Mem.T, fully_qualified_label)
-    # vlist = Mem.current_view['vlist']
-    # elist = Mem.current_view['elist']
-    response = make_landmark_cluster_children(Mem.gm.g,
-                                              Mem.T,
-                                              fully_qualified_label,
-                                              cluster_assignment)
+    ws = workspace()
+    with ws.editing_tree() as T:
+        vlist, elist = get_indices(T, fully_qualified_label)
+        # vlist = ws.current_view['vlist']
+        # elist = ws.current_view['elist']
+        response = make_landmark_cluster_children(ws.graph().g,
+                                                  T,
+                                                  fully_qualified_label,
+                                                  cluster_assignment)
     if 'msg' in response:
         return jsonify(response)
     assert 'node_info' in response
@@ -207,48 +370,72 @@ def do_doc_lookup():
 
 @app.route('/get-hierarchy-tree')
 def get_hierarchy_tree():
-    nodes = PartitionTree.traverse_dfs(Mem.T.root, return_stats=True)
+    nodes = PartitionTree.traverse_dfs(workspace().tree().root,
+                                       return_stats=True)
     return jsonify({'nodes': nodes})
 
 
 @app.route('/bfs-tree')
 def compute_bfs_tree():
-    if not Mem.current_view:
+    ws = workspace()
+    if not ws.current_view:
         return jsonify({'msg': 'Current view not set'})
 
     # rootNodeID returned is actually vertex index in graph
     root_idx = int(request.args.get('rootNodeID'))
     # O(|V|) operation; consider removing
-    assert root_idx in Mem.current_view['vlist']
-    vlist = Mem.current_view['vlist']
-    elist = Mem.current_view['elist']
+    assert root_idx in ws.current_view['vlist']
+    vlist = ws.current_view['vlist']
+    elist = ws.current_view['elist']
 
-    response = bfs_tree(Mem.gm.g, vlist, elist, root_idx)
+    response = bfs_tree(ws.graph().g, vlist, elist, root_idx)
     return jsonify(response)
 
 
 @app.route('/compute-metagraph')
 def compute_metagraph():
     fully_qualified_label = request.args.get('fullyQualifiedLabel')
-    return jsonify(metagraph(Mem.T, fully_qualified_label))
+    return jsonify(metagraph(workspace().tree(), fully_qualified_label))
 
 
 @app.route('/compute-bcc-tree')
 def compute_bcc_tree():
     fully_qualified_label = request.args.get('fullyQualifiedLabel')
-    vlist, elist = get_indices(Mem.T, fully_qualified_label)
-    return jsonify(bcc_tree(Mem.gm.g, vlist, elist))
+    ws = workspace()
+    vlist, elist = get_indices(ws.tree(), fully_qualified_label)
+    job = jobs.submit(ws.id,
+                      laid_out(bcc_tree, ws.id, LayoutCache(ws.tree_key[1]),
+                               fully_qualified_label, 'bcc_tree'),
+                      ws.graph().g, vlist, elist)
+    return jsonify({'job_id': job.id})
 
 
 @app.route('/save-adjacency-list')
 def save_adjacency_list():
     fully_qualified_label = request.args.get('fullyQualifiedLabel')
-    vlist, elist = get_indices(Mem.T, fully_qualified_label)
+    ws = workspace()
+    vlist, elist = get_indices(ws.tree(), fully_qualified_label)
 
     filename = ADJACENCY_OUT_PATH + fully_qualified_label + '.txt'
     try:
-        response = save_adjacency(Mem.gm.g, vlist, elist, filename)
+        response = save_adjacency(ws.graph().store, vlist, elist, filename)
     except Exception as e:
         return jsonify({'msg': str(e)})
 
     return jsonify(response)
+
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    job = jobs.get(job_id, workspace().id)
+    if job is None:
+        return jsonify({'msg': 'No such job'}), 404
+    return view_response(job.info())
+
+
+@app.route('/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    job = jobs.cancel(job_id, workspace().id)
+    if job is None:
+        return jsonify({'msg': 'No such job'}), 404
+    return json_response(job.info())
@@ -0,0 +1,399 @@
+import argparse
+import graph_tool.all as gt
+import json
+import numpy as np
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import app.Handlers as Handlers
+import app.Helpers as Helpers
+import app.TreeStorage as TreeStorage
+from timeit import default_timer
+from app.HierarchicalPartitioningTree import PartitionTree
+from app.TreeExploration import TreeExploration
+"""Benchmark
+
+Times the partition operations, tree exploration, statistics, tree storage
+and Vis.js serializers on synthetic graphs (and any given graph files), and
+writes the timings as JSON. Given the JSON of an earlier run as a baseline,
+the medians are compared and the run fails if any benchmark slowed down by
+more than the tolerance.
+"""
+
+# largest subgraph the UI sends to Vis.js (see views.induce_node_subgraph)
+VIS_VERTICES = 2194
+SYNTHETIC_GRAPHS = ['power_law', 'grid', 'planted_partition', 'region_like']
+
+
+def init_argparser():
+    description = ('Benchmark partitioning, tree exploration, statistics, '
+                   'tree storage and serialization on synthetic graphs, '
+                   'optionally comparing the results against a baseline.')
+    parser = argparse.ArgumentParser(description=description)
+
+    parser.add_argument('graph_files', metavar='g', type=str, nargs='*',
+                        help='additional graph files (.gt extension) to '
+                             'benchmark')
+
+    parser.add_argument('-o', '--output', type=str, dest='output',
+                        default=None,
+                        help='output path of the JSON results (written to '
+                             'stdout by default)')
+
+    parser.add_argument('-b', '--baseline', type=str, dest='baseline',
+                        default=None,
+                        help='JSON results of an earlier run to compare '
+                             'against')
+
+    parser.add_argument('--tolerance', type=float, dest='tolerance',
+                        default=0.1,
+                        help='relative slowdown of a median tolerated '
+                             'before it counts as a regression')
+
+    parser.add_argument('--min-time', type=float, dest='min_time',
+                        default=0.001,
+                        help='benchmarks faster than this many seconds in '
+                             'the baseline are too noisy to count as '
+                             'regressions')
+
+    parser.add_argument('-g', '--graphs', type=str, dest='graphs',
+                        nargs='*', default=SYNTHETIC_GRAPHS,
+                        choices=SYNTHETIC_GRAPHS,
+                        help='synthetic graphs to generate (all by default)')
+
+    parser.add_argument('-n', '--num-vertices', type=int,
+                        dest='num_vertices', default=10000,
+                        help='approximate number of vertices of each '
+                             'synthetic graph')
+
+    parser.add_argument('-r', '--repeat', type=int, dest='repeat',
+                        default=3,
+                        help='number of timed runs of each benchmark')
+
+    parser.add_argument('-t', '--threshold', type=int, dest='threshold',
+                        default=256,
+                        help='threshold of the explored trees')
+
+    parser.add_argument('-w', '--workers', type=int, dest='workers',
+                        default=1,
+                        help='number of worker processes exploring trees')
+
+    parser.add_argument('-s', '--seed', type=int, dest='seed', default=42,
+                        help='seed of the synthetic graph generators')
+
+    return parser
+
+
+def simple_graph(num_vertices, src, tar):
+    '''
+    Undirected graph on num_vertices vertices with the given edges, less
+        self loops and parallel edges, with contiguous edge indices and an
+        'id' vertex property (as GraphManager would add)
+    '''
+    src, tar = np.minimum(src, tar), np.maximum(src, tar)
+    edges = np.unique(np.column_stack((src, tar))[src != tar], axis=0)
+    G = gt.Graph(directed=False)
+    G.add_vertex(num_vertices)
+    G.add_edge_list(edges)
+    G.vp['id'] = G.new_vp('int', vals=np.arange(num_vertices))
+    return G
+
+
+def power_law_graph(n, rng):
+    G = gt.price_network(n, m=2, directed=False)
+    src, tar, _ = Helpers.edge_array(G)
+    return simple_graph(n, src, tar)
+
+
+def grid_graph(n, rng):
+    side = max(int(np.sqrt(n)), 2)
+    G = gt.lattice([side, side])
+    src, tar, _ = Helpers.edge_array(G)
+    return simple_graph(side * side, src, tar)
+
+
+def planted_partition_graph(n, rng, num_blocks=16, deg_in=8.0,
+                            deg_out=1.0):
+    b = np.arange(n) % num_blocks
+    size = float(n) / num_blocks
+    # expected edge counts between blocks; the diagonal counts both ends
+    probs = np.full((num_blocks, num_blocks),
+                    size * deg_out / (num_blocks - 1))
+    np.fill_diagonal(probs, size * deg_in)
+    G = gt.generate_sbm(b, probs, directed=False)
+    src, tar, _ = Helpers.edge_array(G)
+    return simple_graph(n, src, tar)
+
+
+def region_like_graph(n, rng, max_set_size=24):
+    '''
+    Graph shaped like those of scripts/create_region_graph.py: every
+        generating set spans regions of several depths, and regions of the
+        set at consecutive depths are neighbors. Set sizes are heavy tailed
+        and shallow regions are common, which yields hubs, long chains and
+        many peel one vertices.
+    '''
+    depth = rng.geometric(0.35, n) - 1
+    src = []
+    tar = []
+    for _ in xrange(n // 4):
+        size = min(rng.zipf(2.0) + 1, max_set_size)
+        members = np.unique(rng.randint(0, n, size))
+        levels = np.unique(depth[members])
+        for lower, upper in zip(levels[:-1], levels[1:]):
+            a = members[depth[members] == lower]
+            b = members[depth[members] == upper]
+            src.append(np.repeat(a, len(b)))
+            tar.append(np.tile(b, len(a)))
+    if not src:
+        return simple_graph(n, np.array([], int), np.array([], int))
+    return simple_graph(n, np.concatenate(src), np.concatenate(tar))
+
+
+GENERATORS = {
+    'power_law': power_law_graph,
+    'grid': grid_graph,
+    'planted_partition': planted_partition_graph,
+    'region_like': region_like_graph,
+}
+
+
+def measure(func, repeat, setup=None):
+    '''
+    Time 'repeat' calls of func, each given the return value of a fresh
+        (untimed) call of setup if there is one. Returns the timings and the
+        value of the last call.
+    '''
+    runs = []
+    value = None
+    for _ in xrange(repeat):
+        args = () if setup is None else (setup(),)
+        t0 = default_timer()
+        value = func(*args)
+        runs.append(default_timer() - t0)
+    return {
+        'min': min(runs),
+        'median': float(np.median(runs)),
+        'runs': runs,
+    }, value
+
+
+def run(results, name, func, repeat, setup=None):
+    '''
+    Record the timings of func under name, or the error it raised; returns
+        the value of its last call (None on error).
+    '''
+    sys.stderr.write('  {} ... '.format(name))
+    try:
+        results[name], value = measure(func, repeat, setup)
+    except Exception as e:
+        results[name] = {'error': '{}: {}'.format(type(e).__name__, e)}
+        sys.stderr.write('{}\n'.format(results[name]['error']))
+        return None
+    sys.stderr.write('{:.4f}s\n'.format(results[name]['median']))
+    return value
+
+
+def vis_inputs(G):
+    '''
+    Largest subgraph the UI would serialize (that induced by the first
+        VIS_VERTICES vertices), with a mock landmark clustering of it.
+    '''
+    vlist = np.arange(min(G.num_vertices(), VIS_VERTICES))
+    H = Helpers.induced_view(G, vlist, None)
+    _, _, elist = Helpers.edge_array(H)
+    landmarks = vlist[::64]
+    landmark_map = {v: idx for idx, v in enumerate(landmarks)}
+    cluster_assignment = {v: v // 64 for v in vlist}
+    edges = list(H.edges())
+    spine = set(edges[::8])
+    branches = set(edges[1::8])
+    return (H, vlist, elist,
+            (cluster_assignment, landmark_map, spine, branches))
+
+
+def tree_nodes(T):
+    nodes = []
+    stack = [T.root]
+    while stack:
+        node = stack.pop()
+        nodes.append(node)
+        stack.extend(node.children)
+    return nodes
+
+
+def metagraph_node(T):
+    # internal node with the most children related by cross edges
+    nodes = [node for node in tree_nodes(T) if node.cross_edges]
+    if not nodes:
+        return None
+    return max(nodes, key=lambda node: node.num_children())
+
+
+def benchmark_graph(G, args, tmp_dir):
+    results = {}
+    repeat = args.repeat
+    v_idx = np.arange(G.num_vertices())
+    _, _, e_idx = Helpers.edge_array(G)
+    store = Helpers.graph_store(G, os.path.join(tmp_dir, 'graph.store'))
+
+    run(results, 'statistics', lambda: Helpers.statistics(G), repeat)
+    run(results, 'statistics[store]', lambda: Helpers.statistics(store),
+        repeat)
+
+    for name, operation in sorted(Handlers.OPERATIONS.iteritems()):
+        if name == 'peel_one':
+            func = lambda: operation(G)
+        else:
+            func = lambda: operation(G, vertex_indices=v_idx,
+                                     edge_indices=e_idx)
+        run(results, 'operation:{}'.format(name), func, repeat)
+
+    def explore(TE):
+        root = TE.create_root()
+        TE.explore_tree(root=root, threshold=args.threshold,
+                        workers=args.workers)
+        return TE.T
+
+    T = run(results, 'explore_tree', explore, repeat,
+            setup=lambda: TreeExploration(G, store=store.path))
+    if T is None:
+        return results
+
+    nodes = tree_nodes(T)
+
+    def collect_indices():
+        for node in nodes:
+            PartitionTree.collect_indices(node)
+
+    run(results, 'collect_indices', collect_indices, repeat)
+
+    tree_path = os.path.join(tmp_dir, 'tree' + TreeStorage.EXTENSION)
+    run(results, 'save_tree', lambda: TreeStorage.save_tree(T, tree_path),
+        repeat)
+    run(results, 'load_tree', lambda: TreeStorage.load_tree(tree_path),
+        repeat)
+
+    H, vlist, elist, cluster_map = vis_inputs(G)
+    run(results, 'to_vis_json', lambda: Helpers.to_vis_json(H), repeat)
+    run(results, 'to_vis_json_cluster_map',
+        lambda: Helpers.to_vis_json_cluster_map(H, *cluster_map), repeat)
+    # the streaming serializers are timed through to the JSON text
+    run(results, 'to_vis_columns',
+        lambda: ''.join(Helpers.stream_json(Helpers.to_vis_columns(H))),
+        repeat)
+    run(results, 'to_vis_columns_cluster_map',
+        lambda: ''.join(Helpers.stream_json(
+            Helpers.to_vis_columns_cluster_map(H, *cluster_map))),
+        repeat)
+    run(results, 'to_vis_binary',
+        lambda: ''.join(Helpers.pack_binary(Helpers.to_vis_columns(H))),
+        repeat)
+    run(results, 'to_vis_binary_cluster_map',
+        lambda: ''.join(Helpers.pack_binary(
+            Helpers.to_vis_columns_cluster_map(H, *cluster_map))),
+        repeat)
+    # the BCC tree and metagraph serializers only ever run on what these
+    # handlers build, so the handlers are timed as a whole
+    run(results, 'bcc_tree', lambda: Handlers.bcc_tree(G, vlist, elist),
+        repeat)
+    node = metagraph_node(T)
+    if node is not None:
+        run(results, 'metagraph',
+            lambda: Handlers.metagraph(T, node.label), repeat)
+    return results
+
+
+def compare(results, baseline, tolerance, min_time):
+    '''
+    Print the ratio of every median to that of the baseline; returns the
+        names of the regressions.
+    '''
+    regressions = []
+    print >> sys.stderr, '\n{:<50} {:>10} {:>10} {:>7}'.format(
+        'benchmark', 'baseline', 'current', 'ratio')
+    for graph, graph_results in sorted(results.iteritems()):
+        base_results = baseline.get(graph, {})
+        for name, timing in sorted(graph_results.iteritems()):
+            label = '{}/{}'.format(graph, name)
+            base = base_results.get(name)
+            if base is None or 'median' not in base or 'median' not in timing:
+                status = 'new' if base is None else 'skipped'
+                print >> sys.stderr, '{:<50} {:>30}'.format(label, status)
+                continue
+            ratio = timing['median'] / max(base['median'], 1e-9)
+            flag = ''
+            if ratio > 1 + tolerance and base['median'] >= min_time:
+                regressions.append(label)
+                flag = ' REGRESSION'
+            print >> sys.stderr, \
+                '{:<50} {:>10.4f} {:>10.4f} {:>7.2f}{}'.format(
+                    label, base['median'], timing['median'], ratio, flag)
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = init_argparser()
+    args = parser.parse_args()
+
+    np.random.seed(args.seed)
+    if hasattr(gt, 'seed_rng'):
+        gt.seed_rng(args.seed)
+    rng = np.random.RandomState(args.seed)
+
+    # the operations report progress on stdout, which may carry the results
+    stdout = sys.stdout
+    sys.stdout = sys.stderr
+
+    graphs = []
+    for name in args.graphs:
+        graphs.append((name, GENERATORS[name](args.num_vertices, rng)))
+    for filename in args.graph_files:
+        graphs.append((os.path.basename(filename), gt.load_graph(filename)))
+
+    output = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'graph_tool': getattr(gt, '__version__', None),
+            'num_vertices': args.num_vertices,
+            'repeat': args.repeat,
+            'threshold': args.threshold,
+            'workers': args.workers,
+            'seed': args.seed,
+        },
+        'graphs': {},
+        'results': {},
+    }
+    for name, G in graphs:
+        print >> sys.stderr, '{} (|V|: {}, |E|: {})'.format(
+            name, G.num_vertices(), G.num_edges())
+        output['graphs'][name] = {
+            'num_vertices': G.num_vertices(),
+            'num_edges': G.num_edges(),
+        }
+        tmp_dir = tempfile.mkdtemp(prefix='benchmark_')
+        try:
+            output['results'][name] = benchmark_graph(G, args, tmp_dir)
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    if args.output is None:
+        json.dump(output, stdout, indent=2, sort_keys=True)
+        stdout.write('\n')
+    else:
+        with open(args.output, 'w') as f:
+            json.dump(output, f, indent=2, sort_keys=True)
+
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(output['results'], baseline['results'],
+                              args.tolerance, args.min_time)
+        if regressions:
+            sys.exit('{} benchmark(s) regressed: {}'.format(
+                len(regressions), ', '.join(regressions)))
@@ -0,0 +1,35 @@
+import argparse
+import os
+import app.TreeStorage as TreeStorage
+
+
+def init_argparser():
+    description = ('Convert a pickled HierarchyTree (.pkl) to the columnar '
+                   'tree directory format (.tree) that can be opened without '
+                   'loading the whole tree into memory.')
+    parser = argparse.ArgumentParser(description=description)
+
+    parser.add_argument('input_file', metavar='i', type=str,
+                        help='input path of pickled tree file (.pkl '
+                             'extension)')
+
+    parser.add_argument('output_file', metavar='o', type=str, nargs='?',
+                        default=None,
+                        help='output path of tree directory (defaults to the '
+                             'input path with a .tree extension)')
+
+    return parser
+
+if __name__ == '__main__':
+    parser = init_argparser()
+    args = parser.parse_args()
+
+    output_file = args.output_file
+    if output_file is None:
+        output_file = os.path.splitext(args.input_file)[0]
+    if not output_file.endswith(TreeStorage.EXTENSION):
+        output_file += TreeStorage.EXTENSION
+
+    T = TreeStorage.load_pickled_tree(args.input_file)
+    TreeStorage.save_tree(T, output_file)
+    print('Tree written to {}'.format(output_file))
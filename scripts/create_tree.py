@@ -1,6 +1,8 @@
 import argparse
 import graph_tool.all as gt
+import sys
 import app.TreeExploration as TreeExploration
+import app.TreeStorage as TreeStorage
 
 
 def init_argparser():
@@ -32,16 +34,75 @@ def init_argparser():
                         help='check integrity of node partitioning (primarily '
                              'for debugging purposes)')
 
+    parser.add_argument('-v', '--verify', action='store_true',
+                        dest='verify',
+                        help='check integrity of the whole tree once it is '
+                             'built and again once it is saved')
+
+    parser.add_argument('-w', '--workers', type=int, dest='workers',
+                        default=1,
+                        help='number of worker processes used to partition '
+                             'independent TreeNodes in parallel')
+
+    parser.add_argument('-s', '--store', type=str, dest='store',
+                        default=None,
+                        help='directory of the memory-mapped GraphStore '
+                             'worker processes attach to (exported from the '
+                             'input graph if missing; a temporary one is '
+                             'used by default)')
+
+    parser.add_argument('-p', '--checkpoint-interval', type=int,
+                        dest='checkpoint_interval', default=600,
+                        help='seconds between checkpoints of the partial '
+                             'tree, written to the output path (0 disables '
+                             'checkpoints)')
+
+    parser.add_argument('-m', '--memory-limit', type=int,
+                        dest='memory_limit', default=None,
+                        help='resident memory limit in megabytes; once it '
+                             'is exceeded, finished subtrees are spilled to '
+                             'disk and grafted back when the tree is saved')
+
+    parser.add_argument('--spill-dir', type=str, dest='spill_dir',
+                        default=None,
+                        help='directory for spilled subtrees (defaults to '
+                             'the output path with a .spill extension)')
+
+    parser.add_argument('-r', '--resume', action='store_true',
+                        dest='resume',
+                        help='continue the interrupted run that '
+                             'checkpointed to the output path')
+
     return parser
 
 if __name__ == '__main__':
     parser = init_argparser()
     args = parser.parse_args()
-    optional_args = ['threshold', 'separate_peel_one', 'check_partition']
+    optional_args = ['threshold', 'check_partition', 'workers',
+                     'checkpoint_interval']
     kwargs = {k: getattr(args, k) for k in optional_args}
 
+    output_file = args.output_file
+    if not output_file.endswith(TreeStorage.EXTENSION):
+        output_file += TreeStorage.EXTENSION
+    checkpoint = output_file if args.checkpoint_interval > 0 else None
+    if args.memory_limit is not None:
+        kwargs['memory_limit'] = args.memory_limit * 2 ** 20
+    kwargs['spill_dir'] = args.spill_dir
+    if kwargs['spill_dir'] is None:
+        kwargs['spill_dir'] = output_file + '.spill'
+
     G = gt.load_graph(args.input_file)
-    TE = TreeExploration.TreeExploration(G)
-    root = TE.create_root()
-    TE.explore_tree(root=root, **kwargs)
-    TE.save_tree(args.output_file)
+    TE = TreeExploration.TreeExploration(G, store=args.store)
+    if args.resume:
+        TE.resume_tree(output_file, **kwargs)
+    else:
+        root = TE.create_root()
+        TE.explore_tree(root=root, separate_peel_one=args.separate_peel_one,
+                        checkpoint=checkpoint, **kwargs)
+    if args.verify:
+        problems = TE.T.check_integrity(G)
+        if problems:
+            print('\n'.join(problems))
+            sys.exit('Tree failed integrity check')
+    TE.save_tree(output_file, verify=args.verify)
@@ -0,0 +1,15 @@
+import os
+import sys
+"""Tests of the app's modules.
+
+The app's modules import each other as top-level modules, so the app
+directory is put on the path here, ahead of the tests. Tests of modules
+that need graph-tool are skipped where it is not installed.
+
+Run with: python -m unittest discover -s tests -t .
+"""
+
+APP_DIR = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), 'app')
+if APP_DIR not in sys.path:
+    sys.path.insert(0, APP_DIR)
@@ -0,0 +1,184 @@
+import numpy as np
+import os
+import unittest
+from GraphPeeling import CoreMaintainer, core_numbers, csr_adjacency
+from GraphPeeling import peel_layers
+
+try:
+    import graph_tool.all as gt
+    from PartitionMethods import edge_peel, native_edge_peel
+except ImportError:
+    gt = None
+
+PEELING_BIN = os.path.join('app', 'bin', 'graph_peeling.bin')
+
+
+def brute_force_cores(edges):
+    # core number of every endpoint: the largest k such that the vertex
+    # survives repeatedly deleting vertices of degree below k
+    vertices = set(v for edge in edges for v in edge)
+    core = dict.fromkeys(vertices, 0)
+    k = 1
+    while True:
+        alive = set(vertices)
+        removed = True
+        while removed:
+            degree = dict.fromkeys(alive, 0)
+            for u, v in edges:
+                if u in alive and v in alive:
+                    degree[u] += 1
+                    degree[v] += 1
+            low = set(v for v in alive if degree[v] < k)
+            removed = len(low) > 0
+            alive -= low
+        if not alive:
+            return core
+        for v in alive:
+            core[v] = k
+        k += 1
+
+
+def brute_force_layers(edges):
+    # repeatedly strip the edges among the vertices of maximum core number
+    remaining = range(len(edges))
+    layers = []
+    while remaining:
+        core = brute_force_cores([edges[i] for i in remaining])
+        peel = max(core.values())
+        top = sorted(v for v in core if core[v] == peel)
+        layer = [i for i in remaining
+                 if core[edges[i][0]] == peel and core[edges[i][1]] == peel]
+        layers.append((peel, top, layer))
+        remaining = [i for i in remaining if i not in layer]
+    return layers
+
+
+def clique(vertices):
+    return [(u, v) for i, u in enumerate(vertices) for v in vertices[i + 1:]]
+
+
+def random_graph(random, num_vertices, num_edges):
+    edges = set()
+    while len(edges) < num_edges:
+        u, v = random.randint(0, num_vertices, 2)
+        if u != v:
+            edges.add((min(u, v), max(u, v)))
+    return sorted(edges)
+
+
+FIXED_GRAPHS = [
+    # a triangle with a pendant vertex
+    [(0, 1), (1, 2), (2, 0), (2, 3)],
+    # K5 and K4 joined by a path, with sparse ids
+    clique([0, 10, 20, 30, 40]) + [(40, 41), (41, 42)] +
+    clique([42, 43, 44, 45]),
+    # a cycle with chords
+    [(i, (i + 1) % 8) for i in xrange(8)] + [(0, 4), (1, 5), (2, 6)],
+    # two K4s sharing an edge, plus a star
+    clique([0, 1, 2, 3]) + [(2, 4), (2, 5), (3, 4), (3, 5), (4, 5)] +
+    [(6, v) for v in xrange(7, 12)],
+]
+
+
+class GraphPeelingTest(unittest.TestCase):
+
+    def graphs(self):
+        random = np.random.RandomState(0)
+        graphs = list(FIXED_GRAPHS)
+        for _ in xrange(20):
+            num_vertices = random.randint(5, 30)
+            max_edges = num_vertices * (num_vertices - 1) // 2
+            graphs.append(random_graph(random, num_vertices,
+                                       random.randint(1, max_edges)))
+        return graphs
+
+    def test_core_numbers(self):
+        for edges in self.graphs():
+            src, tar = np.array(edges).T
+            vertices, local = np.unique(np.concatenate((src, tar)),
+                                        return_inverse=True)
+            indptr, neighbors, _ = csr_adjacency(
+                local[:len(src)], local[len(src):], len(vertices))
+            expected = brute_force_cores(edges)
+            self.assertEqual(core_numbers(indptr, neighbors).tolist(),
+                             [expected[v] for v in vertices])
+
+    def test_peel_layers(self):
+        for edges in self.graphs():
+            src, tar = np.array(edges).T
+            layers = [(peel, v_idx.tolist(), sorted(e_pos.tolist()))
+                      for peel, v_idx, e_pos in peel_layers(src, tar)]
+            self.assertEqual(layers, brute_force_layers(edges))
+
+    def test_core_maintainer_follows_edge_removals(self):
+        random = np.random.RandomState(1)
+        for _ in xrange(20):
+            num_vertices = random.randint(5, 60)
+            max_edges = num_vertices * (num_vertices - 1) // 2
+            edges = random_graph(random, num_vertices,
+                                 random.randint(1, max_edges))
+            src, tar = np.array(edges).T
+            cores = CoreMaintainer(src, tar, num_vertices)
+            alive = np.ones(len(edges), dtype=bool)
+            while alive.any():
+                live = np.flatnonzero(alive)
+                size = random.randint(1, len(live) // 3 + 2)
+                batch = random.choice(live, size, replace=False)
+                cores.remove_edges(batch)
+                alive[batch] = False
+                indptr, neighbors, _ = csr_adjacency(src[alive], tar[alive],
+                                                     num_vertices)
+                self.assertEqual(cores.core.tolist(),
+                                 core_numbers(indptr, neighbors).tolist())
+
+    def test_peel_layers_of_no_edges(self):
+        empty = np.array([], dtype=np.int64)
+        self.assertEqual(peel_layers(empty, empty), [])
+
+
+@unittest.skipIf(gt is None, 'graph-tool is not installed')
+class NativeEdgePeelTest(unittest.TestCase):
+
+    def test_reports_every_layer(self):
+        edges = FIXED_GRAPHS[-1]
+        G = gt.Graph(directed=False)
+        G.add_vertex(max(max(edge) for edge in edges) + 1)
+        G.add_edge_list(np.array(edges))
+        reports = []
+        children = native_edge_peel(
+            G, vertex_indices=np.arange(G.num_vertices()),
+            edge_indices=np.arange(len(edges)),
+            progress=lambda *args: reports.append(args))
+        self.assertEqual(len(reports), len(children))
+        self.assertEqual(reports[-1][:2], (len(edges), len(edges)))
+
+
+@unittest.skipIf(gt is None, 'graph-tool is not installed')
+@unittest.skipIf(not os.access(PEELING_BIN, os.X_OK),
+                 'graph_peeling.bin is not executable from here')
+class EdgePeelTest(unittest.TestCase):
+
+    def test_native_edge_peel_matches_edge_peel(self):
+        quiet = lambda *args: None
+        for edges in FIXED_GRAPHS:
+            G = gt.Graph(directed=False)
+            G.add_vertex(max(max(edge) for edge in edges) + 1)
+            G.add_edge_list(np.array(edges))
+            vertices = np.arange(G.num_vertices())
+            expected = edge_peel(G, vertex_indices=vertices,
+                                 edge_indices=np.arange(len(edges)),
+                                 progress=quiet)
+            children = native_edge_peel(G, vertex_indices=vertices,
+                                        edge_indices=np.arange(len(edges)),
+                                        progress=quiet)
+            self.assertEqual([child.label for child in children],
+                             [child.label for child in expected])
+            for child, other in zip(children, expected):
+                self.assertEqual(sorted(child.vertex_indices.tolist()),
+                                 sorted(other.vertex_indices.tolist()))
+                self.assertEqual(sorted(child.edge_indices.tolist()),
+                                 sorted(other.edge_indices.tolist()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import numpy as np
+import os
+import shutil
+import tempfile
+import unittest
+
+try:
+    import TreeStorage
+    from Handlers import attach_partition, partition_node
+    from HierarchicalPartitioningTree import PartitionNode, PartitionTree
+except ImportError:
+    TreeStorage = None
+
+from tests.test_partition_methods import bowtie_with_tail
+
+
+def bowtie_tree():
+    T = PartitionTree()
+    T.root = PartitionNode(vertex_indices=np.arange(6),
+                           edge_indices=np.arange(7),
+                           label='root', partition_type='root')
+    return T
+
+
+@unittest.skipIf(TreeStorage is None, 'graph-tool is not installed')
+class PartitionNodeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.G = bowtie_with_tail()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def partition(self, T):
+        return partition_node(T, self.G, 'root', 'biconnected_components',
+                              progress=lambda *args: None)
+
+    def test_partition_leaves_tree_unchanged(self):
+        T = bowtie_tree()
+        partition = self.partition(T)
+        self.assertTrue(T.root.is_leaf())
+        self.assertEqual(len(partition['children']), 3)
+        self.assertIsNotNone(partition['children'][0].stats)
+
+        response = attach_partition(T, 'root', partition)
+        self.assertEqual(len(response['node_info']), 3)
+        self.assertEqual(len(T.root.children), 3)
+
+    def test_attach_to_copy_of_tree(self):
+        # the session took over a copy of the tree meanwhile
+        T = bowtie_tree()
+        path = os.path.join(self.tmp_dir, 'bowtie.tree')
+        TreeStorage.save_tree(T, path)
+        partition = self.partition(T)
+        copy = TreeStorage.load_tree(path)
+        self.assertNotIn('msg', attach_partition(copy, 'root', partition))
+        self.assertEqual(len(copy.root.children), 3)
+        self.assertTrue(T.root.is_leaf())
+
+    def test_node_changed_meanwhile(self):
+        # another job decomposed the node first
+        T = bowtie_tree()
+        partition = self.partition(T)
+        other = self.partition(T)
+        attach_partition(T, 'root', other)
+        self.assertIn('msg', attach_partition(T, 'root', partition))
+        self.assertEqual(T.root.children, other['children'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import numpy as np
+import shutil
+import tempfile
+import unittest
+
+try:
+    import graph_tool.all as gt
+    import Helpers
+    from Helpers import annotate_statistics, graph_store, subgraph_statistics
+    from PartitionMethods import connected_components
+    from PartitionMethods import k_connected_components
+except ImportError:
+    Helpers = None
+
+from tests.test_partition_methods import random_graph
+
+
+@unittest.skipIf(Helpers is None, 'graph-tool is not installed')
+class AnnotateStatisticsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def decompositions(self):
+        # children of subgraphs of random graphs, partitions and covers
+        random = np.random.RandomState(1)
+        quiet = lambda *args: None
+        for num in xrange(5):
+            G = random_graph(random, 40, random.randint(40, 120))
+            store = graph_store(G, '{}/store_{}'.format(self.tmp_dir, num))
+            within = (np.flatnonzero(random.rand(40) < 0.8),
+                      np.flatnonzero(random.rand(G.num_edges()) < 0.9))
+            for operation in (connected_components, k_connected_components):
+                children = operation(store, vertex_indices=within[0],
+                                     edge_indices=within[1], progress=quiet)
+                if isinstance(children, tuple):
+                    children = children[0]
+                yield G, store, within, children
+
+    def test_same_as_each_child_alone(self):
+        for G, store, within, children in self.decompositions():
+            for graph in (G, store):
+                for child in children:
+                    child.stats = None
+                annotate_statistics(graph, children, within)
+                for child in children:
+                    self.assertEqual(
+                        child.stats.tolist(),
+                        subgraph_statistics(graph, child.vertex_indices,
+                                            child.edge_indices).tolist())
+
+    def test_graph_is_read_once(self):
+        views = []
+        induced_view = Helpers.induced_view
+
+        def counting_view(*args):
+            views.append(args)
+            return induced_view(*args)
+
+        Helpers.induced_view = counting_view
+        try:
+            for G, _, within, children in self.decompositions():
+                del views[:]
+                for child in children:
+                    child.stats = None
+                annotate_statistics(G, children, within)
+                self.assertEqual(len(views), 1)
+        finally:
+            Helpers.induced_view = induced_view
+
+
+if __name__ == '__main__':
+    unittest.main()
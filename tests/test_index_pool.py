@@ -0,0 +1,126 @@
+import cPickle as pickle
+import numpy as np
+import os
+import shutil
+import tempfile
+import unittest
+
+try:
+    from HierarchicalPartitioningTree import IndexPool, PartitionNode
+    from HierarchicalPartitioningTree import PartitionTree
+except ImportError:
+    IndexPool = None
+
+
+def vertex_node(vertex_indices, label):
+    return PartitionNode(vertex_indices=vertex_indices, edge_indices=[],
+                         label=label)
+
+
+@unittest.skipIf(IndexPool is None, 'graph-tool is not installed')
+class IndexPoolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def memory_mapped(self, values):
+        filename = os.path.join(self.tmp_dir, 'pool.npy')
+        np.save(filename, np.asarray(values, dtype=np.int32))
+        return np.load(filename, mmap_mode='c')
+
+    def test_append_leaves_views_untouched(self):
+        pool = IndexPool([1, 2, 3])
+        view = pool.view(0, 3)
+        offsets = [pool.append(np.arange(n)) for n in xrange(1, 50)]
+        self.assertEqual(view.tolist(), [1, 2, 3])
+        self.assertEqual(pool.view(offsets[-1], 49).tolist(), range(49))
+
+    def test_append_to_memory_mapped_base(self):
+        base = self.memory_mapped(np.arange(1000))
+        pool = IndexPool.wrap(base)
+        offset = pool.append([7, 8, 9])
+        self.assertEqual(offset, 1000)
+        self.assertIs(pool.base, base)
+        self.assertEqual(pool.view(offset, 3).tolist(), [7, 8, 9])
+        self.assertEqual(pool.view(10, 3).tolist(), [10, 11, 12])
+        self.assertEqual(len(pool), 1003)
+        # only the overflow is held in memory
+        self.assertEqual(pool.resident_nbytes(), pool.data.nbytes)
+        self.assertEqual(pool.array().tolist(), range(1000) + [7, 8, 9])
+
+    def test_dtype_is_fixed(self):
+        pool = IndexPool([1, 2, 3])
+        self.assertEqual(pool.dtype, np.int32)
+        with self.assertRaises(ValueError):
+            pool.append([2 ** 40])
+        self.assertEqual(pool.dtype, np.int32)
+        wide = IndexPool([2 ** 40])
+        wide.append([1])
+        self.assertEqual(wide.dtype, np.int64)
+        self.assertEqual(wide.array().tolist(), [2 ** 40, 1])
+
+    def test_adopt_does_not_reorder_handed_out_views(self):
+        T = PartitionTree()
+        T.root = vertex_node(np.arange(10)[::-1], 'root')
+        view = T.root.vertex_indices
+        T.add_children(T.root, [vertex_node([0, 1, 2], 'a'),
+                                vertex_node(range(3, 10), 'b')])
+        self.assertEqual(view.tolist(), range(10)[::-1])
+        self.assertEqual(T.root.vertex_indices.tolist(), range(10)[::-1])
+        self.assertEqual(T.root.children[0].vertex_indices.tolist(),
+                         [0, 1, 2])
+
+    def test_adopt_on_memory_mapped_tree(self):
+        T = PartitionTree()
+        T.root = vertex_node([], 'root')
+        pool = IndexPool.wrap(self.memory_mapped(np.arange(100)))
+        T.root._vertex_pool = pool
+        T.root._vertex_range = (0, 100)
+        T.root._num_vertices = 100
+        T.add_children(T.root, [vertex_node(range(50), 'a'),
+                                vertex_node(range(50, 100), 'b')])
+        self.assertIsInstance(pool.base, np.memmap)
+        self.assertEqual(T.root.children[1].vertex_indices.tolist(),
+                         range(50, 100))
+
+    def test_compact_nests_children(self):
+        T = PartitionTree()
+        T.root = vertex_node(range(10), 'root')
+        T.add_children(T.root, [vertex_node([4, 5], 'a'),
+                                vertex_node([0, 1, 2], 'b')])
+        old_view = T.root.vertex_indices
+        T.compact()
+        self.assertEqual(len(T.root._vertex_pool), 10)
+        self.assertEqual(sorted(T.root.vertex_indices.tolist()), range(10))
+        self.assertEqual(T.root.children[0].vertex_indices.tolist(), [4, 5])
+        self.assertEqual(T.root.children[1].vertex_indices.tolist(),
+                         [0, 1, 2])
+        self.assertEqual(old_view.tolist(), range(10))
+
+    def test_pickled_node_holds_its_own_slice(self):
+        T = PartitionTree()
+        T.root = vertex_node(range(1000), 'root')
+        T.add_children(T.root, [vertex_node([4, 5], 'a'),
+                                vertex_node([6], 'b')])
+        leaf = T.root.children[0]
+        leaf.parent = None
+        unpickled = pickle.loads(pickle.dumps(leaf, 2))
+        self.assertEqual(len(unpickled._vertex_pool), 2)
+        self.assertEqual(unpickled.vertex_indices.tolist(), [4, 5])
+        self.assertEqual(unpickled.num_vertices(), 2)
+        self.assertIs(leaf._vertex_pool, T.root._vertex_pool)
+
+    def test_setting_indices_updates_counts(self):
+        node = PartitionNode(vertex_indices=range(5), edge_indices=range(3),
+                             label='a')
+        node.vertex_indices = [1, 2]
+        node.edge_indices = range(7)
+        self.assertEqual(node.num_vertices(), 2)
+        self.assertEqual(node.num_edges(), 7)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,230 @@
+import itertools
+import numpy as np
+import unittest
+
+try:
+    import graph_tool.all as gt
+    from Handlers import decompose_node, metagraph
+    from HierarchicalPartitioningTree import PartitionNode, PartitionTree
+    from KConnectivity import find_vertex_cut, k_vertex_connected_components
+    from KConnectivity import sparse_certificate
+    from PartitionMethods import k_connected_components
+except ImportError:
+    find_vertex_cut = None
+
+
+def clique(vertices):
+    return [(u, v) for i, u in enumerate(vertices) for v in vertices[i + 1:]]
+
+
+def columns(edges):
+    src, tar = np.array(edges, dtype=np.int64).reshape(-1, 2).T
+    return src, tar
+
+
+def is_connected(vertices, edges):
+    vertices = set(vertices)
+    if not vertices:
+        return True
+    adjacency = dict((v, set()) for v in vertices)
+    for u, v in edges:
+        if u in vertices and v in vertices:
+            adjacency[u].add(v)
+            adjacency[v].add(u)
+    start = next(iter(vertices))
+    seen = set([start])
+    stack = [start]
+    while stack:
+        for w in adjacency[stack.pop()]:
+            if w not in seen:
+                seen.add(w)
+                stack.append(w)
+    return seen == vertices
+
+
+def is_k_connected(vertices, edges, k):
+    # more than k vertices, and no set of fewer than k of them disconnects
+    # the subgraph they induce
+    vertices = sorted(vertices)
+    if len(vertices) <= k:
+        return False
+    for size in xrange(k):
+        for cut in itertools.combinations(vertices, size):
+            if not is_connected(set(vertices) - set(cut), edges):
+                return False
+    return True
+
+
+def brute_force_components(edges, k):
+    vertices = sorted(set(v for edge in edges for v in edge))
+    found = []
+    for size in xrange(len(vertices), k, -1):
+        for subset in itertools.combinations(vertices, size):
+            subset = frozenset(subset)
+            if any(subset <= other for other in found):
+                continue
+            if is_k_connected(subset, edges, k):
+                found.append(subset)
+    return set(found)
+
+
+def random_graph(random, num_vertices, probability):
+    return [(u, v) for u, v in clique(range(num_vertices))
+            if random.rand() < probability]
+
+
+# two K5s sharing the vertices 3 and 4
+TWO_K5S = clique([0, 1, 2, 3, 4]) + clique([3, 4, 5, 6, 7])[1:]
+# an 8-cycle with its four long chords (the Wagner graph, 3-connected)
+CHORDED_CYCLE = ([(i, (i + 1) % 8) for i in xrange(8)] +
+                 [(i, i + 4) for i in xrange(4)])
+
+
+@unittest.skipIf(find_vertex_cut is None, 'graph-tool is not installed')
+class KConnectivityTest(unittest.TestCase):
+
+    def components(self, edges, k):
+        src, tar = columns(edges)
+        return set(frozenset(c.tolist())
+                   for c in k_vertex_connected_components(src, tar, k))
+
+    def test_two_cliques_sharing_two_vertices(self):
+        everything = frozenset(xrange(8))
+        self.assertEqual(self.components(TWO_K5S, 2), set([everything]))
+        halves = set([frozenset(xrange(5)), frozenset(xrange(3, 8))])
+        self.assertEqual(self.components(TWO_K5S, 3), halves)
+        self.assertEqual(self.components(TWO_K5S, 4), halves)
+        self.assertEqual(self.components(TWO_K5S, 5), set())
+
+        src, tar = columns(TWO_K5S)
+        self.assertIsNone(find_vertex_cut(src, tar, 8, 2))
+        self.assertEqual(sorted(find_vertex_cut(src, tar, 8, 3)), [3, 4])
+
+    def test_cycle_with_chords(self):
+        everything = frozenset(xrange(8))
+        for k in (1, 2, 3):
+            self.assertEqual(self.components(CHORDED_CYCLE, k),
+                             set([everything]))
+        self.assertEqual(self.components(CHORDED_CYCLE, 4), set())
+        src, tar = columns(CHORDED_CYCLE)
+        self.assertIsNone(find_vertex_cut(src, tar, 8, 3))
+        self.assertEqual(len(find_vertex_cut(src, tar, 8, 4)), 3)
+
+    def test_components_of_random_graphs(self):
+        random = np.random.RandomState(0)
+        for _ in xrange(12):
+            edges = random_graph(random, random.randint(5, 9),
+                                 random.uniform(0.3, 0.9))
+            if not edges:
+                continue
+            for k in xrange(1, 5):
+                self.assertEqual(self.components(edges, k),
+                                 brute_force_components(edges, k),
+                                 'k = {}, edges = {}'.format(k, edges))
+
+    def test_vertex_cuts_of_random_graphs(self):
+        random = np.random.RandomState(1)
+        for _ in xrange(30):
+            num_vertices = random.randint(5, 10)
+            edges = random_graph(random, num_vertices,
+                                 random.uniform(0.3, 0.9))
+            vertices = range(num_vertices)
+            if not edges or not is_connected(vertices, edges):
+                continue
+            src, tar = columns(edges)
+            for k in xrange(1, 5):
+                cut = find_vertex_cut(src, tar, num_vertices, k,
+                                      use_certificate=False)
+                if is_k_connected(vertices, edges, k):
+                    self.assertIsNone(cut)
+                    continue
+                self.assertIsNotNone(cut)
+                self.assertLess(len(cut), k)
+                self.assertFalse(is_connected(set(vertices) - set(cut),
+                                              edges))
+
+    def test_sparse_certificate_keeps_connectivity(self):
+        random = np.random.RandomState(2)
+        for _ in xrange(20):
+            num_vertices = random.randint(5, 10)
+            edges = random_graph(random, num_vertices,
+                                 random.uniform(0.4, 1.0))
+            if not edges:
+                continue
+            src, tar = columns(edges)
+            vertices = range(num_vertices)
+            for k in xrange(1, 5):
+                kept = sparse_certificate(src, tar, num_vertices, k)
+                self.assertLessEqual(len(kept), k * (num_vertices - 1))
+                certificate = [edges[pos] for pos in kept]
+                for j in xrange(1, k + 1):
+                    self.assertEqual(
+                        is_k_connected(vertices, certificate, j),
+                        is_k_connected(vertices, edges, j))
+
+    def children(self, edges, k=None):
+        G = gt.Graph(directed=False)
+        G.add_vertex(max(max(edge) for edge in edges) + 1)
+        G.add_edge_list(np.array(edges))
+        children, _ = k_connected_components(
+            G, vertex_indices=np.arange(G.num_vertices()),
+            edge_indices=np.arange(len(edges)), k=k,
+            progress=lambda *args: None)
+        return children
+
+    def test_largest_k_is_found(self):
+        # a K4 hanging off the two K5s by a path
+        edges = TWO_K5S + [(7, 8), (8, 9)] + clique([9, 10, 11, 12])
+        children = self.children(edges)
+        self.assertEqual([child.label for child in children],
+                         ['KCC_4_0', 'KCC_4_1', 'KCC_4_2'])
+        self.assertEqual(
+            sorted(sorted(child.vertex_indices.tolist())
+                   for child in children[:2]),
+            [range(5), range(3, 8)])
+        # the rest of the vertices, outside both components
+        self.assertEqual(sorted(children[2].vertex_indices.tolist()),
+                         range(8, 13))
+        self.assertEqual([child.label for child in self.children(edges, 3)],
+                         ['KCC_3_0', 'KCC_3_1', 'KCC_3_2', 'KCC_3_3'])
+
+    def test_largest_k_of_random_graphs(self):
+        random = np.random.RandomState(3)
+        for _ in xrange(10):
+            edges = random_graph(random, random.randint(5, 9),
+                                 random.uniform(0.3, 0.9))
+            if not edges:
+                continue
+            k = max(k for k in xrange(1, 9)
+                    if k == 1 or brute_force_components(edges, k))
+            labels = [child.label for child in self.children(edges)]
+            self.assertTrue(labels[0].startswith('KCC_{}_'.format(k)))
+
+    def test_metagraph_of_components(self):
+        # a K4 hanging off the two K5s by a path
+        edges = TWO_K5S + [(7, 8), (8, 9)] + clique([9, 10, 11, 12])
+        G = gt.Graph(directed=False)
+        G.add_vertex(13)
+        G.add_edge_list(np.array(edges))
+        T = PartitionTree()
+        T.root = PartitionNode(vertex_indices=np.arange(13),
+                               edge_indices=np.arange(len(edges)),
+                               label='root', partition_type='root')
+        response = decompose_node(T, G, 'root', 'k_connected_components')
+        self.assertNotIn('msg', response)
+
+        vis_data = metagraph(T, 'root')['vis_data']
+        labels = dict((node['id'], node['label'])
+                      for node in vis_data['nodes'])
+        self.assertEqual(labels, {0: 'KCC_4_0', 1: 'KCC_4_1',
+                                  2: 'KCC_4_2'})
+        # only the edge 7-8 runs between components, from the K5 holding
+        # vertex 7 to the rest
+        k5 = [idx for idx, child in enumerate(T.root.children[:2])
+              if 7 in child.vertex_indices.tolist()]
+        self.assertEqual([(edge['from'], edge['to'], edge['value'])
+                          for edge in vis_data['edges']], [(k5[0], 2, 1)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import numpy as np
+import os
+import shutil
+import tempfile
+import unittest
+
+try:
+    from Helpers import VisColumns
+    from Layouts import LayoutCache
+except ImportError:
+    LayoutCache = None
+
+
+def path_view(num_nodes):
+    # the path 0-1-...-(num_nodes - 1), as the client draws it
+    ids = np.arange(num_nodes)
+    return VisColumns([('id', ids)],
+                      [('id', ids[:-1]), ('from', ids[:-1]),
+                       ('to', ids[1:])])
+
+
+@unittest.skipIf(LayoutCache is None, 'graph-tool is not installed')
+class LayoutCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.layouts = LayoutCache(os.path.join(self.tmp_dir, 'g.tree'))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_views_are_laid_out_once_cached(self):
+        vis_data = path_view(5)
+        self.assertFalse(self.layouts.lay_out(vis_data, 'root', 'subgraph'))
+        self.assertEqual([key for key, _ in vis_data.nodes], ['id'])
+
+        reports = []
+        ids = np.arange(5)
+        result = self.layouts.positions(
+            'root', 'subgraph', ids, ids[:-1], ids[1:],
+            progress=lambda *args: reports.append(args))
+        self.assertEqual(len(reports), 1)
+        positions = dict(result['positions'].nodes)
+        self.assertEqual(positions['id'].tolist(), range(5))
+
+        self.assertTrue(self.layouts.lay_out(vis_data, 'root', 'subgraph'))
+        nodes = dict(vis_data.nodes)
+        self.assertEqual(nodes['x'].tolist(), positions['x'].tolist())
+        self.assertEqual(nodes['y'].tolist(), positions['y'].tolist())
+
+    def test_layouts_of_other_graphs_are_not_used(self):
+        ids = np.arange(5)
+        self.layouts.positions('root', 'subgraph', ids, ids[:-1], ids[1:])
+        # the node's subgraph changed, and other views have layouts of
+        # their own
+        self.assertFalse(self.layouts.lay_out(path_view(6), 'root',
+                                              'subgraph'))
+        self.assertFalse(self.layouts.lay_out(path_view(5), 'root',
+                                              'bcc_tree'))
+        self.assertFalse(self.layouts.lay_out(path_view(5), 'root',
+                                              'subgraph', [('peel', 1)]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,199 @@
+import numpy as np
+import shutil
+import tempfile
+import unittest
+
+try:
+    import graph_tool.all as gt
+    from Handlers import decompose_node
+    from Helpers import edge_array, graph_store, induced_view
+    from HierarchicalPartitioningTree import PartitionNode, PartitionTree
+    from PartitionMethods import biconnected_components, connected_components
+except ImportError:
+    gt = None
+
+
+def bowtie_with_tail():
+    # triangles 0-1-2 and 2-3-4 sharing vertex 2, and the edge 4-5
+    G = gt.Graph(directed=False)
+    G.add_vertex(6)
+    G.add_edge_list(np.array([[0, 1], [1, 2], [2, 0], [2, 3], [3, 4],
+                              [4, 2], [4, 5]]))
+    return G
+
+
+def random_graph(random, num_vertices, num_edges):
+    # simple: no self-loops or parallel edges
+    pairs = np.unique(np.sort(random.randint(0, num_vertices,
+                                             (num_edges, 2)), axis=1),
+                      axis=0)
+    G = gt.Graph(directed=False)
+    G.add_vertex(num_vertices)
+    G.add_edge_list(pairs[pairs[:, 0] != pairs[:, 1]])
+    return G
+
+
+def summary(children):
+    return [(child.label, sorted(child.vertex_indices.tolist()),
+             sorted(child.edge_indices.tolist())) for child in children]
+
+
+def original_components(G, vertex_indices, edge_indices, biconnected):
+    # the per-edge loop connected_components and biconnected_components
+    # ran before they were vectorized, as (label, vertices, edges)
+    H = induced_view(G, vertex_indices, edge_indices)
+    if biconnected:
+        labels, _, _ = gt.label_biconnected_components(H)
+    else:
+        labels, _ = gt.label_components(H)
+    vlists = {}
+    elists = {}
+    for src, tar, e in zip(*edge_array(H)):
+        key = labels[e] if biconnected else labels[src]
+        vlists.setdefault(key, set()).update([src, tar])
+        elists.setdefault(key, set()).add(e)
+    prefix = 'BCC' if biconnected else 'CC'
+    children = [('{}_{}_{}'.format(prefix, key, idx), sorted(vlists[key]),
+                 sorted(elists[key]))
+                for idx, key in enumerate(sorted(vlists.keys()))]
+    if not biconnected:
+        non_isolated_vertices = set().union(*vlists.values())
+        for idx, v in enumerate(set(vertex_indices) - non_isolated_vertices):
+            children.append(('CC_{}_{}'.format(labels[v], idx), [v], []))
+    return children
+
+
+@unittest.skipIf(gt is None, 'graph-tool is not installed')
+class OriginalParityTest(unittest.TestCase):
+
+    def subgraphs(self):
+        random = np.random.RandomState(2)
+        for _ in xrange(10):
+            G = random_graph(random, 60, random.randint(30, 120))
+            yield (G, np.flatnonzero(random.rand(60) < 0.7),
+                   np.flatnonzero(random.rand(G.num_edges()) < 0.8))
+
+    def test_connected_components(self):
+        for G, vertices, edges in self.subgraphs():
+            children = connected_components(G, vertex_indices=vertices,
+                                            edge_indices=edges,
+                                            progress=lambda *args: None)
+            original = original_components(G, vertices, edges, False)
+            # isolated vertices came in the order of a set, now in order
+            isolated = [child for child in original if not child[2]]
+            original = original[:len(original) - len(isolated)] + [
+                ('CC_{}_{}'.format(label.split('_')[1], idx), v_idx, e_idx)
+                for idx, (label, v_idx, e_idx) in enumerate(
+                    sorted(isolated, key=lambda child: child[1]))]
+            self.assertEqual(summary(children), original)
+
+    def test_biconnected_components(self):
+        # the same components, but numbered by their smallest edge rather
+        # than in the order graph-tool found them
+        for G, vertices, edges in self.subgraphs():
+            children = biconnected_components(G, vertex_indices=vertices,
+                                              edge_indices=edges,
+                                              progress=lambda *args: None)
+            original = original_components(G, vertices, edges, True)
+            original.sort(key=lambda (label, v_idx, e_idx): e_idx[0])
+            self.assertEqual(
+                summary(children),
+                [('BCC_{}_{}'.format(idx, idx), v_idx, e_idx)
+                 for idx, (_, v_idx, e_idx) in enumerate(original)])
+
+
+@unittest.skipIf(gt is None, 'graph-tool is not installed')
+class BiconnectedComponentsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_marks_articulation_points(self):
+        G = bowtie_with_tail()
+        children = biconnected_components(G, vertex_indices=np.arange(6),
+                                          progress=lambda *args: None)
+        self.assertEqual(len(children), 3)
+        self.assertEqual(
+            np.flatnonzero(G.vp['is_articulation'].a).tolist(), [2, 4])
+
+    def test_passes_articulation_points_of_store(self):
+        store = graph_store(bowtie_with_tail(), self.tmp_dir + '/store')
+        found = []
+        children = biconnected_components(
+            store, vertex_indices=np.arange(6),
+            progress=lambda *args: None, articulation_points=found.append)
+        self.assertEqual(len(children), 3)
+        self.assertEqual(sorted(found.pop().tolist()), [2, 4])
+        # ids are of the store's vertices, not of the subgraph's
+        children = biconnected_components(
+            store, vertex_indices=np.arange(2, 6),
+            progress=lambda *args: None, articulation_points=found.append)
+        self.assertEqual(len(children), 2)
+        self.assertEqual(found.pop().tolist(), [4])
+
+    def test_decompose_store_backed_node(self):
+        store = graph_store(bowtie_with_tail(), self.tmp_dir + '/store')
+        T = PartitionTree()
+        T.root = PartitionNode(vertex_indices=np.arange(6),
+                               edge_indices=np.arange(7),
+                               label='root', partition_type='root')
+        response = decompose_node(T, store, 'root', 'biconnected_components')
+        self.assertNotIn('msg', response)
+        self.assertEqual(len(T.root.children), 3)
+        # no metagraph; articulation points are not cross edges
+        self.assertEqual(T.root.cross_edges, [])
+
+    def test_reports_progress_between_phases(self):
+        for operation in (connected_components, biconnected_components):
+            reports = []
+            operation(bowtie_with_tail(), vertex_indices=np.arange(6),
+                      progress=lambda *args: reports.append(args[:2]))
+            self.assertEqual(reports, [(0, 3), (1, 3), (2, 3)])
+
+    def test_stops_at_a_progress_report(self):
+        class Cancelled(Exception):
+            pass
+
+        def cancel(done, total, message):
+            if done == 1:
+                raise Cancelled()
+
+        G = bowtie_with_tail()
+        with self.assertRaises(Cancelled):
+            biconnected_components(G, vertex_indices=np.arange(6),
+                                   progress=cancel)
+        self.assertNotIn('is_articulation', G.vp)
+
+    def test_store_and_graph_agree(self):
+        # components are labeled on a local graph for a store, and on a
+        # view of the whole graph otherwise
+        random = np.random.RandomState(0)
+        quiet = lambda *args: None
+        for num in xrange(10):
+            G = random_graph(random, 60, random.randint(30, 120))
+            store = graph_store(G, '{}/store_{}'.format(self.tmp_dir, num))
+            vertices = np.flatnonzero(random.rand(60) < 0.7)
+            edges = np.flatnonzero(random.rand(G.num_edges()) < 0.8)
+            for operation in (connected_components, biconnected_components):
+                expected = operation(G, vertex_indices=vertices,
+                                     edge_indices=edges, progress=quiet)
+                kwargs = {}
+                found = []
+                if operation is biconnected_components:
+                    kwargs['articulation_points'] = found.append
+                children = operation(store, vertex_indices=vertices,
+                                     edge_indices=edges, progress=quiet,
+                                     **kwargs)
+                if operation is biconnected_components:
+                    self.assertEqual(
+                        sorted(found[0].tolist()),
+                        np.flatnonzero(G.vp['is_articulation'].a).tolist())
+                    del G.vp['is_articulation']
+                self.assertEqual(summary(children), summary(expected))
+
+
+if __name__ == '__main__':
+    unittest.main()
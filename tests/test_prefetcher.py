@@ -0,0 +1,103 @@
+import numpy as np
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+try:
+    from Helpers import graph_store
+    from HierarchicalPartitioningTree import PartitionNode
+    from PartitionMethods import connected_components
+    from Prefetcher import DecompositionPrefetcher, worker_pool
+except ImportError:
+    DecompositionPrefetcher = None
+
+from tests.test_partition_methods import random_graph, summary
+
+
+class StalledResult(object):
+    # the result of a task whose worker died: it never arrives
+
+    def ready(self):
+        return False
+
+    def wait(self, timeout):
+        time.sleep(timeout)
+
+
+class StalledPool(object):
+
+    def apply_async(self, func, args):
+        return StalledResult()
+
+
+def root_of(G):
+    return PartitionNode(vertex_indices=np.arange(G.num_vertices()),
+                         edge_indices=np.arange(G.num_edges()),
+                         label='root', partition_type='root')
+
+
+@unittest.skipIf(DecompositionPrefetcher is None,
+                 'graph-tool is not installed')
+class PrefetcherTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        random = np.random.RandomState(0)
+        self.graphs = [random_graph(random, 80, 60) for _ in xrange(2)]
+        self.stores = [graph_store(G, '{}/store_{}'.format(self.tmp_dir, i))
+                       for i, G in enumerate(self.graphs)]
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_graphs_share_the_pool(self):
+        pool = worker_pool(1)
+        try:
+            for G, store in zip(self.graphs, self.stores):
+                prefetcher = DecompositionPrefetcher(store, pool,
+                                                     min_vertices=1)
+                node = root_of(G)
+                prefetcher.schedule([node])
+                children = prefetcher.take(node, 'connected_components', G)
+                expected = connected_components(
+                    G, vertex_indices=node.vertex_indices,
+                    edge_indices=node.edge_indices,
+                    progress=lambda *args: None)
+                self.assertEqual(summary(children), summary(expected))
+                # closing a graph's prefetcher leaves the pool to the others
+                prefetcher.close()
+        finally:
+            pool.terminate()
+            pool.join()
+
+    def test_stalled_prefetch_is_given_up(self):
+        G = self.graphs[0]
+        prefetcher = DecompositionPrefetcher(self.stores[0], StalledPool(),
+                                             min_vertices=1, timeout=1)
+        node = root_of(G)
+        prefetcher.schedule([node])
+        self.assertIsNone(prefetcher.take(node, 'connected_components', G))
+        self.assertFalse(prefetcher.in_use())
+
+    def test_closing_stops_the_wait(self):
+        G = self.graphs[0]
+        prefetcher = DecompositionPrefetcher(self.stores[0], StalledPool(),
+                                             min_vertices=1)
+        node = root_of(G)
+        prefetcher.schedule([node])
+        taken = []
+        thread = threading.Thread(target=lambda: taken.append(
+            prefetcher.take(node, 'connected_components', G)))
+        thread.start()
+        while not prefetcher.in_use():
+            time.sleep(0.01)
+        prefetcher.close()
+        thread.join(5)
+        self.assertEqual(taken, [None])
+        self.assertFalse(prefetcher.in_use())
+
+
+if __name__ == '__main__':
+    unittest.main()
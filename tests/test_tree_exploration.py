@@ -0,0 +1,135 @@
+import json
+import numpy as np
+import os
+import shutil
+import tempfile
+import unittest
+
+try:
+    import graph_tool.all as gt
+    import TreeExploration as tree_exploration
+    import TreeStorage
+    from TreeExploration import TreeExploration
+    partition_worker = tree_exploration._partition_worker
+except ImportError:
+    gt = None
+
+PEELING_BIN = os.path.join('app', 'bin', 'graph_peeling.bin')
+
+
+def clustered_graph(seed=0):
+    # dense clusters joined by sparse random edges, with pendant paths
+    random = np.random.RandomState(seed)
+    edges = []
+    for start in xrange(0, 240, 40):
+        cluster = random.randint(start, start + 40, (200, 2))
+        edges.append(cluster)
+    edges.append(random.randint(0, 240, (60, 2)))
+    edges.append(np.column_stack((np.arange(240, 300),
+                                  random.randint(0, 300, 60))))
+    pairs = np.unique(np.sort(np.concatenate(edges), axis=1), axis=0)
+    G = gt.Graph(directed=False)
+    G.add_vertex(300)
+    G.add_edge_list(pairs[pairs[:, 0] != pairs[:, 1]])
+    return G
+
+
+# file whose creation kills a worker; None kills every worker
+_death_marker = None
+
+
+def dying_worker(*args):
+    # a worker killed for its memory, or crashed inside graph-tool
+    if _death_marker is None or not os.path.exists(_death_marker):
+        if _death_marker is not None:
+            open(_death_marker, 'w').close()
+        os._exit(1)
+    return partition_worker(*args)
+
+
+def flatten(node):
+    nodes = [(node.label, sorted(node.vertex_indices.tolist()),
+              sorted(node.edge_indices.tolist()))]
+    for child in node.children:
+        nodes += flatten(child)
+    return nodes
+
+
+@unittest.skipIf(gt is None, 'graph-tool is not installed')
+@unittest.skipIf(not os.access(PEELING_BIN, os.X_OK),
+                 'graph_peeling.bin is not executable from here')
+class TreeExplorationTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def explore(self, workers, **kwargs):
+        exploration = TreeExploration(clustered_graph())
+        exploration.create_root()
+        exploration.explore_tree(threshold=8, workers=workers, **kwargs)
+        return exploration
+
+    def test_parallel_tree_matches_serial_tree(self):
+        serial = self.explore(1)
+        parallel = self.explore(2)
+        nodes = flatten(serial.T.root)
+        self.assertGreater(len(nodes), 10)
+        self.assertEqual(flatten(parallel.T.root), nodes)
+        self.assertEqual(parallel.G.vp['is_articulation'].a.tolist(),
+                         serial.G.vp['is_articulation'].a.tolist())
+
+    def test_spilled_tree_matches_tree_kept_in_memory(self):
+        expected = flatten(self.explore(1).T.root)
+        # memory that keeps growing spills after every decomposition,
+        # whatever this process has resident already
+        resident_memory = tree_exploration._resident_memory
+        grown = [0]
+
+        def growing_memory():
+            grown[0] += 2 ** 30
+            return grown[0]
+
+        tree_exploration._resident_memory = growing_memory
+        try:
+            exploration = self.explore(
+                1, memory_limit=1,
+                spill_dir=os.path.join(self.tmp_dir, 'spill'))
+        finally:
+            tree_exploration._resident_memory = resident_memory
+        self.assertGreater(len(exploration.spilled), 1)
+        path = os.path.join(self.tmp_dir, 'explored.tree')
+        exploration.save_tree(path)
+        self.assertEqual(flatten(exploration.T.root), expected)
+        self.assertEqual(flatten(TreeStorage.load_tree(path).root), expected)
+        self.assertFalse(os.path.exists(exploration.spill_dir))
+
+    def explore_with_dying_workers(self, marker, **kwargs):
+        global _death_marker
+        _death_marker = marker
+        tree_exploration._partition_worker = dying_worker
+        try:
+            return self.explore(2, **kwargs)
+        finally:
+            tree_exploration._partition_worker = partition_worker
+            _death_marker = None
+
+    def test_nodes_of_dead_worker_are_partitioned_again(self):
+        expected = flatten(self.explore(1).T.root)
+        exploration = self.explore_with_dying_workers(
+            os.path.join(self.tmp_dir, 'died'))
+        self.assertEqual(flatten(exploration.T.root), expected)
+
+    def test_build_fails_when_workers_keep_dying(self):
+        checkpoint = os.path.join(self.tmp_dir, 'checkpoint')
+        with self.assertRaises(RuntimeError):
+            self.explore_with_dying_workers(None, checkpoint=checkpoint)
+        with open(os.path.join(checkpoint,
+                               tree_exploration.CHECKPOINT_FILE)) as f:
+            self.assertGreater(len(json.load(f)), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,225 @@
+import numpy as np
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+try:
+    import graph_tool.all as gt
+    import TreeStorage
+    from Helpers import graph_store
+    from HierarchicalPartitioningTree import PartitionNode, PartitionTree
+    from Workspaces import LoadedGraph, ResourceCache, Workspace
+except ImportError:
+    Workspace = None
+
+
+def leaf(label, vertex):
+    return PartitionNode(vertex_indices=np.array([vertex]),
+                         edge_indices=np.array([], dtype=np.int64),
+                         label=label)
+
+
+def labels(T):
+    return set(child.label for child in T.root.children)
+
+
+@unittest.skipIf(Workspace is None, 'graph-tool is not installed')
+class EditingTreeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'shared.tree')
+        T = PartitionTree()
+        T.root = PartitionNode(vertex_indices=np.arange(100),
+                               edge_indices=np.array([], dtype=np.int64),
+                               label='root', partition_type='root')
+        TreeStorage.save_tree(T, self.path)
+        self.cache = ResourceCache(2 ** 30)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def workspace(self, workspace_id):
+        workspace = Workspace(workspace_id, self.cache)
+        workspace.load_tree(self.path)
+        return workspace
+
+    def add_leaf(self, workspace, label, vertex):
+        with workspace.editing_tree() as T:
+            T.add_children(T.root, [leaf(label, vertex)])
+
+    def append_leaf(self, workspace, label, vertex):
+        # one edit that reads the tree before changing it
+        with workspace.editing_tree() as T:
+            children = [leaf(child.label.split('|')[-1],
+                             child.vertex_indices[0])
+                        for child in T.root.children]
+            T.remove_children(T.root)
+            T.add_children(T.root, children + [leaf(label, vertex)])
+
+    def test_sessions_edit_their_own_trees(self):
+        first = self.workspace('first')
+        second = self.workspace('second')
+        self.assertIs(first.tree(), second.tree())
+        self.add_leaf(first, 'a', 0)
+        self.assertIsNot(first.tree(), second.tree())
+        self.add_leaf(second, 'b', 1)
+        self.assertEqual(labels(first.tree()), set(['root|a']))
+        self.assertEqual(labels(second.tree()), set(['root|b']))
+
+    def test_concurrent_edits_by_two_sessions(self):
+        workspaces = [self.workspace('first'), self.workspace('second')]
+        start = threading.Event()
+
+        def edit(workspace, label, vertex):
+            start.wait()
+            self.append_leaf(workspace, label, vertex)
+
+        threads = []
+        for vertex in xrange(20):
+            workspace = workspaces[vertex % 2]
+            label = '{}_{}'.format(workspace.id, vertex)
+            threads.append(threading.Thread(
+                target=edit, args=(workspace, label, vertex)))
+        for thread in threads:
+            thread.start()
+        start.set()
+        for thread in threads:
+            thread.join()
+
+        # every edit landed in its own session's tree, none was lost
+        for workspace in workspaces:
+            self.assertEqual(
+                labels(workspace.tree()),
+                set('root|{}_{}'.format(workspace.id, vertex)
+                    for vertex in xrange(20)
+                    if workspaces[vertex % 2] is workspace))
+        self.assertIsNot(workspaces[0].tree(), workspaces[1].tree())
+        # the file itself was never edited
+        self.assertEqual(labels(self.workspace('third').tree()), set())
+
+    def test_edit_waiting_on_a_save(self):
+        workspace = self.workspace('first')
+        other = self.workspace('second')
+        editing = threading.Event()
+        release = threading.Event()
+
+        def hold():
+            with workspace.editing_tree():
+                editing.set()
+                release.wait()
+
+        def save():
+            with workspace.editing_tree() as T:
+                TreeStorage.commit_tree(T, self.path)
+                workspace.tree_saved(self.path)
+
+        threads = [threading.Thread(target=hold)]
+        threads[0].start()
+        editing.wait()
+        threads += [threading.Thread(target=save),
+                    threading.Thread(target=self.append_leaf,
+                                     args=(workspace, 'late', 1))]
+        for thread in threads[1:]:
+            thread.start()
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        # whether the edit ran before or after the save, it was not lost
+        self.assertEqual(labels(workspace.tree()), set(['root|late']))
+        saved = self.cache.entries.get(('tree', self.path))
+        if saved is not None and saved.T is workspace.tree():
+            # shared again only if the edit is saved with it
+            self.assertFalse(saved.dirty)
+            self.assertEqual(labels(other.tree()), set(['root|late']))
+        else:
+            self.assertEqual(len(workspace.tree_key), 3)
+            self.assertIsNot(other.tree(), workspace.tree())
+
+
+class Resource(object):
+
+    dirty = False
+
+    def __init__(self, size):
+        self.size = size
+        self.busy = False
+        self.closed = False
+
+    def nbytes(self):
+        return self.size
+
+    def in_use(self):
+        return self.busy
+
+    def close(self):
+        self.closed = True
+
+
+@unittest.skipIf(Workspace is None, 'graph-tool is not installed')
+class ResourceCacheTest(unittest.TestCase):
+
+    def test_resources_in_use_are_not_evicted(self):
+        cache = ResourceCache(100)
+        graph = cache.get(('graph', 'a'), lambda: Resource(60))
+        graph.busy = True
+        other = cache.get(('graph', 'b'), lambda: Resource(60))
+        self.assertFalse(graph.closed)
+        # once no longer in use, it is evicted first
+        graph.busy = False
+        cache.get(('graph', 'c'), lambda: Resource(10))
+        self.assertTrue(graph.closed)
+        self.assertFalse(other.closed)
+
+
+@unittest.skipIf(Workspace is None, 'graph-tool is not installed')
+class LevelTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        # the paths 0-1-2 and 3-4-5, joined by the edge 2-3
+        G = gt.Graph(directed=False)
+        G.add_vertex(6)
+        G.add_edge_list(np.array([[0, 1], [1, 2], [2, 3], [3, 4], [4, 5]]))
+        graph = LoadedGraph.__new__(LoadedGraph)
+        graph.g = G
+        graph.store = graph_store(G, os.path.join(self.tmp_dir, 'g.store'))
+        graph.prefetcher = None
+
+        T = PartitionTree()
+        T.root = PartitionNode(vertex_indices=np.arange(6),
+                               edge_indices=np.arange(5),
+                               label='root', partition_type='root')
+        T.add_children(T.root, [leaf('a', 0), leaf('b', 5)])
+        self.path = os.path.join(self.tmp_dir, 'levels.tree')
+        TreeStorage.save_tree(T, self.path)
+
+        self.workspace = Workspace('first', ResourceCache(2 ** 30))
+        self.workspace.graph_file = 'g.gt'
+        self.workspace.cache.get(('graph', 'g.gt'), lambda: graph)
+        self.workspace.load_tree(self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_levels_are_not_reused_after_edits(self):
+        root = self.workspace.tree().root
+        level = self.workspace.level(root, [('children', 0)], 10)
+        self.assertEqual(level.vertices.tolist(), [0])
+        self.assertIs(self.workspace.level(root, [('children', 0)], 10),
+                      level)
+
+        with self.workspace.editing_tree() as T:
+            T.remove_children(T.root)
+            T.add_children(T.root, [leaf('c', 3), leaf('d', 0)])
+        level = self.workspace.level(root, [('children', 0)], 10)
+        self.assertEqual(level.vertices.tolist(), [3])
+        self.assertEqual(
+            self.workspace.level(root, [], 10).vertices.tolist(), range(6))
+
+
+if __name__ == '__main__':
+    unittest.main()